@@ -0,0 +1,176 @@
+"""
+bench_hotpaths.py
+
+benchmarks of text extraction, metadata parsing and bib matching
+"""
+
+import os
+import tempfile
+
+from benchutil import SkipBenchmark
+from benchutil import require_tool
+from benchutil import example_pdfs
+from benchutil import synthetic_lines
+from benchutil import synthetic_bibs
+from benchutil import synthetic_bibtex
+
+import pdf_text
+import pdf_meta
+import pdf_cache
+import pdf_parse
+
+# cache files of benchmarks are written next to temporary pdf copies
+pdf_cache.set_cache_dir(None)
+
+
+# text extraction
+
+def bench_convertPDF_xpdf():
+    require_tool('pdftotext')
+    flist = example_pdfs()
+
+    def func():
+        for f in flist:
+            pdf_text.convertPDF_xpdf(f, update=True)
+    return func
+
+
+def bench_convertPDF_xpdf_cached():
+    require_tool('pdftotext')
+    flist = example_pdfs()
+    for f in flist:
+        pdf_text.convertPDF_xpdf(f, update=True)
+
+    def func():
+        for f in flist:
+            pdf_text.convertPDF_xpdf(f)
+    return func
+
+
+def bench_convertPDF_pdfminer():
+    import pdfminer
+    flist = example_pdfs()
+
+    def func():
+        for f in flist:
+            pdf_text.convertPDF_pdfminer(f)
+    return func
+
+
+def bench_pdfminer_new_extractor():
+    import pdfminer
+    flist = example_pdfs()
+
+    def func():
+        for f in flist:
+            with pdf_text.PDFMinerExtractor() as ex:
+                ex.extract(f)
+    return func
+
+
+def bench_pdfminer_reused_extractor():
+    import pdfminer
+    flist = example_pdfs()
+    ex = pdf_text.PDFMinerExtractor()
+
+    def func():
+        for f in flist:
+            ex.extract(f)
+    return func
+
+
+def bench_pdfminer_fast_profile():
+    import pdfminer
+    flist = example_pdfs()
+
+    def func():
+        for f in flist:
+            pdf_text.convertPDF_pdfminer(f, profile='fast')
+    return func
+
+
+def bench_countPDFPages():
+    flist = example_pdfs()
+
+    def func():
+        for f in flist:
+            pdf_text.countPDFPages(f)
+    return func
+
+
+def bench_classify_pdf():
+    flist = example_pdfs()
+
+    def func():
+        for f in flist:
+            pdf_text.classify_pdf(f)
+    return func
+
+
+# text parsing
+
+def bench_find_doi():
+    lines = synthetic_lines(2000)
+    return lambda: pdf_text.find_doi(lines)
+
+
+def bench_find_keywords():
+    lines = synthetic_lines(2000)
+    return lambda: pdf_text.find_keywords(lines)
+
+
+def bench_parse_lines():
+    lines = [(0, t, None) for t in synthetic_lines(200)]
+    return lambda: pdf_parse.parse_lines(lines)
+
+
+def bench_cleanup_str():
+    lines = synthetic_lines(2000)
+
+    def func():
+        for t in lines:
+            pdf_text.cleanup_str(t)
+    return func
+
+
+def bench_textcache_search():
+    lines = synthetic_lines(20000)
+    fname = os.path.join(tempfile.mkdtemp(prefix='py_readpaper_bench_'), 'lines.txtc')
+    text = pdf_cache.read_text_cache(pdf_cache.write_text_cache(lines, fname))
+    return lambda: text.search('doi')
+
+
+# bib parsing and matching
+
+def bench_bib_to_dict_1k():
+    import bibtexparser
+    bibtex = synthetic_bibtex(1000)
+    return lambda: pdf_meta.bib_to_dict(bibtex)
+
+
+def bench_read_bib_1k():
+    import bibtexparser
+    fname = os.path.join(tempfile.mkdtemp(prefix='py_readpaper_bench_'), 'library.bib')
+    with open(fname, 'w') as f:
+        f.write(synthetic_bibtex(1000))
+    return lambda: pdf_meta.read_bib(fname, verb=False)
+
+
+def _find_bib(n):
+    import Levenshtein
+    bibdb = synthetic_bibs(n)
+    query = dict(bibdb[n//2])
+    query['title'] = query['title'] + ' (preprint)'
+    return lambda: pdf_meta.find_bib(bibdb, query, subset=['year', 'journal', 'author'], threshold=0.6)
+
+
+def bench_find_bib_1k():
+    return _find_bib(1000)
+
+
+def bench_find_bib_10k():
+    return _find_bib(10000)
+
+
+def bench_find_bib_100k():
+    return _find_bib(100000)
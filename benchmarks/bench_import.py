@@ -0,0 +1,72 @@
+"""
+bench_import.py
+
+startup benchmark - measure `import py_readpaper` with `python -X importtime`
+
+$ python benchmarks/bench_import.py --budget 0.3
+
+exit code is 1 when the import time exceeds the budget (seconds) or when
+a heavy dependency is loaded at import time
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+# modules which should only be imported when the method needing them is called
+HEAVY_MODULES = ['gensim', 'rake_nltk', 'nltk', 'pandas', 'numpy', 'pdfminer',
+        'bibtexparser', 'arxiv2bib', 'requests', 'pyexif', 'Levenshtein']
+
+here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime(module='py_readpaper'):
+    """ run -X importtime in new interpreter - return dict of {module: cumulative seconds} """
+
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)]
+    r = subprocess.run(cmd, cwd=here, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    res = {}
+    for line in r.stderr.split('\n'):
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or line.find('cumulative') > -1:
+            continue
+        _, cumulative, name = line[12:].split('|')
+        res[name.strip()] = int(cumulative) / 1e6
+
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description='import time benchmark')
+    parser.add_argument("-m", "--module", default='py_readpaper', help="module to import (default: py_readpaper)")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="number of runs (default: 5)")
+    parser.add_argument("-b", "--budget", type=float, default=0.3, help="maximum import time in seconds (default: 0.3)")
+    args = parser.parse_args()
+
+    times = []
+    for i in range(args.repeat):
+        res = importtime(args.module)
+        if args.module not in res:
+            print('... can not import {}'.format(args.module))
+            sys.exit(1)
+        times.append(res[args.module])
+
+    heavy = sorted(m for m in res if m.split('.')[0] in HEAVY_MODULES)
+    best = min(times)
+    print('... import {}: best {:.4f} s, median {:.4f} s ({} runs)'.format(args.module, best, sorted(times)[len(times)//2], args.repeat))
+
+    failed = False
+    if len(heavy) > 0:
+        print('... heavy modules loaded at import: {}'.format(', '.join(heavy)))
+        failed = True
+    if best > args.budget:
+        print('... over budget: {:.4f} s > {:.4f} s'.format(best, args.budget))
+        failed = True
+
+    if failed: sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
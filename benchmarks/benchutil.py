@@ -0,0 +1,83 @@
+"""
+benchutil.py
+
+shared data for benchmarks (example pdfs, synthetic texts and bib records)
+"""
+
+import os
+import glob
+import random
+import shutil
+import tempfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_DIR = os.path.join(os.path.dirname(here), 'example')
+
+JOURNALS = ['Nature', 'Science', 'Physical Review Letters', 'Analytical Chemistry', 'arXiv', 'Lab on a Chip']
+WORDS = ['nanopore', 'dna', 'translocation', 'electric', 'field', 'polymer', 'confinement', 'entropic',
+        'diffusion', 'protein', 'network', 'learning', 'deep', 'signal', 'channel', 'single', 'molecule']
+
+
+class SkipBenchmark(Exception):
+    """ benchmark can not run in this environment """
+
+
+def require_tool(name):
+    """ skip benchmark when command line tool is missing """
+
+    if shutil.which(name) is None:
+        raise SkipBenchmark('{} not found'.format(name))
+
+
+def example_pdfs():
+    """ copy example pdfs into temporary directory (cache files are not written into example/) """
+
+    tmp = tempfile.mkdtemp(prefix='py_readpaper_bench_')
+    flist = []
+    for f in sorted(glob.glob(os.path.join(EXAMPLE_DIR, '*.pdf'))):
+        shutil.copy(f, tmp)
+        flist.append(os.path.join(tmp, os.path.basename(f)))
+
+    if len(flist) == 0:
+        raise SkipBenchmark('no example pdf')
+
+    return flist
+
+
+def synthetic_lines(n=2000, seed=1):
+    """ text lines of paper-like content with keywords and doi lines near the end """
+
+    gen = random.Random(seed)
+    lines = [' '.join(gen.choice(WORDS) for _ in range(gen.randint(3, 14))) + '\n' for _ in range(n)]
+    lines.insert(n*3//4, 'Keywords: nanopore, dna translocation; entropic trapping PACS 87.15\n')
+    lines.insert(n*7//8, 'Anal. Chem. 2004, 76, 15-22 DOI: 10.1021/ac030303m\n')
+
+    return lines
+
+
+def synthetic_bibs(n=1000, seed=1):
+    """ list of bib dictionaries """
+
+    gen = random.Random(seed)
+    res = []
+    for i in range(n):
+        last = ''.join(gen.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(7)).capitalize()
+        year = gen.randint(1980, 2020)
+        res.append({'ID': '{}_{}_{}'.format(last, year, i), 'ENTRYTYPE': 'article',
+            'author': '{}, Sungcheol and Lee, Jun'.format(last), 'author1': last,
+            'title': ' '.join(gen.choice(WORDS) for _ in range(8)).capitalize(),
+            'journal': gen.choice(JOURNALS), 'year': str(year),
+            'doi': '10.{}/{}'.format(gen.randint(1000, 9999), i)})
+
+    return res
+
+
+def synthetic_bibtex(n=1000, seed=1):
+    """ bibtex string of n records """
+
+    items = []
+    for b in synthetic_bibs(n, seed=seed):
+        fields = ',\n'.join('  {} = {{{}}}'.format(k, v) for k, v in b.items() if k not in ['ID', 'ENTRYTYPE'])
+        items.append('@article{{{},\n{}\n}}\n'.format(b['ID'], fields))
+
+    return '\n'.join(items)
@@ -0,0 +1,135 @@
+"""
+run.py
+
+benchmark runner - time bench_* functions of benchmarks/bench_*.py
+
+each bench_* function does its setup and returns the function to time.
+it raises SkipBenchmark (or ImportError) when a tool or package is missing.
+results are saved as json named by git commit, so runs can be compared:
+
+$ python benchmarks/run.py                      # run all, save results/<commit>.json
+$ python benchmarks/run.py -k find_bib          # run selected benchmarks
+$ python benchmarks/run.py --compare A.json B.json
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import socket
+import timeit
+import argparse
+import platform
+import importlib
+import subprocess
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(here)
+sys.path.insert(0, root)
+sys.path.insert(0, here)
+
+from benchutil import SkipBenchmark
+
+
+def _block_network():
+    """ benchmarks never use network - fail any connection """
+
+    def connect(self, *args, **kwargs):
+        raise OSError('network is disabled in benchmarks')
+
+    socket.socket.connect = connect
+    socket.create_connection = lambda *args, **kwargs: connect(None)
+
+
+def git_commit():
+    """ current git commit (short) or 'unknown' """
+
+    try:
+        r = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        return r.stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+
+def collect(keyword=None):
+    """ list of (name, bench function) """
+
+    res = []
+    for fname in sorted(glob.glob(os.path.join(here, 'bench_*.py'))):
+        module = importlib.import_module(os.path.basename(fname)[:-3])
+        for name in sorted(dir(module)):
+            if not name.startswith('bench_'): continue
+            if (keyword is not None) and (name.find(keyword) == -1): continue
+            res.append((name[6:], getattr(module, name)))
+
+    return res
+
+
+def run(benchmarks, repeat=5, min_time=0.2):
+    """ time each benchmark - return dict of {name: result} """
+
+    results = {}
+    for name, bench in benchmarks:
+        try:
+            func = bench()
+        except (SkipBenchmark, ImportError) as e:
+            print('{:40s} skipped ({})'.format(name, e))
+            results[name] = {'skipped': str(e)}
+            continue
+
+        # number of calls per repeat to run at least min_time
+        number = 1
+        while True:
+            t = timeit.timeit(func, number=number)
+            if t >= min_time or number >= 1 << 20: break
+            number *= 10 if t < min_time / 10 else 2
+
+        times = sorted(t / number for t in timeit.repeat(func, number=number, repeat=repeat))
+        results[name] = {'min': times[0], 'median': times[len(times)//2], 'number': number, 'repeat': repeat}
+        print('{:40s} {:12.6f} s (median {:.6f} s, {}x{})'.format(name, times[0], times[len(times)//2], number, repeat))
+
+    return results
+
+
+def compare(old_file, new_file):
+    """ show ratio of min times between two result files """
+
+    old = json.load(open(old_file))['results']
+    new = json.load(open(new_file))['results']
+
+    print('{:40s} {:>12s} {:>12s} {:>8s}'.format('benchmark', 'old', 'new', 'ratio'))
+    for name in sorted(set(old) | set(new)):
+        o, n = old.get(name, {}).get('min'), new.get(name, {}).get('min')
+        if (o is None) or (n is None):
+            print('{:40s} {:>12s} {:>12s}'.format(name, str(o), str(n)))
+            continue
+        print('{:40s} {:12.6f} {:12.6f} {:8.2f}'.format(name, o, n, n / o))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='py_readpaper benchmarks')
+    parser.add_argument("-k", "--keyword", default=None, help="run benchmarks containing keyword")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of repeats (default: 5)")
+    parser.add_argument("-o", "--output", default=os.path.join(here, 'results'), help="results directory (default: benchmarks/results)")
+    parser.add_argument("--compare", nargs=2, metavar=('OLD', 'NEW'), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+
+    _block_network()
+    commit = git_commit()
+    results = run(collect(args.keyword), repeat=args.repeat)
+
+    os.makedirs(args.output, exist_ok=True)
+    fname = os.path.join(args.output, '{}.json'.format(commit))
+    with open(fname, 'w') as f:
+        json.dump({'commit': commit, 'time': time.time(), 'python': platform.python_version(),
+            'machine': platform.platform(), 'results': results}, f, indent=2, sort_keys=True)
+    print('... save to {}'.format(fname))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,7 +22,8 @@ ARG_HELP_STRINGS = {
     "ask_threshold": "a float value determining the minimum Levenshtein ratio to accept a title match (default: " + str(ASK_DEFAULT) + ")",
     "ansi_colors": "Use colorised text for easier visual match recognition (default: " + str(COLORS_DEFAULT) + ")",
     "start": "Start from this line number",
-    "end": "End at this line number"
+    "end": "End at this line number",
+    "snapshot": "Query titles in local sqlite snapshot (pdf_snapshot.build_snapshot) instead of the CrossRef API"
 }
 
 L_JUST = 40
@@ -43,8 +44,14 @@ def main():
     parser.add_argument("-c", "--colors", type=bool, default=COLORS_DEFAULT, help=ARG_HELP_STRINGS["ansi_colors"])
     parser.add_argument("--start", type=int, default=0, help=ARG_HELP_STRINGS["start"])
     parser.add_argument("--end", type=int, default=inf, help=ARG_HELP_STRINGS["end"])
+    parser.add_argument("--snapshot", default=None, help=ARG_HELP_STRINGS["snapshot"])
     args = parser.parse_args()
 
+    query_title = crossref_query_title
+    if args.snapshot is not None:
+        from pdf_snapshot import Snapshot
+        query_title = Snapshot(args.snapshot).query_title
+
     header = None
     additional_fields = ["doi", "similarity"]
 
@@ -73,13 +80,13 @@ def main():
             title = line[title_field]
             head = "line " + str(reader.line_num) + ", query title:"
             print(colorise(head.ljust(L_JUST) + "'" + title + "'", "blue"))
-            ret = crossref_query_title(title)
+            ret = query_title(title)
             retries = 0
             while not ret['success'] and retries < MAX_RETRIES_ON_ERROR:
                 retries += 1
                 msg = "Error while querying CrossRef API ({}), retrying ({})...".format(ret["exception"], retries)
                 print(colorise(msg, "red"))
-                ret = crossref_query_title(title)
+                ret = query_title(title)
             result = ret["result"]
             msg_tail = "'{}' [{}]"
             msg_tail = msg_tail.format(result["crossref_title"], result["doi"])
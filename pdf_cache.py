@@ -0,0 +1,266 @@
+"""
+pdf_cache.py
+
+cache files of papers (extracted text, bib)
+
+.txtc format (native byte order):
+    header - magic b'PRTC', version (uint32), number of lines (uint64)
+    offsets - (lines + 1) uint64 offsets of each line in blob
+    blob - utf-8 text of all lines
+
+cache location:
+    default - hidden sidecar next to pdf (.NAME.txt, .NAME.bib)
+    cache store - CACHE_DIR/ab/cd/abcd....txt keyed by content hash of original pdf
+                  (set by set_cache_dir or PY_READPAPER_CACHE environment variable)
+"""
+
+import os
+import re
+import mmap
+import array
+import shutil
+import struct
+import bisect
+import hashlib
+
+import pdf_log as log
+
+CACHE_ENV = 'PY_READPAPER_CACHE'
+KEY_BLOCK = 1 << 20
+
+_keys = {}
+
+MAGIC = b'PRTC'
+VERSION = 1
+_HEADER = struct.Struct('=4sIQ')
+
+
+def write_text_cache(lines, filename):
+    """ save list of text lines into .txtc file - return filename """
+
+    offsets = array.array('Q', [0])
+    blobs = []
+    pos = 0
+    for t in lines:
+        b = t.encode('utf-8')
+        blobs.append(b)
+        pos += len(b)
+        offsets.append(pos)
+
+    with open(filename + '.tmp', 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(offsets) - 1))
+        f.write(offsets.tobytes())
+        for b in blobs:
+            f.write(b)
+    os.replace(filename + '.tmp', filename)
+
+    return filename
+
+
+class TextLines(object):
+    """ read only list of text lines backed by mmap of .txtc file
+
+    lines are decoded only when accessed
+    """
+
+    def __init__(self, filename):
+        """ open .txtc file """
+
+        self._filename = filename
+        with open(filename, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n = _HEADER.unpack_from(self._mm, 0)
+        if (magic != MAGIC) or (version != VERSION):
+            self._mm.close()
+            raise ValueError('not a text cache file: {}'.format(filename))
+
+        self._n = n
+        self._blob = _HEADER.size + 8*(n + 1)
+        self._view = memoryview(self._mm)
+        self._offsets = self._view[_HEADER.size:self._blob].cast('Q')
+
+    def __repr__(self):
+        return "TextLines({}, lines={})".format(self._filename, self._n)
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+
+        if i < 0: i += self._n
+        if (i < 0) or (i >= self._n):
+            raise IndexError('line index out of range')
+
+        return str(self.line_bytes(i), 'utf-8', 'replace')
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i]
+
+    def line_bytes(self, i):
+        """ memoryview of utf-8 bytes of line i (no copy) """
+
+        return self._view[self._blob + self._offsets[i]:self._blob + self._offsets[i+1]]
+
+    def nbytes(self):
+        """ size of text in bytes """
+
+        return self._offsets[self._n] if self._n > 0 else 0
+
+    def search(self, sstr, ignorecase=True):
+        """ line numbers containing sstr - search over mmap without decoding lines """
+
+        flags = re.IGNORECASE if ignorecase else 0
+        regex = re.compile(re.escape(sstr.encode('utf-8')), flags)
+
+        res = []
+        for m in regex.finditer(self._mm, self._blob):
+            i = bisect.bisect_right(self._offsets, m.start() - self._blob) - 1
+            if (len(res) == 0) or (res[-1] != i): res.append(i)
+
+        return res
+
+    def close(self):
+        """ release mmap """
+
+        if self._mm.closed: return
+        self._offsets.release()
+        self._view.release()
+        self._mm.close()
+
+
+def read_text_cache(filename):
+    """ open .txtc file - return TextLines or None """
+
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        return TextLines(filename)
+    except (ValueError, struct.error):
+        return None
+
+
+def set_cache_dir(cache_dir):
+    """ use central cache store (None: hidden sidecar files) - also for worker processes """
+
+    if cache_dir is None:
+        os.environ.pop(CACHE_ENV, None)
+    else:
+        os.environ[CACHE_ENV] = os.path.abspath(os.path.expanduser(cache_dir))
+
+
+def get_cache_dir():
+    """ central cache store directory or None """
+
+    return os.environ.get(CACHE_ENV) or None
+
+
+def _original_size(mm):
+    """ size of original revision of pdf - up to %%EOF before incremental updates
+
+    an incremental update is appended after %%EOF of the previous revision and
+    holds its own xref section with /Prev. the last section of a linearized
+    pdf has no own xref (startxref points to first page xref), so it is a part
+    of the original revision
+    """
+
+    eof = mm.rfind(b'%%EOF')
+    while eof > -1:
+        prev_eof = mm.rfind(b'%%EOF', 0, eof)
+        m = re.search(rb'startxref\s+(\d+)\s*$', mm[max(eof - 1024, 0):eof])
+        if (prev_eof < 0) or (m is None) or (int(m.group(1)) < prev_eof):
+            break
+
+        # xref table with trailer or xref stream object
+        start = int(m.group(1))
+        if mm[start:start + 4] == b'xref':
+            start = mm.find(b'trailer', start, eof)
+        end = mm.find(b'stream', start, eof) if start > -1 else -1
+        if (start < 0) or (b'/Prev' not in mm[start:end if end > -1 else eof]):
+            break
+        eof = prev_eof
+
+    return eof + 5 if eof > -1 else len(mm)
+
+
+def file_key(pdf_path):
+    """ content key of pdf - sha1 of length and bytes of original revision
+
+    exiftool writes metadata as incremental update appended after %%EOF of
+    the original file and leaves the bytes before it unchanged. the key hashes
+    the whole original revision (a change anywhere in the paper changes it)
+    but not the updates, so it does not change by bib_to_exif nor by renames
+    """
+
+    st = os.stat(pdf_path)
+    memo = (os.path.abspath(pdf_path), st.st_size, st.st_mtime)
+    if memo not in _keys:
+        h = hashlib.sha1()
+        with open(pdf_path, 'rb') as f:
+            if st.st_size == 0:
+                h.update(b'0:')
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    size = _original_size(mm)
+                    h.update('{}:'.format(size).encode('ascii'))
+                    for i in range(0, size, KEY_BLOCK):
+                        h.update(mm[i:min(i + KEY_BLOCK, size)])
+        _keys[memo] = h.hexdigest()
+
+    return _keys[memo]
+
+
+def store_path(pdf_path, ext, cache_dir=None):
+    """ sharded path of cache file in cache store (CACHE_DIR/ab/cd/KEY.ext) """
+
+    cache_dir = cache_dir or get_cache_dir()
+    key = file_key(pdf_path)
+    return os.path.join(cache_dir, key[:2], key[2:4], key + '.' + ext)
+
+
+def sidecar_path(pdf_path, ext, create=False):
+    """ cache filename of pdf - hidden sidecar file or file in cache store
+
+    create: make shard directory of cache store (only for writing)
+    """
+
+    if get_cache_dir() is not None:
+        fname = store_path(pdf_path, ext)
+        if create: os.makedirs(os.path.dirname(fname), exist_ok=True)
+        return fname
+
+    base, fname = os.path.split(os.path.abspath(pdf_path))
+    return base + '/.' + fname.replace('.pdf', '.' + ext)
+
+
+def migrate_sidecars(pdf_list, cache_dir=None, exts=['bib', 'txt', 'txtc', 'parse.json'], dry_run=False):
+    """ move hidden sidecar files of pdfs into cache store - return number of moved files """
+
+    cache_dir = cache_dir or get_cache_dir()
+    if cache_dir is None:
+        log.warning('... no cache directory')
+        return 0
+
+    count = 0
+    for pdf_path in pdf_list:
+        base, fname = os.path.split(os.path.abspath(pdf_path))
+        for ext in exts:
+            src = base + '/.' + fname.replace('.pdf', '.' + ext)
+            if not os.path.exists(src): continue
+
+            dst = store_path(pdf_path, ext, cache_dir=cache_dir)
+            log.info('... {} -> {}', src, dst)
+            count += 1
+            if dry_run: continue
+
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if os.path.exists(dst) and (os.path.getmtime(dst) >= os.path.getmtime(src)):
+                os.remove(src)
+            else:
+                shutil.move(src, dst)
+
+    return count
@@ -0,0 +1,161 @@
+"""
+pdf_dedup.py
+
+functions for finding duplicated papers (preprint/published, re-downloads)
+
+- exact duplicates: same file hash
+- near duplicates: MinHash signatures of extracted text bucketed by LSH
+"""
+
+import os
+import re
+import random
+import hashlib
+import struct
+
+from pdf_text import convertPDF_xpdf
+
+import pdf_log as log
+
+# mersenne prime used for universal hashing of shingles
+_PRIME = (1 << 61) - 1
+_MAXHASH = (1 << 32) - 1
+
+
+def file_hash(filename, blocksize=1 << 20):
+    """ sha256 of file contents (read by blocks) """
+
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def shingles(text, k=5):
+    """ set of k-word shingles from text (lower case, alphanumeric words only) """
+
+    if isinstance(text, list):
+        text = ' '.join(text)
+
+    words = re.findall(r'[a-z0-9]+', text.lower())
+    if len(words) < k:
+        return set([' '.join(words)]) if len(words) > 0 else set()
+
+    return set(' '.join(words[i:i+k]) for i in range(len(words) - k + 1))
+
+
+def _permutations(num_perm, seed=1):
+    """ coefficients of random hash functions (a*x + b) mod prime """
+
+    gen = random.Random(seed)
+    return [(gen.randint(1, _MAXHASH), gen.randint(0, _MAXHASH)) for _ in range(num_perm)]
+
+
+def minhash_signature(text, num_perm=64, k=5, seed=1):
+    """ MinHash signature (tuple of num_perm 32 bit integers) of text """
+
+    sh = shingles(text, k=k)
+    if len(sh) == 0:
+        return None
+
+    # 32 bit hash of each shingle
+    hv = [struct.unpack('<I', hashlib.sha1(s.encode('utf-8')).digest()[:4])[0] for s in sh]
+
+    return tuple(min(((a*h + b) % _PRIME) & _MAXHASH for h in hv) for a, b in _permutations(num_perm, seed=seed))
+
+
+def jaccard(sig1, sig2):
+    """ estimated jaccard similarity from two signatures """
+
+    return sum(1 for x, y in zip(sig1, sig2) if x == y) / float(len(sig1))
+
+
+def lsh_buckets(signatures, bands=16):
+    """ group signatures by band hash - return candidate pairs """
+
+    candidates = set()
+    for b in range(bands):
+        buckets = {}
+        for key, sig in signatures.items():
+            rows = len(sig) // bands
+            band = sig[b*rows:(b+1)*rows]
+            buckets.setdefault(band, []).append(key)
+
+        for keys in buckets.values():
+            if len(keys) < 2: continue
+            for i in range(len(keys)):
+                for j in range(i+1, len(keys)):
+                    candidates.add((keys[i], keys[j]))
+
+    return candidates
+
+
+def _clusters(keys, pairs):
+    """ connected components of pairs (union-find) """
+
+    parent = {k: k for k in keys}
+
+    def root(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    for k1, k2 in pairs:
+        r1, r2 = root(k1), root(k2)
+        if r1 != r2: parent[r2] = r1
+
+    groups = {}
+    for k in keys:
+        groups.setdefault(root(k), []).append(k)
+
+    return [sorted(g) for g in groups.values() if len(g) > 1]
+
+
+def find_duplicates(flist, threshold=0.8, num_perm=64, bands=16, k=5, exact=True, maxpages=0, debug=False):
+    """ find duplicated pdf files - return list of clusters (list of filenames) """
+
+    if num_perm % bands != 0:
+        log.warning('... num_perm should be multiple of bands: {} {}', num_perm, bands)
+        return []
+
+    flist = [os.path.abspath(f) for f in flist]
+    pairs = set()
+
+    # exact duplicates by file hash
+    if exact:
+        hashes = {}
+        for f in flist:
+            hashes.setdefault(file_hash(f), []).append(f)
+        for fs in hashes.values():
+            pairs.update((fs[0], f) for f in fs[1:])
+        log.debug('... exact duplicates: {}', len(pairs), show=debug)
+
+    # near duplicates by text
+    signatures = {}
+    for f in flist:
+        sig = minhash_signature(convertPDF_xpdf(f, maxpages=maxpages), num_perm=num_perm, k=k)
+        if sig is None:
+            log.debug('... no text: {}', f, show=debug)
+            continue
+        signatures[f] = sig
+
+    candidates = lsh_buckets(signatures, bands=bands)
+    log.debug('... lsh candidates: {}', len(candidates), show=debug)
+
+    for f1, f2 in candidates:
+        if jaccard(signatures[f1], signatures[f2]) >= threshold:
+            pairs.add((f1, f2))
+
+    return _clusters(flist, pairs)
+
+
+def print_duplicates(clusters):
+    """ show duplicated clusters """
+
+    for i, c in enumerate(clusters):
+        print("\n[{}] ---------".format(i))
+        for f in c:
+            print("... {} ({:.1f} MB)".format(f, os.path.getsize(f)/1e6))
@@ -0,0 +1,153 @@
+"""
+pdf_export.py
+
+whole library bibliography in one file - bibtex, csv or parquet
+
+    export_library(list_pdfs('~/papers'), 'library.bib')
+    export_library(flist, 'library.csv')
+    export_library(flist, 'library.parquet')   - needs pyarrow
+
+papers are read and written one by one (parquet: row groups of `batch` papers), so memory
+does not grow with the library. bib comes from the hidden bib file, year/author1/journal of
+papers without bib file from the filename. records of Paper objects are not changed.
+"""
+
+import os
+import csv
+
+from pdf_text import parse_fname
+from pdf_meta import read_bib
+from pdf_meta import bibtex_entry
+from pdf_cache import sidecar_path
+
+from pdf_stats import stage
+from pdf_stats import count
+
+import pdf_log as log
+
+EXPORT_FORMATS = {'.bib': 'bibtex', '.csv': 'csv', '.parquet': 'parquet'}
+COLUMNS = ['file', 'ENTRYTYPE', 'ID', 'year', 'author1', 'author', 'title', 'journal', 'volume', 'number', 'pages',
+           'publisher', 'doi', 'pmid', 'pmcid', 'url', 'keywords', 'abstract']
+BATCH = 5000
+
+
+def library_record(filename):
+    """ bib of paper (hidden bib file and filename) with pdf filename in 'file' """
+
+    bib = read_bib(sidecar_path(filename, 'bib'), verb=False)
+    if isinstance(bib, list):
+        bib = bib[0] if len(bib) > 0 else None
+
+    rec = dict(bib or {})
+    res = parse_fname(filename)
+    if res is not None:
+        for k, v in zip(['year', 'author1', 'journal'], res):
+            if str(rec.get(k, '')) in ['', 'None']: rec[k] = v
+    rec['file'] = os.path.basename(filename)
+
+    return rec
+
+
+def iter_records(flist):
+    """ records of papers one by one - unreadable bib files are logged and skipped """
+
+    for f in flist:
+        try:
+            yield library_record(f)
+        except Exception as e:
+            log.warning('... export error [{}]: {}', os.path.basename(f), e)
+
+
+def _row(rec):
+    """ flat row of strings for csv and parquet """
+
+    row = {}
+    for k in COLUMNS:
+        v = rec.get(k, '')
+        row[k] = ','.join(v) if isinstance(v, list) else ('' if v is None else str(v))
+    return row
+
+
+def _write_bibtex(records, filename):
+    n = 0
+    keys = set()
+    last = {}           # last suffix of citation key
+    with open(filename, 'w') as f:
+        for rec in records:
+            # unique citation keys (same first author and year)
+            key = rec.get('ID') or '{}_{}'.format(rec.get('author1', 'Unknown'), rec.get('year', ''))
+            new, i = key, last.get(key, 1)
+            while new in keys:
+                i += 1
+                new = '{}_{}'.format(key, i)
+            keys.add(new)
+            last[key] = i
+
+            f.write(('\n' if n > 0 else '') + bibtex_entry(dict(rec, ID=new, ENTRYTYPE=rec.get('ENTRYTYPE', 'article'))))
+            n += 1
+    return n
+
+
+def _write_csv(records, filename):
+    n = 0
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, COLUMNS)
+        writer.writeheader()
+        for rec in records:
+            writer.writerow(_row(rec))
+            n += 1
+    return n
+
+
+def _write_parquet(records, filename, batch=BATCH):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('... parquet export needs pyarrow: pip install pyarrow')
+
+    schema = pa.schema([(k, pa.string()) for k in COLUMNS])
+
+    def table(rows):
+        return pa.table({k: [r[k] for r in rows] for k in COLUMNS}, schema=schema)
+
+    n = 0
+    rows = []
+    with pq.ParquetWriter(filename, schema) as writer:
+        for rec in records:
+            rows.append(_row(rec))
+            if len(rows) >= batch:
+                writer.write_table(table(rows))
+                n += len(rows)
+                rows = []
+        if (len(rows) > 0) or (n == 0):
+            writer.write_table(table(rows))
+            n += len(rows)
+    return n
+
+
+def export_library(flist, filename, fmt=None, batch=BATCH, verb=True):
+    """ write bib of all papers into one file (fmt: bibtex, csv, parquet or by extension) - return number of papers """
+
+    fmt = fmt or EXPORT_FORMATS.get(os.path.splitext(filename)[1].lower())
+    if fmt not in EXPORT_FORMATS.values():
+        raise ValueError('... export format should be one of {}: {}'.format(sorted(EXPORT_FORMATS.values()), filename))
+
+    # written into temporary file - old export stays until new one is complete
+    records = iter_records(flist)
+    try:
+        with stage('export.' + fmt):
+            if fmt == 'bibtex':
+                n = _write_bibtex(records, filename + '.tmp')
+            elif fmt == 'csv':
+                n = _write_csv(records, filename + '.tmp')
+            else:
+                n = _write_parquet(records, filename + '.tmp', batch=batch)
+    except BaseException:
+        if os.path.exists(filename + '.tmp'): os.remove(filename + '.tmp')
+        raise
+    os.replace(filename + '.tmp', filename)
+
+    count('export.papers', n)
+    log.debug('... export {} papers to {}', n, filename, show=verb)
+    return n
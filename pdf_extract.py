@@ -0,0 +1,236 @@
+"""
+pdf_extract.py
+
+text extraction scheduler - engine by size and page count, time and memory budget per file
+
+    lines, cost = extract_text('paper.pdf', timeout=60, memory=1024)
+    cost: {'engine', 'status', 'seconds', 'lines', 'pages', 'size', 'kind'}
+
+engines run as child processes (pdftotext, or pdfminer in python) which are killed at
+timeout and can not use more memory (address space) than the budget.
+
+engine:
+    skip          - more than SKIP_PAGES pages or SKIP_SIZE bytes, or image-only pdf (scanned paper)
+    pdftotext     - if installed
+    pdfminer-full - up to FULL_PAGES pages (layout analysis)
+    pdfminer-fast - first pages of longer papers (see pdf_text.PDFMINER_PROFILES)
+status: ok, skip, image, timeout, memory, error
+
+layout of first pages with font sizes (pdf_parse) runs in child process with the same budget: run_layout()
+
+image-only pdfs go to optional OCR (ocrmypdf) instead: run_ocr()
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    # no memory limit (windows)
+    resource = None
+
+from pdf_text import has_pdftotext
+from pdf_text import countPDFPages
+from pdf_text import classify_pdf
+from pdf_text import PDFMINER_PROFILES
+from pdf_cache import sidecar_path
+from pdf_cache import write_text_cache
+
+from pdf_stats import stage
+from pdf_stats import count
+
+import pdf_log as log
+
+ENGINES = ['pdftotext', 'pdfminer-full', 'pdfminer-fast', 'skip']
+TIMEOUT = 60                        # seconds per file
+MEMORY = 1024                       # MB per extraction process
+FULL_PAGES = 60
+SKIP_PAGES = 2000
+SKIP_SIZE = 500 * 1024 * 1024
+
+OCR_TIMEOUT = 600
+
+# status of earlier run - file is skipped in later runs (unless update)
+SKIP_STATUS = ['timeout', 'memory', 'image']
+
+
+def choose_engine(size, pages, pdftotext=None):
+    """ engine by file size and page count (pages None: unknown) """
+
+    if pdftotext is None:
+        pdftotext = has_pdftotext()
+
+    if (size > SKIP_SIZE) or ((pages or 0) > SKIP_PAGES):
+        return 'skip'
+    if pdftotext:
+        return 'pdftotext'
+    if (pages is not None) and (pages <= FULL_PAGES):
+        return 'pdfminer-full'
+
+    return 'pdfminer-fast'
+
+
+def _limit_memory(mb):
+    """ function run in child process before exec - limit address space """
+
+    def func():
+        nbytes = mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (nbytes, nbytes))
+
+    return func
+
+
+def _command(engine, pdf_path, maxpages=0, codec='utf-8'):
+    """ command line of engine - text is written to stdout """
+
+    if engine == 'pdftotext':
+        return ['pdftotext', '-l', str(maxpages), '-enc', codec.upper(), pdf_path, '-']
+
+    # pdfminer-full, pdfminer-fast, pdfminer-layout: this file as script (maxpages -1: pages of profile)
+    profile = engine.split('-')[1]
+    return [sys.executable, os.path.abspath(__file__), profile, str(maxpages if profile != 'fast' else -1), pdf_path]
+
+
+def run_engine(engine, pdf_path, maxpages=0, timeout=TIMEOUT, memory=MEMORY, codec='utf-8'):
+    """ run engine in child process - return (list of lines or None, status) """
+
+    preexec = _limit_memory(memory) if (memory and resource is not None) else None
+
+    count('subprocess.' + engine)
+    try:
+        with stage('extract.' + engine):
+            r = subprocess.run(_command(engine, pdf_path, maxpages=maxpages, codec=codec), stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, timeout=timeout, preexec_fn=preexec)
+    except subprocess.TimeoutExpired:
+        return None, 'timeout'
+    except OSError as e:
+        log.debug('... {} error: {}', engine, e)
+        return None, 'error'
+
+    if r.returncode != 0:
+        err = r.stderr.lower()
+        if (b'memoryerror' in err) or (b'out of memory' in err) or (b'bad_alloc' in err) or (r.returncode == -signal.SIGABRT):
+            return None, 'memory'
+        log.debug('... {} error [{}]: {}', engine, r.returncode, r.stderr[-200:])
+        return None, 'error'
+
+    return r.stdout.decode(codec, errors='replace').splitlines(True), 'ok'
+
+
+def run_layout(pdf_path, maxpages=2, timeout=TIMEOUT, memory=MEMORY):
+    """ pdfminer layout of first pages in child process - return (list of (page, text, font size) or None, status) """
+
+    lines, status = run_engine('pdfminer-layout', pdf_path, maxpages=maxpages, timeout=timeout, memory=memory)
+    if lines is None:
+        return None, status
+
+    return [tuple(json.loads(t)) for t in lines if t.strip() != ''], status
+
+
+def _save(lines, pdf_path, cache='txt'):
+    """ save text cache (sidecar or cache store) """
+
+    if cache == 'txtc':
+        return write_text_cache(lines, sidecar_path(pdf_path, 'txtc', create=True))
+
+    fname = sidecar_path(pdf_path, 'txt', create=True)
+    with open(fname, 'w') as f:
+        f.writelines(lines)
+    return fname
+
+
+def extract_text(pdf_path, cache='txt', timeout=TIMEOUT, memory=MEMORY, engine=None):
+    """ extract text within time and memory budget and save text cache - return (lines, cost)
+
+    when pdftotext fails, pdfminer runs in the rest of the time budget
+    """
+
+    start = time.perf_counter()
+    size = os.path.getsize(pdf_path)
+    try:
+        pages = countPDFPages(pdf_path)
+    except (OSError, ValueError):
+        pages = None
+
+    kind = classify_pdf(pdf_path)
+    engine = engine or (choose_engine(size, pages) if kind != 'image' else 'skip')
+    lines, status = None, 'skip' if kind != 'image' else 'image'
+
+    if engine != 'skip':
+        lines, status = run_engine(engine, pdf_path, timeout=timeout, memory=memory)
+
+    if (status == 'error') and (engine == 'pdftotext'):
+        remaining = timeout - (time.perf_counter() - start)
+        engine = choose_engine(size, pages, pdftotext=False)
+        if (engine != 'skip') and (remaining > 1):
+            lines, status = run_engine(engine, pdf_path, timeout=remaining, memory=memory)
+
+    if lines is not None:
+        _save(lines, pdf_path, cache=cache)
+        # text sample decides: almost no text is scanned pages with stamp, unknown resources with text are 'text'
+        kind = classify_pdf(pdf_path, lines=lines, maxpages=PDFMINER_PROFILES['fast']['maxpages'] if engine == 'pdfminer-fast' else 0)
+    elif status == 'image':
+        log.info('... image only (ocr queue): {}', os.path.basename(pdf_path))
+    else:
+        log.warning('... extract {} [{}]: {}', status, engine, os.path.basename(pdf_path))
+
+    cost = {'engine': engine, 'status': status, 'seconds': round(time.perf_counter() - start, 3),
+            'lines': len(lines or []), 'pages': pages, 'size': size, 'kind': kind}
+
+    return lines or [], cost
+
+
+def has_ocr():
+    """ check ocrmypdf command (optional) """
+
+    return shutil.which('ocrmypdf') is not None
+
+
+def run_ocr(pdf_path, cache='txt', timeout=OCR_TIMEOUT, language='eng'):
+    """ OCR of image-only pdf by ocrmypdf into text cache (pdf is not changed) - return (lines, status) """
+
+    import tempfile
+
+    if not has_ocr():
+        return [], 'error'
+
+    with tempfile.TemporaryDirectory(prefix='py_readpaper_ocr_') as tmp:
+        sidecar = os.path.join(tmp, 'text.txt')
+        cmd = ['ocrmypdf', '--skip-text', '-l', language, '--sidecar', sidecar, pdf_path, os.path.join(tmp, 'out.pdf')]
+
+        count('subprocess.ocrmypdf')
+        try:
+            with stage('extract.ocr'):
+                r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return [], 'timeout'
+
+        if (r.returncode != 0) or (not os.path.exists(sidecar)):
+            log.debug('... ocrmypdf error [{}]: {}', r.returncode, r.stderr[-200:])
+            return [], 'error'
+
+        with open(sidecar, 'r', errors='replace') as f:
+            lines = f.readlines()
+
+    _save(lines, pdf_path, cache=cache)
+    return lines, 'ok'
+
+
+if __name__ == '__main__':
+    # child process of pdfminer engines: pdf_extract.py PROFILE MAXPAGES PDF
+    profile, maxpages, pdf_path = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+
+    if profile == 'layout':
+        # json line of (page, text, font size) per text line
+        from pdf_parse import layout_lines
+        text = [json.dumps(t) + '\n' for t in layout_lines(pdf_path, maxpages=maxpages) or []]
+    else:
+        from pdf_text import convertPDF_pdfminer
+        text = convertPDF_pdfminer(pdf_path, maxpages=None if maxpages < 0 else maxpages, profile=profile)
+    sys.stdout.buffer.write(''.join(text).encode('utf-8'))
@@ -0,0 +1,82 @@
+"""
+pdf_index.py
+
+library index - one json line per pdf file in hidden `.index.jsonl`
+"""
+
+import os
+import glob
+import json
+
+from pdf_text import parse_fname
+from pdf_text import countPDFPages
+from pdf_text import classify_pdf
+from pdf_cache import sidecar_path
+
+INDEX_FNAME = '.index.jsonl'
+# bib items of index item (from filename) - other items are file information
+INDEX_BIB_FIELDS = ['year', 'author1', 'journal']
+
+
+def index_path(base):
+    """ index file name of library directory """
+
+    return os.path.join(os.path.abspath(base), INDEX_FNAME)
+
+
+def scan_file(filename):
+    """ collect cheap information of pdf file (filename, size, pages, kind, sidecars)
+
+    kind: 'text', 'image' (scanned paper without text layer), 'empty' or 'unknown' (see classify_pdf)
+    """
+
+    base, fname = os.path.split(os.path.abspath(filename))
+    st = os.stat(filename)
+
+    item = {'fname': fname, 'size': st.st_size, 'mtime': st.st_mtime, 'pages': countPDFPages(filename), 'kind': classify_pdf(filename),
+            'bib': os.path.exists(sidecar_path(filename, 'bib')),
+            'txt': os.path.exists(sidecar_path(filename, 'txt'))}
+
+    res = parse_fname(fname)
+    if res is not None:
+        item['year'], item['author1'], item['journal'] = res
+
+    return item
+
+
+def list_pdfs(base):
+    """ list pdf files in directory """
+
+    return sorted(glob.glob(os.path.join(base, '*.pdf')))
+
+
+def read_index(base):
+    """ read index file - return dict of {fname: item} """
+
+    fname = index_path(base)
+    if not os.path.exists(fname):
+        return {}
+
+    res = {}
+    with open(fname, 'r') as f:
+        for line in f:
+            if line.strip() == '': continue
+            item = json.loads(line)
+            res[item['fname']] = item
+
+    return res
+
+
+def save_index(base, items):
+    """ save index items (dict or list) into index file """
+
+    if isinstance(items, dict):
+        items = items.values()
+
+    fname = index_path(base)
+    with open(fname + '.tmp', 'w') as f:
+        for item in sorted(items, key=lambda x: x['fname']):
+            f.write(json.dumps(item, sort_keys=True) + '\n')
+    os.replace(fname + '.tmp', fname)
+
+    return fname
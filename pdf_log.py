@@ -0,0 +1,212 @@
+"""
+pdf_log.py
+
+messages and events of py_readpaper (logging module, logger 'py_readpaper')
+
+    log.info('... save to {}', filename)      - formatted only when shown
+    log.debug('... same value {}', v, show=self._debug)
+    log.event('stage', stage='update.doi', seconds=0.2)
+    set_level('warning')                      - console handler (stderr) and its level
+    enable_trace('trace.jsonl')               - json lines of messages, events and stage times
+
+as library, info messages (and debug messages with show=True) and warnings go to stderr
+as print did before - or only to handlers of the application when it configured logging
+(logging.basicConfig). set_level makes the console handler explicit (command line).
+
+environment variables (set by set_level and enable_trace for worker processes):
+    PY_READPAPER_LOG - console level (debug, info, warning, error)
+    PY_READPAPER_TRACE - json lines trace file
+"""
+
+import os
+import sys
+import json
+import logging
+import contextvars
+
+LOG_ENV = 'PY_READPAPER_LOG'
+TRACE_ENV = 'PY_READPAPER_TRACE'
+LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING, 'error': logging.ERROR}
+
+logger = logging.getLogger('py_readpaper')
+_context = contextvars.ContextVar('py_readpaper_log_context', default={})
+_trace = None
+
+
+class _Message(object):
+    """ message formatted by str.format on first use """
+
+    __slots__ = ('fmt', 'args')
+
+    def __init__(self, fmt, args):
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self):
+        return self.fmt.format(*self.args) if self.args else self.fmt
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """ messages to current sys.stderr - events go only to trace
+
+    default (library): only when the application has no handlers of its own (root logger)
+    """
+
+    def __init__(self, level=logging.INFO):
+        logging.Handler.__init__(self, level)
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.default = True
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    def filter(self, record):
+        if hasattr(record, 'event'):
+            return False
+        return (not self.default) or (len(logging.getLogger().handlers) == 0)
+
+
+class _JsonHandler(logging.Handler):
+    """ one json line per record - appended by single write (safe for worker processes) """
+
+    def __init__(self, filename):
+        logging.Handler.__init__(self)
+        self.filename = filename
+        self._fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def emit(self, record):
+        item = {'t': round(record.created, 6), 'pid': record.process, 'level': record.levelname.lower()}
+        item.update(getattr(record, 'context', {}))
+        if hasattr(record, 'event'):
+            item['event'] = record.event
+            item.update(record.fields)
+        else:
+            item['msg'] = record.getMessage()
+        try:
+            os.write(self._fd, (json.dumps(item, default=str) + '\n').encode('utf-8'))
+        except OSError:
+            self.handleError(record)
+
+    def close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        logging.Handler.close(self)
+
+
+def _log(level, fmt, args, show=None):
+    """ log message - show=True raises debug message to info level """
+
+    if show: level = max(level, logging.INFO)
+    if logger.isEnabledFor(level):
+        logger.log(level, _Message(fmt, args), extra={'context': _context.get()})
+
+
+def debug(fmt, *args, **kwargs):
+    _log(logging.DEBUG, fmt, args, show=kwargs.get('show'))
+
+
+def info(fmt, *args, **kwargs):
+    _log(logging.INFO, fmt, args, show=kwargs.get('show'))
+
+
+def warning(fmt, *args, **kwargs):
+    _log(logging.WARNING, fmt, args)
+
+
+def error(fmt, *args, **kwargs):
+    _log(logging.ERROR, fmt, args)
+
+
+def event(kind, **fields):
+    """ structured event (only written into trace) """
+
+    if _trace is None:
+        return
+    logger.info(kind, extra={'event': kind, 'fields': fields, 'context': _context.get()})
+
+
+class context(object):
+    """ add fields (e.g. paper filename) to messages and events in this thread or asyncio task """
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def __enter__(self):
+        self._token = _context.set(dict(_context.get(), **self.fields))
+        return self
+
+    def __exit__(self, *args):
+        _context.reset(self._token)
+
+
+def _stage_hook(kind, name, value):
+    """ pdf_stats hook - write stage times into trace """
+
+    if kind == 'stage':
+        event('stage', stage=name, seconds=round(value, 6))
+
+
+def _update_level():
+    """ logger passes lowest level of console and trace """
+
+    levels = [h.level for h in (_console, _trace) if h is not None]
+    logger.setLevel(min(levels))
+
+
+def set_level(level, export=True):
+    """ set console level ('debug', 'info', 'warning', 'error') - export to worker processes by environment """
+
+    level = LEVELS.get(level, level) if isinstance(level, str) else level
+    _console.default = False
+    logger.propagate = False
+
+    _console.setLevel(level)
+    _update_level()
+    if export: os.environ[LOG_ENV] = logging.getLevelName(level).lower()
+
+
+def enable_trace(filename, level='info'):
+    """ write messages, events and stage times as json lines into filename """
+
+    global _trace
+    from pdf_stats import add_hook
+
+    disable_trace()
+    _trace = _JsonHandler(os.path.abspath(filename))
+    _trace.setLevel(LEVELS.get(level, level))
+    logger.addHandler(_trace)
+    _update_level()
+    add_hook(_stage_hook)
+    os.environ[TRACE_ENV] = _trace.filename
+
+    return _trace.filename
+
+
+def disable_trace():
+    """ stop writing trace """
+
+    global _trace
+    from pdf_stats import remove_hook
+
+    if _trace is None:
+        return
+    logger.removeHandler(_trace)
+    _trace.close()
+    remove_hook(_stage_hook)
+    _trace = None
+    os.environ.pop(TRACE_ENV, None)
+    _update_level()
+
+
+_console = _ConsoleHandler()
+logger.addHandler(_console)
+_update_level()
+
+# worker processes of command line: same console level and trace file as main process
+if os.environ.get(LOG_ENV):
+    set_level(os.environ[LOG_ENV], export=False)
+if os.environ.get(TRACE_ENV):
+    enable_trace(os.environ[TRACE_ENV])
@@ -9,24 +9,22 @@ sources:
 """
 
 import os
+import re
 import json
-import requests
-import pandas as pd
 
 from urllib.parse import urlencode, quote_plus
 from urllib.error import HTTPError
 
-import bibtexparser
-from bibtexparser.bparser import BibTexParser
-from bibtexparser.bibdatabase import BibDatabase
-from bibtexparser.bwriter import BibTexWriter
-from bibtexparser.customization import convert_to_unicode
+from pdf_text import find_author1
+from pdf_snapshot import get_snapshot
 
-from arxiv2bib import arxiv2bib
+from pdf_stats import stage
+from pdf_stats import count
 
-from Levenshtein import ratio, matching_blocks, editops
+import pdf_log as log
 
-from pdf_text import find_author1
+# requests, pandas, bibtexparser, arxiv2bib and Levenshtein are imported
+# inside the functions using them (import time of py_readpaper)
 
 EMPTY_RESULT = {
     "crossref_title": "",
@@ -34,10 +32,29 @@ EMPTY_RESULT = {
     "doi": ""
 }
 
+# dois per crossref request (works?filter=doi:A,doi:B,...)
+CROSSREF_BATCH = 50
+CROSSREF_FIELDS = ['DOI', 'type', 'title', 'author', 'container-title', 'issued', 'published-print', 'published-online',
+                   'volume', 'issue', 'page', 'publisher', 'ISSN', 'URL']
+
+# crossref (csl) type to bibtex entry type
+CSL_TYPES = {'journal-article': 'article', 'proceedings-article': 'inproceedings', 'book-chapter': 'inbook',
+             'book': 'book', 'monograph': 'book', 'edited-book': 'book', 'reference-book': 'book',
+             'report': 'techreport', 'dissertation': 'phdthesis'}
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']     # bibtex month macros
+
+_RE_TAG = re.compile(r'<[^>]+>')
+_RE_ENTRY = re.compile(r'\s*@(\w+)\s*\{\s*([^,\s]*)\s*,')
+_RE_FIELD = re.compile(r'\s*(\w[\w\-]*)\s*=\s*\{')
+_RE_BRACE = re.compile(r'[{}]')
+
 
 def get_bib(doi, filename=None):
     """ get bib from crossref.org and arXiv.org """
 
+    import requests
+    from arxiv2bib import arxiv2bib
+
     if doi is None:
         return False, None
     if not isinstance(doi, str):
@@ -49,7 +66,9 @@ def get_bib(doi, filename=None):
     # for arXiv:XXXX case
     if doi.lower()[:5] == "arxiv":
         doi = doi[6:]
-        bib_object = arxiv2bib([doi])
+        count('http.arxiv')
+        with stage('http.arxiv'):
+            bib_object = arxiv2bib([doi])
         bib = bib_object[0].bibtex()
         if len(bib) > 0:
             found = True
@@ -57,53 +76,158 @@ def get_bib(doi, filename=None):
         else:
             found = False
 
-    # for crossref
+    # for crossref - json converted directly (no bibtex text)
     else:
-        bare_url = "http://api.crossref.org/"
-        url = "{}works/{}/transform/application/x-bibtex"
-        url = url.format(bare_url, doi)
+        url = "https://api.crossref.org/works/{}".format(doi)
 
-        r = requests.get(url)
+        count('http.crossref')
+        with stage('http.crossref'):
+            r = requests.get(url)
 
-        found = False if r.status_code != 200 else True
+        if r.status_code == 200:
+            found = True
+            bib = csl_to_dict(r.json()['message'])
+            if filename is not None:
+                save_bib([bib], filename)
 
-        bibtex_str = str(r.content, "utf-8")
+    return found, bib
 
-        if bibtex_str.find("Resource not found") == -1:
-            if filename is not None:
-                with open(filename, "w") as f:
-                    f.write(bibtex_str)
 
-            bib = bib_to_dict(bibtex_str)
-        else:
-            found = False
+def csl_to_dict(item):
+    """ convert crossref json (csl) item to dictionary as bib_to_dict of crossref bibtex """
+
+    def first(name):
+        v = item.get(name) or ['']
+        return _RE_TAG.sub('', v[0] if isinstance(v, list) else v).strip()
+
+    authors = []
+    for a in item.get('author', []):
+        if 'family' in a:
+            authors.append('{}, {}'.format(a['family'], a['given']) if a.get('given') else a['family'])
+        elif 'name' in a:
+            authors.append(a['name'])
+
+    date = []
+    for name in ['issued', 'published-print', 'published-online']:
+        date = (item.get(name) or {}).get('date-parts', [[]])[0] or []
+        if (len(date) > 0) and (date[0] is not None): break
+
+    entrytype = CSL_TYPES.get(item.get('type', ''), 'misc')
+    family = authors[0].split(',')[0].replace(' ', '_') if len(authors) > 0 else 'Unknown'
+    bib = {'ENTRYTYPE': entrytype,
+           'ID': '{}_{}'.format(family, date[0] if len(date) > 0 else ''),
+           'title': first('title'),
+           'author': ' and '.join(authors),
+           'doi': item.get('DOI', ''),
+           'url': item.get('URL', ''),
+           'publisher': item.get('publisher', ''),
+           'volume': item.get('volume', ''),
+           'number': item.get('issue', ''),
+           'pages': item.get('page', ''),
+           'issn': ', '.join(item.get('ISSN', []))}
+    bib['journal' if entrytype == 'article' else 'booktitle'] = first('container-title')
+    if len(date) > 0: bib['year'] = str(date[0])
+    if len(date) > 1: bib['month'] = MONTHS[int(date[1]) - 1]
+
+    return {k: v for k, v in bib.items() if v != ''}
+
+
+def ncbi_to_dict(record):
+    """ convert ncbi id converter record to bib fields (doi, pmid, pmcid) """
+
+    return {k: str(record[k]) for k in ['doi', 'pmid', 'pmcid'] if record.get(k, '') not in ['', None]}
+
+
+def get_bibs(dois, batch=CROSSREF_BATCH):
+    """ get bibs of many dois - return {doi (lower case): bib}
+
+    crossref dois are fetched by batch dois per request (json listing), arXiv ids and dois with comma one by one.
+    dois not found are not in result.
+    """
+
+    import requests
+
+    res = {}
+    dois = list(dict.fromkeys(d for d in dois if isinstance(d, str) and (d != '')))
+    single = [d for d in dois if (d.lower()[:5] == 'arxiv') or (',' in d)]
+    dois = [d for d in dois if d not in single]
+
+    url = "https://api.crossref.org/works"
+    with requests.Session() as session:
+        for i in range(0, len(dois), batch):
+            chunk = dois[i:i+batch]
+            params = {'filter': ','.join('doi:' + d for d in chunk), 'rows': len(chunk), 'select': ','.join(CROSSREF_FIELDS)}
+
+            count('http.crossref')
+            with stage('http.crossref'):
+                try:
+                    r = session.get(url, params=params, timeout=60)
+                except requests.RequestException as e:
+                    log.warning('... crossref error: {} dois [{}]', len(chunk), e)
+                    continue
 
-    return found, bib
+            if r.status_code != 200:
+                log.warning('... crossref error [{}]: {} dois', r.status_code, len(chunk))
+                continue
+            for item in r.json()['message']['items']:
+                res[item['DOI'].lower()] = csl_to_dict(item)
 
+    for d in single:
+        found, bib = get_bib(d)
+        if found and isinstance(bib, dict):
+            res[d.lower()] = bib
 
-def save_bib(bib_dict, filename):
-    """ save dictionay bib records into file """
+    log.debug('... crossref: {}/{} dois found', len(res), len(dois) + len(single))
+    return res
 
-    if bib_dict is None: return
 
-    db = BibDatabase()
-    for item in bib_dict:
-        if isinstance(item.get('keywords'), list) and (len(item.get('keywords')) > 0):
-            item['keywords'] = ','.join(item.get('keywords'))
-        else:
-            item['keywords'] = ''
+def _balance_braces(value):
+    """ value without unmatched braces - bibtex counts all braces of value (also \\{) """
+
+    if ('{' not in value) and ('}' not in value):
+        return value
+
+    res, opened = [], []
+    for c in value:
+        if c == '{':
+            opened.append(len(res))
+        elif c == '}':
+            if len(opened) == 0: continue
+            opened.pop()
+        res.append(c)
+    for i in reversed(opened):
+        del res[i]
+
+    return ''.join(res)
+
+
+def bibtex_entry(item):
+    """ bibtex text of one bib dictionary (same layout as bibtexparser BibTexWriter)
 
-        for k in item.keys():
-            item[k] = str(item[k])
+    balanced braces in values are kept, unmatched braces are dropped
+    """
 
-    #print(bib_dict)
-    db.entries = bib_dict
-    writer = BibTexWriter()
+    fields = []
+    for k in sorted(item.keys()):
+        if k in ['ENTRYTYPE', 'ID']: continue
+        v = item[k]
+        if k == 'keywords':
+            v = ','.join(v) if isinstance(v, list) else (v or '')
+        fields.append(',\n {} = {{{}}}'.format(k, _balance_braces(str(v))))
 
+    return '@{}{{{}{}\n}}\n'.format(item.get('ENTRYTYPE', 'article'), item.get('ID', ''), ''.join(fields))
+
+
+def save_bib(bib_dict, filename):
+    """ save dictionay bib records into file """
+
+    if bib_dict is None: return
+
+    # input records are not changed (keywords list is joined in bibtex_entry)
     with open(filename, 'w') as bibfile:
-        bibfile.write(writer.write(db))
+        bibfile.write('\n'.join(bibtex_entry(dict(item, keywords=item.get('keywords'))) for item in bib_dict))
 
-    print('... save to {}'.format(filename))
+    log.info('... save to {}', filename)
 
 
 def read_bib(filename, cache=False, verb=True):
@@ -112,31 +236,88 @@ def read_bib(filename, cache=False, verb=True):
     fname_csv = filename.replace('.bib', '.csv')
 
     if (not os.path.exists(filename)) and (not os.path.exists(fname_csv)):
-        if verb: print("... no bib file: {}".format(filename))
+        log.debug("... no bib file: {}", filename, show=verb)
+        count('bib.missing')
         return None
 
+    if cache:
+        import pandas as pd
+
+    # csv cache of large bib files
     if cache and (os.path.exists(fname_csv)):
+        count('cache.bib.hit')
         p = pd.read_csv(fname_csv, index_col=0)
-        if verb: print('... cached from {}'.format(fname_csv))
+        log.debug('... cached from {}', fname_csv, show=verb)
         return p.to_dict('records')
 
+    if cache: count('cache.bib.miss')
     with open(filename) as f:
         bibtex_str = f.read()
 
-    if verb: print('... read from {}'.format(filename))
+    log.debug('... read from {}', filename, show=verb)
     bib_dict = bib_to_dict(bibtex_str)
 
     if (bib_dict is not None) and cache:
-        if verb: print('... cached to {}'.format(fname_csv))
+        log.debug('... cached to {}', fname_csv, show=verb)
         p = pd.DataFrame.from_dict(bib_dict)
         p.to_csv(fname_csv)
 
     return bib_dict
 
 
+def _read_bibtex(bib_string):
+    """ entries of simple bibtex (layout of bibtex_entry, values in braces without latex)
+
+    None for other bibtex (latex commands, quoted values, @string) - parsed by bibtexparser
+    """
+
+    if '\\' in bib_string:
+        return None
+
+    entries = []
+    pos, n = 0, len(bib_string)
+    while bib_string.find('@', pos) >= 0:
+        m = _RE_ENTRY.match(bib_string, pos)
+        if m is None: return None
+        entry = {'ENTRYTYPE': m.group(1).lower(), 'ID': m.group(2)}
+        pos = m.end()
+
+        while True:
+            m = _RE_FIELD.match(bib_string, pos)
+            if m is None: break
+
+            # value up to matching brace - nested braces are removed (as convert_to_unicode of bibtexparser)
+            depth, pos = 1, m.end()
+            while depth > 0:
+                b = _RE_BRACE.search(bib_string, pos)
+                if b is None: return None
+                depth += 1 if b.group(0) == '{' else -1
+                pos = b.end()
+            entry[m.group(1).lower()] = bib_string[m.end():pos - 1].replace('{', '').replace('}', '')
+            while (pos < n) and bib_string[pos] in ' \t\r\n,': pos += 1
+
+        if (pos >= n) or (bib_string[pos] != '}'): return None
+        entries.append(entry)
+        pos += 1
+
+    return entries
+
+
 def bib_to_dict(bib_string):
     """ convert bibtex string to dictionary """
 
+    entries = _read_bibtex(bib_string)
+    if entries is not None:
+        count('bib.fast')
+        for e in entries:
+            if e.get('keywords', '') != '': e['keywords'] = e['keywords'].split(',')
+        if len(entries) == 0: return None
+        return entries[0] if len(entries) == 1 else entries
+
+    import bibtexparser
+    from bibtexparser.bparser import BibTexParser
+    from bibtexparser.customization import convert_to_unicode
+
     parser = BibTexParser(common_strings=True)
     parser.ignore_nonstandard_types = False
     parser.homogenise_fields = False
@@ -158,6 +339,8 @@ def bib_to_dict(bib_string):
 def get_pmid(idstring, debug=False):
     """ find doi, pmid, pmcid using ncbi website """
 
+    import requests
+
     found = False
 
     tool = "py_readpaper"
@@ -165,11 +348,13 @@ def get_pmid(idstring, debug=False):
     baseurl = "https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/?tool={}&email={}".format(tool, email)
     query = "&ids={}&format=json".format(idstring)
 
-    r = requests.get(baseurl + query)
+    count('http.ncbi')
+    with stage('http.ncbi'):
+        r = requests.get(baseurl + query)
     result = r.json()
 
     if "records" not in result:
-        if debug: print('... not found {}'.format(idstring))
+        log.debug('... not found {}', idstring, show=debug)
         found = False
     else:
         result = result["records"][0]
@@ -181,14 +366,23 @@ def get_pmid(idstring, debug=False):
         return found, None
 
 # modified from https://github.com/OpenAPC/openapc-de/blob/master/python/import_dois.py
-def crossref_query_title(title):
-    """ retrieve doi from paper title """
+def crossref_query_title(title, snapshot=None):
+    """ retrieve doi from paper title (local snapshot when given or set by pdf_snapshot.set_snapshot) """
+
+    db = get_snapshot(snapshot)
+    if db is not None:
+        return db.query_title(title)
+
+    import requests
+    from Levenshtein import ratio
 
     api_url = "https://api.crossref.org/works?"
     params = {"rows": "5", "query.bibliographic": title}
     url = api_url + urlencode(params, quote_via=quote_plus)
 
-    r = requests.get(url)
+    count('http.crossref')
+    with stage('http.crossref'):
+        r = requests.get(url)
     try:
         data = json.loads(r.content)
         #print(data)
@@ -212,13 +406,15 @@ def crossref_query_title(title):
 def find_bib(bibdb, bib, subset=['doi'], threshold=0.6, debug=False):
     """ find bib item from bib file """
 
+    from Levenshtein import ratio
+
     result_list = []
 
     for bibitem in bibdb:
         score = 0
         for by in subset:
             if bib.get(by, "1") == bibitem.get(by, "2"):
-                if debug: print('... {} is same'.format(by))
+                log.debug('... {} is same', by, show=debug)
                 score = score + 1
                 continue
             elif by != 'year':
@@ -232,15 +428,15 @@ def find_bib(bibdb, bib, subset=['doi'], threshold=0.6, debug=False):
                     if author2s == '2': author2s = find_author1(author2)
                     if author1.find(author2s) > -1: score = score + 1
                     if author2.find(author1s) > -1: score = score + 1
-                    if debug: print('... [{}] compare {} | {}'.format(by, author1, author2))
-                    if debug: print('... [{}] compare {} | {}'.format(by, author1s, author2s))
+                    log.debug('... [{}] compare {} | {}', by, author1, author2, show=debug)
+                    log.debug('... [{}] compare {} | {}', by, author1s, author2s, show=debug)
                     continue
 
                 # other item check
                 old_text = str(bibitem.get(by, "2")).lower()
                 new_text = str(bib.get(by, "1")).lower()
                 if ratio(old_text, new_text) > threshold:
-                    if debug: print('... [{}] {} is similar to {}'.format(by, old_text, new_text))
+                    log.debug('... [{}] {} is similar to {}', by, old_text, new_text, show=debug)
                     score = score + 1
                     continue
 
@@ -0,0 +1,282 @@
+"""
+pdf_parse.py
+
+single pass parser of first pages - title, author line, abstract, keywords and doi candidates
+
+    info = parse_first_pages('paper.pdf')
+    {'title': ..., 'author': ..., 'abstract': ..., 'keywords': [...], 'doi': ..., 'dois': [...],
+     'index': {'title': [i, j], 'author': [i, j], 'abstract': [i, j], 'keywords': i}, 'source': 'layout' or 'text'}
+
+lines come from pdfminer layout (with font size - title, author) in a child process with time
+and memory budget (pdf_extract.run_layout), or from text lines of the pdf: text of caller, text
+cache, or pdftotext / fast pdfminer profile in a child process. layout=False uses only text lines
+(enough for doi and keywords). result is cached by content key of pdf (pdf_cache.file_key).
+"""
+
+import os
+import re
+import json
+
+from pdf_text import find_keywords
+from pdf_text import has_pdftotext
+from pdf_text import has_pdfminer
+from pdf_text import PDFMINER_PROFILES
+from pdf_cache import file_key
+from pdf_cache import sidecar_path
+from pdf_cache import read_text_cache
+from pdf_extract import run_engine
+from pdf_extract import run_layout
+from pdf_extract import TIMEOUT
+from pdf_extract import MEMORY
+
+from pdf_stats import stage
+from pdf_stats import count
+
+import pdf_log as log
+
+PARSE_VERSION = 2
+MAXPAGES = 2
+
+_RE_DOI = re.compile(r'\b(10\.\d{4,9}/[^\s"<>]+)')
+_RE_ARXIV = re.compile(r'arXiv:\s?(\d{4}\.\d{4,5}(v\d+)?)', re.IGNORECASE)
+_RE_AUTHOR_MARKS = re.compile(r'[\d\*†‡§¶|]+')
+
+KEYWORD_WORDS = ['keywords', 'key words', 'index terms']
+SECTION_WORDS = ['introduction', '1 introduction', '1. introduction', 'i. introduction', 'background', 'main']
+AFFILIATION_WORDS = ['department', 'university', 'institute', 'laboratory', 'school of', 'college', '@']
+NOT_TITLE_WORDS = ['doi', 'http', 'www.', 'journal', 'vol.', 'volume', '©', 'copyright', 'received', 'arxiv', 'issn', 'letter']
+
+
+def layout_lines(pdf_path, maxpages=MAXPAGES):
+    """ list of (page, text, font size) by pdfminer layout - None when pdfminer is missing
+
+    runs in this process - parse_first_pages runs it in a child process (pdf_extract.run_layout)
+    """
+
+    try:
+        from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams, LTTextContainer, LTTextLine, LTChar
+        from pdfminer.pdfpage import PDFPage
+    except ImportError:
+        return None
+
+    # reading order of text boxes matters for abstract - layout of full profile
+    params = PDFMINER_PROFILES['full']
+    rsrcmgr = PDFResourceManager()
+    device = PDFPageAggregator(rsrcmgr, laparams=LAParams(boxes_flow=params['boxes_flow'], detect_vertical=params['detect_vertical']))
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+
+    res = []
+    try:
+        with open(pdf_path, 'rb') as fp, stage('parse.layout'):
+            for page, p in enumerate(PDFPage.get_pages(fp, set(), maxpages=maxpages, check_extractable=True)):
+                interpreter.process_page(p)
+                for box in device.get_result():
+                    if not isinstance(box, LTTextContainer): continue
+                    for line in box:
+                        if not isinstance(line, LTTextLine): continue
+                        text = line.get_text().strip()
+                        sizes = sorted(c.size for c in line if isinstance(c, LTChar))
+                        # skip single characters (margin stamps)
+                        if len(text) > 2:
+                            res.append((page, text, round(sizes[len(sizes)//2], 1) if sizes else None))
+    finally:
+        device.close()
+
+    return res
+
+
+def _page_lines(text, maxpages=MAXPAGES):
+    """ list of (page, text, None) of first pages from text lines (pages split by form feed) - read lazily """
+
+    res = []
+    page = 0
+    for t in text:
+        for k, part in enumerate(t.split('\x0c')):
+            if k > 0: page += 1
+            if page >= maxpages: return res
+            if part.strip() != '': res.append((page, part.strip(), None))
+
+    return res
+
+
+def _text_lines(pdf_path, maxpages=MAXPAGES, text=None, timeout=TIMEOUT, memory=MEMORY):
+    """ list of (page, text, None) from text, text cache or extraction of first pages in child process """
+
+    if text is not None:
+        return _page_lines(text, maxpages=maxpages)
+
+    txt = sidecar_path(pdf_path, 'txt')
+    if os.path.exists(txt):
+        with open(txt, 'r', errors='replace') as f:
+            return _page_lines(f, maxpages=maxpages)
+
+    cached = read_text_cache(sidecar_path(pdf_path, 'txtc'))
+    if cached is not None:
+        try:
+            return _page_lines(cached, maxpages=maxpages)
+        finally:
+            cached.close()
+
+    engine = 'pdftotext' if has_pdftotext() else 'pdfminer-fast'
+    lines, status = run_engine(engine, pdf_path, maxpages=maxpages, timeout=timeout, memory=memory)
+    if lines is None:
+        log.debug('... {} {}: {}', engine, status, os.path.basename(pdf_path))
+        return []
+
+    return _page_lines(lines, maxpages=maxpages)
+
+
+def _is_title(text):
+    low = text.lower()
+    return (len(text) >= 15) and (len(text.split()) >= 3) and (sum(c.isalpha() for c in text) > 0.6*len(text)) \
+        and not any(w in low for w in NOT_TITLE_WORDS)
+
+
+def _join(texts):
+    """ join lines - words broken by hyphen at line end are joined """
+
+    res = ''
+    for t in texts:
+        if res.endswith('-') and (len(res) > 1) and res[-2].isalpha():
+            res = res[:-1] + t
+        else:
+            res = (res + ' ' + t) if res else t
+    return res
+
+
+def _clean_doi(doi):
+    return doi.rstrip('.,;:)]}')
+
+
+def parse_lines(lines):
+    """ find title, author line, abstract, keywords and dois in one pass over (page, text, size) lines """
+
+    info = {'title': '', 'author': '', 'abstract': '', 'keywords': [], 'doi': '', 'dois': [], 'index': {}}
+    title = None             # [start, end] of title lines
+    title_size = None
+    abstract = None          # [start, end] of abstract lines
+    abstract_size = None
+    keywords = None
+
+    for i, (page, text, size) in enumerate(lines):
+        low = text.lower()
+
+        # doi and arxiv candidates
+        for m in _RE_DOI.finditer(text):
+            doi = _clean_doi(m.group(1))
+            if doi not in info['dois']: info['dois'].append(doi)
+        for m in _RE_ARXIV.finditer(text):
+            doi = 'arXiv:' + m.group(1)
+            if doi not in info['dois']: info['dois'].append(doi)
+
+        # keywords line
+        if (keywords is None) and any(low.startswith(w) for w in KEYWORD_WORDS):
+            keywords = i
+            marker = [w for w in KEYWORD_WORDS if low.startswith(w)][0]
+            if (abstract is not None) and (abstract[1] is None): abstract[1] = i
+
+        # abstract span - from 'abstract' to keywords, first section or change of font size
+        if abstract is None:
+            if low.startswith('abstract') or low.startswith('summary'):
+                abstract = [i, None]
+                abstract_size = None
+        elif abstract[1] is None:
+            if any(low.startswith(w) for w in SECTION_WORDS) or (page > lines[abstract[0]][0] + 1):
+                abstract[1] = i
+            elif (size is not None) and (abstract_size is not None) and (abs(size - abstract_size) > 1.0):
+                abstract[1] = i
+            elif (abstract_size is None) and (len(text) >= 20):
+                abstract_size = size
+
+        # title - largest font on first page (first title-like line without font size)
+        if page == 0:
+            if (size is not None) and (title_size is not None) and (title[1] == i) and (abs(size - title_size) <= 0.5):
+                title[1] = i + 1
+            elif (size is not None) and _is_title(text) and ((title is None) or ((title_size is not None) and (size > title_size + 0.5))):
+                title, title_size = [i, i+1], size
+            elif (size is None) and (title is None) and _is_title(text):
+                title = [i, i+1]
+
+    if (abstract is not None) and (abstract[1] is None):
+        abstract[1] = min(abstract[0] + 30, len(lines))
+
+    if title is not None:
+        info['title'] = _join(lines[j][1] for j in range(*title))
+        info['index']['title'] = title
+
+        # author lines follow title (same font size, up to 3 lines)
+        start = end = title[1]
+        stop = min(start + 3, abstract[0] if abstract is not None else len(lines), len(lines))
+        while (end < stop) and ((end == start) or ((lines[end][2] is not None) and (lines[end][2] == lines[start][2]))):
+            if any(w in lines[end][1].lower() for w in AFFILIATION_WORDS): break
+            end += 1
+        if end > start:
+            text = _RE_AUTHOR_MARKS.sub(' ', ' '.join(lines[j][1] for j in range(start, end)))
+            info['author'] = re.sub(r'(\s*,)+', ',', ' '.join(text.split())).strip(' ,')
+            info['index']['author'] = [start, end]
+
+    if abstract is not None:
+        text = _join(lines[j][1] for j in range(*abstract))
+        info['abstract'] = re.sub(r'^(abstract|summary)[\s\.:\-—]*', '', ' '.join(text.split()), flags=re.IGNORECASE)
+        info['index']['abstract'] = abstract
+
+    if keywords is not None:
+        # marker ('index terms—', 'key words:') replaced by one find_keywords knows
+        text = lines[keywords][1][len(marker):].lstrip(' :.-–—')
+        info['keywords'] = sorted(find_keywords(['keywords: ' + text]))
+        info['index']['keywords'] = keywords
+
+    if len(info['dois']) > 0:
+        info['doi'] = info['dois'][0]
+
+    return info
+
+
+def parse_first_pages(pdf_path, maxpages=MAXPAGES, update=False, layout=True, text=None, timeout=TIMEOUT, memory=MEMORY):
+    """ parse first pages once - result cached by content key of pdf
+
+    layout: pdfminer layout with font sizes (title, author) in child process within timeout
+            seconds and memory MB - otherwise only text lines (text: lines of pdf already read)
+    result parsed without layout is parsed again when layout is asked.
+    nothing is cached when no text lines were found (e.g. text cache or ocr text comes later)
+    """
+
+    fname = sidecar_path(pdf_path, 'parse.json')
+    key = file_key(pdf_path)
+
+    if (not update) and os.path.exists(fname):
+        try:
+            with open(fname, 'r') as f:
+                item = json.load(f)
+            if (item.get('key') == key) and (item.get('version') == PARSE_VERSION) and (item.get('layout', True) or not layout):
+                count('cache.parse.hit')
+                return item['info']
+        except ValueError:
+            pass
+
+    count('cache.parse.miss')
+    lines, source = None, 'layout'
+    if layout and has_pdfminer():
+        lines, status = run_layout(pdf_path, maxpages=maxpages, timeout=timeout, memory=memory)
+        if lines is None:
+            log.debug('... layout {}: {}', status, os.path.basename(pdf_path))
+    # no pdfminer, broken pdf, layout over budget or image-only pdf (ocr text in text cache)
+    if not lines:
+        lines, source = _text_lines(pdf_path, maxpages=maxpages, text=text, timeout=timeout, memory=memory), 'text'
+
+    with stage('parse.scan'):
+        info = parse_lines(lines)
+    info['source'] = source
+    log.debug('... parse {} [{}]: {}', os.path.basename(pdf_path), source, info['title'])
+
+    if len(lines) == 0:
+        return info
+
+    fname = sidecar_path(pdf_path, 'parse.json', create=True)
+    with open(fname + '.tmp', 'w') as f:
+        json.dump({'key': key, 'version': PARSE_VERSION, 'layout': layout, 'info': info}, f)
+    os.replace(fname + '.tmp', fname)
+
+    return info
@@ -0,0 +1,334 @@
+"""
+pdf_pipeline.py
+
+staged producer/consumer pipeline - stages are connected by bounded queues
+
+    pipe = Pipeline([Stage('extract', func1, workers=4, kind='process'),
+                     Stage('resolve', coro2, workers=16, kind='async'),
+                     Stage('write', func3, workers=2, kind='thread')], maxsize=64)
+    results = pipe.run(items)
+    pipe.report()
+
+items are dictionaries. each stage returns the item for the next stage (None drops it).
+an exception is stored in item['error'] (and item['stage']) and the item skips later stages.
+when the executor of a stage breaks (e.g. worker process killed), its running and all later
+items fail with that error - the pipeline still ends with every item in the output.
+a stage with batch > 1 gets a list of up to `batch` items and returns a list of the same length
+(a batch is sent when full or when its first item waited `linger` seconds).
+a stage runs at most `workers` items at once and blocks when the next queue is full,
+so the whole pipeline runs at the speed of the slowest stage.
+"""
+
+import os
+import time
+import queue
+import asyncio
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pdf_stats import stage
+from pdf_stats import merge
+from pdf_stats import with_stats
+
+import pdf_log as log
+
+STAGE_KINDS = ['process', 'thread', 'async']
+
+# end of items in queue
+_DONE = object()
+
+
+class Stage(object):
+    """ step of pipeline - func(item) on process pool, thread pool or asyncio loop (coroutine)
+
+    batch > 1: func(list of items) returns list of items (e.g. many dois per http request)
+    """
+
+    def __init__(self, name, func, workers=1, kind='thread', batch=1, linger=1.0):
+        if kind not in STAGE_KINDS:
+            raise ValueError('... stage kind should be one of {}: {}'.format(STAGE_KINDS, kind))
+
+        self.name = name
+        self.func = func
+        self.workers = max(int(workers), 1)
+        self.kind = kind
+        self.batch = max(int(batch), 1)
+        self.linger = linger
+
+    def __repr__(self):
+        return 'Stage({}, workers={}, kind={}, batch={})'.format(self.name, self.workers, self.kind, self.batch)
+
+
+class StageMetrics(object):
+    """ counts and times of one stage """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.start = None
+        self.end = None
+        self.max_queue = 0
+
+    @property
+    def wall(self):
+        if self.start is None: return 0.0
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def throughput(self):
+        """ items per second """
+        return self.items / max(self.wall, 1e-6)
+
+    @property
+    def utilization(self):
+        """ busy time / (wall time x workers) """
+        return self.busy / max(self.wall * self.workers, 1e-6)
+
+    def as_dict(self):
+        return {'stage': self.name, 'workers': self.workers, 'items': self.items, 'errors': self.errors,
+                'busy': round(self.busy, 6), 'wall': round(self.wall, 6), 'throughput': round(self.throughput, 3),
+                'utilization': round(self.utilization, 3), 'max_queue': self.max_queue}
+
+
+def _paper(item):
+    """ paper name for log messages """
+
+    f = item.get('filename') if isinstance(item, dict) else None
+    return os.path.basename(f) if f else ''
+
+
+def _call(name, func, item):
+    """ run stage function - return (result or exception, seconds) """
+
+    start = time.perf_counter()
+    with log.context(paper=_paper(item)), stage('pipeline.' + name):
+        try:
+            res = func(item)
+        except Exception as e:
+            res = e
+    return res, time.perf_counter() - start
+
+
+async def _acall(name, func, item):
+    """ run stage coroutine - return (result or exception, seconds) """
+
+    start = time.perf_counter()
+    with log.context(paper=_paper(item)), stage('pipeline.' + name):
+        try:
+            res = await func(item)
+        except Exception as e:
+            res = e
+    return res, time.perf_counter() - start
+
+
+async def to_thread(func, *args, **kwargs):
+    """ run blocking function (http client, file io) from coroutine of async stage """
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+class _AsyncRunner(object):
+    """ asyncio loop in background thread - blocking calls use thread pool of `workers` """
+
+    def __init__(self, workers):
+        self.loop = asyncio.new_event_loop()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self.loop.set_default_executor(self._pool)
+        self._thread = threading.Thread(target=self.loop.run_forever, name='pipeline-async', daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self._pool.shutdown()
+
+
+class Pipeline(object):
+    """ stages connected by bounded queues (maxsize items between two stages) """
+
+    def __init__(self, stages, maxsize=64):
+        self.stages = list(stages)
+        self.maxsize = maxsize
+        self.metrics = []
+
+    def _submit(self, st, executor, item):
+        if st.kind == 'process':
+            return executor.submit(with_stats, _call, st.name, st.func, item)
+        if st.kind == 'async':
+            return executor.submit(_acall(st.name, st.func, item))
+        return executor.submit(_call, st.name, st.func, item)
+
+    def _collect(self, st, metrics, futures, inflight, outq):
+        """ pass results of finished futures to next queue """
+
+        for fut in futures:
+            item = inflight.pop(fut)
+            try:
+                res = fut.result()
+                if st.kind == 'process':
+                    res, snapshot = res
+                    merge(snapshot)
+                res, seconds = res
+            except Exception as e:
+                # broken worker process
+                res, seconds = e, 0.0
+
+            metrics.busy += seconds
+            self._output(st, metrics, item, res, outq)
+
+    def _output(self, st, metrics, item, res, outq):
+        """ pass result of item (or batch of items) to next queue - exceptions are stored in items """
+
+        if st.batch == 1:
+            items, results = [item], [res]
+        elif isinstance(res, Exception) or (len(res) != len(item)):
+            if not isinstance(res, Exception):
+                res = ValueError('... batch result of {} items for {} items'.format(len(res), len(item)))
+            items, results = item, [res] * len(item)
+        else:
+            items, results = item, res
+
+        for item, res in zip(items, results):
+            metrics.items += 1
+            if isinstance(res, Exception):
+                metrics.errors += 1
+                log.warning('... [{}] error [{}]: {}', st.name, _paper(item), res)
+                res = dict(item, error=res, stage=st.name)
+            if res is not None:
+                outq.put(res)
+        metrics.end = time.perf_counter()
+
+    def _send(self, st, metrics, executor, item, inflight, outq):
+        """ submit item (or batch of items) - wait for free worker. return exception of broken executor or None """
+
+        while len(inflight) >= st.workers:
+            done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            self._collect(st, metrics, done, inflight, outq)
+
+        try:
+            inflight[self._submit(st, executor, item)] = item
+        except Exception as e:
+            # broken pool (worker process died) or executor shut down
+            self._output(st, metrics, item, e, outq)
+            return e
+
+    def _drive(self, st, metrics, inq, outq):
+        """ feed items of input queue to stage executor - at most st.workers items at once """
+
+        if st.kind == 'process':
+            executor = ProcessPoolExecutor(max_workers=st.workers)
+        elif st.kind == 'async':
+            executor = _AsyncRunner(st.workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=st.workers)
+
+        inflight = {}
+        pending = []            # items of next batch
+        since = None            # arrival of first item of batch
+        broken = None           # error of broken executor - later items fail without running
+        try:
+            while True:
+                try:
+                    item = inq.get(timeout=0.05)
+                except queue.Empty:
+                    if pending and (time.perf_counter() - since > st.linger):
+                        broken = self._send(st, metrics, executor, pending, inflight, outq)
+                        pending = []
+                    self._collect(st, metrics, [f for f in list(inflight) if f.done()], inflight, outq)
+                    continue
+
+                if item is _DONE:
+                    break
+                if metrics.start is None:
+                    metrics.start = time.perf_counter()
+                metrics.max_queue = max(metrics.max_queue, inq.qsize() + 1)
+
+                # failed items skip later stages
+                if isinstance(item, dict) and ('error' in item):
+                    outq.put(item)
+                    continue
+
+                if broken is not None:
+                    self._output(st, metrics, [item] if st.batch > 1 else item, broken, outq)
+                    continue
+
+                if st.batch == 1:
+                    broken = self._send(st, metrics, executor, item, inflight, outq)
+                    continue
+
+                if not pending: since = time.perf_counter()
+                pending.append(item)
+                if (len(pending) >= st.batch) or (time.perf_counter() - since > st.linger):
+                    broken = self._send(st, metrics, executor, pending, inflight, outq)
+                    pending = []
+
+            if pending:
+                self._send(st, metrics, executor, pending, inflight, outq)
+            done, _ = wait(list(inflight))
+            self._collect(st, metrics, done, inflight, outq)
+        except Exception as e:
+            # stage thread must not die - upstream stages would block on full input queue
+            log.error('... [{}] stage error: {}', st.name, e)
+            for fut, item in list(inflight.items()):
+                self._output(st, metrics, item, e, outq)
+            if pending:
+                self._output(st, metrics, pending, e, outq)
+            while True:
+                item = inq.get()
+                if item is _DONE: break
+                if isinstance(item, dict) and ('error' in item):
+                    outq.put(item)
+                else:
+                    self._output(st, metrics, [item] if st.batch > 1 else item, e, outq)
+        finally:
+            executor.shutdown()
+            outq.put(_DONE)
+
+    def run(self, items, progress=None):
+        """ run all items through stages - return list of output items (progress(n) after each item) """
+
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in range(len(self.stages) + 1)]
+        self.metrics = [StageMetrics(st.name, st.workers) for st in self.stages]
+
+        threads = [threading.Thread(target=self._drive, args=(st, m, queues[i], queues[i+1]), name='pipeline-' + st.name, daemon=True)
+                for i, (st, m) in enumerate(zip(self.stages, self.metrics))]
+        for t in threads: t.start()
+
+        def feed():
+            for item in items:
+                queues[0].put(item)
+            queues[0].put(_DONE)
+
+        feeder = threading.Thread(target=feed, name='pipeline-feed', daemon=True)
+        feeder.start()
+
+        results = []
+        while True:
+            item = queues[-1].get()
+            if item is _DONE: break
+            results.append(item)
+            if progress is not None: progress(len(results))
+
+        feeder.join()
+        for t in threads: t.join()
+        for m in self.metrics:
+            log.event('pipeline', **m.as_dict())
+
+        return results
+
+    def report(self):
+        """ print metrics of each stage """
+
+        print('{:16s} {:>8s} {:>8s} {:>7s} {:>10s} {:>10s} {:>8s} {:>6s}'.format('stage', 'workers', 'items', 'errors', 'busy [s]', 'items/s', 'util', 'queue'))
+        for m in self.metrics:
+            print('{:16s} {:8d} {:8d} {:7d} {:10.3f} {:10.2f} {:8.2f} {:6d}'.format(m.name, m.workers, m.items, m.errors,
+                m.busy, m.throughput, m.utilization, m.max_queue))
@@ -0,0 +1,175 @@
+"""
+pdf_policy.py
+
+conflict resolution between local (pdf, bib file) and remote (crossref, ncbi) values
+
+modes:
+    ask - ask user with input() (default)
+    remote - prefer remote value
+    local - prefer local value
+    longer - prefer longer value
+    review - keep local value and write conflict into review file
+    callable - func(name, local, remote) returns True for remote value
+
+rename of pdf file is not a field conflict - decided by rename mode:
+    yes - rename (default except ask mode)
+    no - keep filename
+    ask - ask user with input() (default of ask mode)
+
+ask needs a terminal and one process (check_policy)
+"""
+
+import os
+import sys
+import json
+import time
+
+POLICY_MODES = ['ask', 'remote', 'local', 'longer', 'review']
+RENAME_MODES = ['yes', 'no', 'ask']
+REVIEW_FNAME = '.review.jsonl'
+
+
+class ConflictPolicy(object):
+    """ decide conflicts without blocking (except ask mode) """
+
+    def __init__(self, mode='ask', review_file=None, rename=None):
+        """ initialize policy - mode is one of POLICY_MODES or callable, rename one of RENAME_MODES """
+
+        if (not callable(mode)) and (mode not in POLICY_MODES):
+            raise ValueError("mode should be one of {} or callable: {}".format(POLICY_MODES, mode))
+        if rename is None:
+            rename = 'ask' if mode == 'ask' else 'yes'
+        if rename not in RENAME_MODES:
+            raise ValueError("rename should be one of {}: {}".format(RENAME_MODES, rename))
+
+        self.mode = mode
+        self.review_file = review_file
+        self.rename = rename
+
+    def __repr__(self):
+        return "ConflictPolicy(mode={}, review_file={}, rename={})".format(self.mode, self.review_file, self.rename)
+
+    @property
+    def interactive(self):
+        """ policy asks user with input() """
+
+        return (self.mode == 'ask') or (self.rename == 'ask')
+
+    def choose_rename(self, local, remote, filename='', prompt=None):
+        """ return True to rename file local (filename) to remote """
+
+        if self.rename == 'yes':
+            return True
+        elif self.rename == 'no':
+            return False
+
+        if prompt is None:
+            prompt = "[rename] \n[1] {}\n[2] {}\nChange? (Yes/No): ".format(local, remote)
+        yesno = input(prompt)
+        return yesno in ['Yes', 'yes', 'Y', 'y', '2']
+
+    def choose(self, name, local, remote, filename='', prompt=None):
+        """ return True to use remote value, False to keep local value """
+
+        if callable(self.mode):
+            return bool(self.mode(name, local, remote))
+
+        if self.mode == 'remote':
+            return True
+        elif self.mode == 'local':
+            return False
+        elif self.mode == 'longer':
+            return len(remote) > len(local) if hasattr(remote, '__len__') and hasattr(local, '__len__') else False
+        elif self.mode == 'review':
+            self.review(name, local, remote, filename=filename)
+            return False
+
+        if prompt is None:
+            prompt = "[{}] \n[1] {}\n[2] {}\nChoose (1/2): ".format(name, local, remote)
+        yesno = input(prompt)
+        return yesno in ['Yes', 'yes', 'Y', 'y', '2']
+
+    def choose_item(self, name, items, filename=''):
+        """ choose one of candidate items (list of dict) - return index or None """
+
+        if callable(self.mode):
+            for i, item in enumerate(items):
+                if self.mode(name, None, item): return i
+            return None
+
+        if self.mode == 'remote':
+            return 0
+        elif self.mode == 'local':
+            return None
+        elif self.mode == 'longer':
+            # most complete item
+            counts = [sum(1 for v in item.values() if str(v) not in ['', 'None', 'nan']) for item in items]
+            return counts.index(max(counts))
+        elif self.mode == 'review':
+            self.review(name, None, items, filename=filename)
+            return None
+
+        number = input("Choose number (or quit): ")
+        if number in ['quit', 'q', 'Q']:
+            return None
+        return int(number)
+
+    def review(self, name, local, remote, filename=''):
+        """ append unresolved conflict into review file (json lines) """
+
+        review_file = self.review_file
+        if review_file is None:
+            base = os.path.dirname(os.path.abspath(filename)) if filename != '' else os.getcwd()
+            review_file = os.path.join(base, REVIEW_FNAME)
+
+        item = {'time': time.time(), 'fname': os.path.basename(filename), 'name': name,
+                'local': _jsonable(local), 'remote': _jsonable(remote)}
+
+        # single write call in append mode - safe for parallel workers
+        with open(review_file, 'a') as f:
+            f.write(json.dumps(item, sort_keys=True) + '\n')
+
+
+def _jsonable(value):
+    """ convert sets to lists for json """
+
+    if isinstance(value, set):
+        return sorted(str(v) for v in value)
+    if isinstance(value, list):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+def get_policy(policy=None, review_file=None, rename=None):
+    """ make ConflictPolicy from mode name, callable or policy """
+
+    if isinstance(policy, ConflictPolicy):
+        return policy
+    if policy is None:
+        policy = 'ask'
+
+    return ConflictPolicy(mode=policy, review_file=review_file, rename=rename)
+
+
+def check_policy(policy, workers=1, review_file=None, rename=None):
+    """ raise ValueError for interactive policy in worker processes/threads or without terminal - return policy """
+
+    policy = get_policy(policy, review_file=review_file, rename=rename)
+    if policy.interactive and ((workers > 1) or (not sys.stdin.isatty())):
+        raise ValueError("... 'ask' needs a terminal and one worker (-w 1) - use other policy for batch runs")
+
+    return policy
+
+
+def read_review(review_file):
+    """ read review file - return list of conflicts """
+
+    if not os.path.exists(review_file):
+        return []
+
+    with open(review_file, 'r') as f:
+        return [json.loads(line) for line in f if line.strip() != '']
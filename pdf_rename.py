@@ -0,0 +1,269 @@
+"""
+pdf_rename.py
+
+bulk rename of pdf files with hidden sidecar files (.bib, .txt, .txtc)
+
+plan_rename - compute collision free target names (checks only candidate names)
+execute_rename - move all files as one journaled batch (rollback on error)
+recover_rename - roll back interrupted batch from journal
+rename_lock - exclusive lock of directory (other processes and threads wait) - lock file is removed on release
+
+    with rename_lock(base):
+        execute_rename(plan_rename(targets))
+
+batches of one directory run one after the other - journal is checked, written and removed
+under the lock, so a concurrent batch never sees or deletes the journal of another one.
+"""
+
+import os
+import json
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:         # no flock (windows) - only threads of this process are locked
+    fcntl = None
+
+from pdf_index import read_index
+from pdf_index import save_index
+from pdf_index import INDEX_FNAME
+
+import pdf_log as log
+
+SIDECAR_EXTS = ['.bib', '.txt', '.txtc', '.parse.json']
+JOURNAL_FNAME = '.rename-journal.jsonl'
+LOCK_FNAME = '.rename.lock'
+
+_locks = {}                 # directory: [RLock, lock file descriptor, depth]
+_locks_guard = threading.Lock()
+
+
+def _lock_file(fname):
+    """ open and flock lock file - open again when holder before has removed it meanwhile """
+
+    while True:
+        fd = os.open(fname, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is None:
+            return fd
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.stat(fname).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def rename_lock(base):
+    """ exclusive lock of directory for rename batches - reentrant in same thread """
+
+    base = os.path.abspath(base)
+    with _locks_guard:
+        lock = _locks.setdefault(base, [threading.RLock(), None, 0])
+
+    with lock[0]:
+        if lock[2] == 0:
+            lock[1] = _lock_file(os.path.join(base, LOCK_FNAME))
+        lock[2] += 1
+        try:
+            yield
+        finally:
+            lock[2] -= 1
+            if lock[2] == 0:
+                # no lock file left in library - removed while locked, waiting processes open it again
+                try:
+                    os.remove(os.path.join(base, LOCK_FNAME))
+                except OSError:
+                    pass
+                os.close(lock[1])       # releases flock
+                lock[1] = None
+
+
+def sidecars(fname):
+    """ hidden sidecar filenames of pdf filename """
+
+    return ['.' + fname.replace('.pdf', ext) for ext in SIDECAR_EXTS]
+
+
+def plan_rename(targets):
+    """ make rename plan from {pdf path: new filename}
+
+    collisions with existing files and other targets get suffix -1, -2, ...
+    only candidate names are checked on disk, so planning one file does not list the directory
+    return list of (old pdf path, new pdf path)
+    """
+
+    plan = []
+    by_dir = {}
+    for src, dst in targets.items():
+        if dst is None: continue
+        src = os.path.abspath(src)
+        by_dir.setdefault(os.path.dirname(src), []).append((src, dst))
+
+    for base, items in by_dir.items():
+        # names of moving files (and their sidecars) are free
+        moving = set()
+        for src, dst in items:
+            if os.path.basename(src) != dst:
+                moving.add(os.path.basename(src))
+                moving.update(sidecars(os.path.basename(src)))
+
+        claimed = set()
+
+        def occupied(fname):
+            return (fname in claimed) or ((fname not in moving) and os.path.lexists(os.path.join(base, fname)))
+
+        for src, dst in sorted(items):
+            fname = os.path.basename(src)
+            if fname == dst: continue
+
+            new_fname, count = dst, 1
+            while occupied(new_fname) or any(occupied(s) for s in sidecars(new_fname)):
+                new_fname = dst.replace('.pdf', '-{}.pdf'.format(count))
+                count = count + 1
+
+            claimed.add(new_fname)
+            claimed.update(sidecars(new_fname))
+            if new_fname != fname:
+                plan.append((src, os.path.join(base, new_fname)))
+
+    return plan
+
+
+def _moves(plan):
+    """ list of file moves (pdf and existing sidecars) of plan """
+
+    moves = []
+    for src, dst in plan:
+        moves.append((src, dst))
+        base = os.path.dirname(src)
+        for s, d in zip(sidecars(os.path.basename(src)), sidecars(os.path.basename(dst))):
+            if os.path.exists(os.path.join(base, s)):
+                moves.append((os.path.join(base, s), os.path.join(os.path.dirname(dst), d)))
+
+    return moves
+
+
+def _journal(f, item):
+    """ append item into journal and flush to disk """
+
+    f.write(json.dumps(item) + '\n')
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _rollback(done):
+    """ undo finished moves in reverse order """
+
+    for src, dst in reversed(done):
+        if os.path.exists(dst) and not os.path.exists(src):
+            os.rename(dst, src)
+
+
+def execute_rename(plan, debug=False):
+    """ move files of plan as one batch - return True on success
+
+    files are moved to temporary names first and then to new names, so
+    swapped names work. every move is written to journal and all moves
+    are rolled back when one fails.
+    """
+
+    if len(plan) == 0:
+        return True
+
+    base = os.path.dirname(plan[0][0])
+    with rename_lock(base):
+        return _execute(plan, base, debug=debug)
+
+
+def _execute(plan, base, debug=False):
+    """ execute_rename holding the directory lock """
+
+    moves = _moves(plan)
+    if os.path.exists(os.path.join(base, JOURNAL_FNAME)):
+        log.warning('... unfinished rename journal exists - run recover_rename first: {}', base)
+        return False
+
+    tmp = [(src, os.path.join(os.path.dirname(src), '.renaming-{}-{}'.format(os.getpid(), i))) for i, (src, dst) in enumerate(moves)]
+    steps = tmp + [(t, dst) for (_, t), (_, dst) in zip(tmp, moves)]
+
+    done = []
+    with open(os.path.join(base, JOURNAL_FNAME), 'a') as journal:
+        # all steps with temporary names - recover_rename can undo a move without 'done' record
+        _journal(journal, {'plan': moves, 'steps': steps})
+        try:
+            for src, dst in steps:
+                if os.path.exists(dst):
+                    raise OSError('target exists: {}'.format(dst))
+                os.rename(src, dst)
+                done.append((src, dst))
+                _journal(journal, {'done': [src, dst]})
+        except OSError as e:
+            log.warning('... rename error: {} - roll back {} moves', e, len(done))
+            _rollback(done)
+            done = None
+
+    os.remove(os.path.join(base, JOURNAL_FNAME))
+    if done is None:
+        return False
+    log.debug('... renamed {} files ({} moves)', len(plan), len(moves), show=debug)
+
+    # keep index current
+    if os.path.exists(os.path.join(base, INDEX_FNAME)):
+        index = read_index(base)
+        for src, dst in plan:
+            item = index.pop(os.path.basename(src), None)
+            if item is not None:
+                item['fname'] = os.path.basename(dst)
+                index[item['fname']] = item
+        save_index(base, index)
+
+    return True
+
+
+def recover_rename(base):
+    """ roll back interrupted rename batch using journal - return number of undone moves """
+
+    fname = os.path.join(base, JOURNAL_FNAME)
+    if not os.path.exists(fname):
+        return 0
+
+    # journal of running batch is removed before lock is released
+    with rename_lock(base):
+        return _recover(base, fname)
+
+
+def _recover(base, fname):
+    """ recover_rename holding the directory lock """
+
+    if not os.path.exists(fname):
+        return 0
+
+    done = []
+    steps = []
+    with open(fname, 'r') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                break
+            if 'done' in item: done.append(tuple(item['done']))
+            if 'steps' in item: steps = [tuple(s) for s in item['steps']]
+
+    # steps run one after the other - step after last 'done' record may be moved without record
+    if len(steps) > len(done):
+        done = steps[:len(done) + 1]
+    _rollback(done)
+    os.remove(fname)
+    log.info('... roll back {} moves: {}', len(done), base)
+
+    return len(done)
+
+
+def print_plan(plan):
+    """ show rename plan """
+
+    for src, dst in plan:
+        print('... {} -> {}'.format(os.path.basename(src), os.path.basename(dst)))
@@ -0,0 +1,220 @@
+"""
+pdf_snapshot.py
+
+offline title/doi lookup - crossref or pubmed json lines dump indexed into sqlite (fts5 token index)
+
+    build_snapshot(['crossref-0.jsonl.gz', 'pubmed.jsonl'], 'works.sqlite')
+    set_snapshot('works.sqlite')              - crossref_query_title uses snapshot (also worker processes)
+    Snapshot('works.sqlite').query_title(title)
+    {'success': True, 'result': {'crossref_title': ..., 'similarity': ..., 'doi': ...}}
+
+one json object per line:
+    crossref - {"DOI": ..., "title": [...], "issued": {"date-parts": [[2004, 1]]}, ...}
+    pubmed   - {"pmid" or "PMID", "doi" or "DOI" or "articleids", "title" or "ArticleTitle", "pubdate" or "year"}
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import sqlite3
+import threading
+from urllib.request import pathname2url
+
+from pdf_stats import stage
+from pdf_stats import count
+
+import pdf_log as log
+
+SNAPSHOT_ENV = 'PY_READPAPER_SNAPSHOT'
+ROWS = 5                # candidates by token index (rows of crossref query)
+MAX_TOKENS = 16
+OR_TOKENS = 4           # longest words of title when not all words match
+
+STOP_WORDS = set(['the', 'of', 'and', 'in', 'on', 'for', 'to', 'with', 'by', 'from', 'at', 'an', 'as', 'is', 'are',
+                  'its', 'via', 'into', 'or', 'be', 'we', 'a'])
+
+_RE_TOKEN = re.compile(r'\w+', re.UNICODE)
+_RE_TAG = re.compile(r'<[^>]+>')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS works (id INTEGER PRIMARY KEY, doi TEXT, pmid TEXT, title TEXT, year INTEGER);
+CREATE VIRTUAL TABLE IF NOT EXISTS titles USING fts5(title, content='works', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+"""
+
+_snapshots = {}
+
+
+def _first(v):
+    if isinstance(v, list): v = v[0] if len(v) > 0 else ''
+    return _RE_TAG.sub('', v or '').strip() if isinstance(v, str) else ''
+
+
+def _record(item):
+    """ (doi, pmid, title, year) of crossref or pubmed json item - None without title """
+
+    title = _first(item.get('title') or item.get('ArticleTitle'))
+    if title == '':
+        return None
+
+    doi = item.get('DOI') or item.get('doi') or ''
+    for a in item.get('articleids', []):
+        if (doi == '') and (a.get('idtype') == 'doi'): doi = a.get('value', '')
+    pmid = str(item.get('pmid') or item.get('PMID') or item.get('uid') or '')
+
+    year = None
+    for name in ['issued', 'published-print', 'published-online']:
+        parts = (item.get(name) or {}).get('date-parts', [[None]])[0] or [None]
+        if parts[0] is not None:
+            year = parts[0]
+            break
+    if year is None:
+        m = re.match(r'\d{4}', str(item.get('year') or item.get('pubdate') or ''))
+        year = int(m.group(0)) if m else None
+
+    return _first(doi), pmid, title, year
+
+
+def _read_jsonl(filename):
+    """ json items of (gzip) json lines file - bad lines are skipped """
+
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(item, dict):
+                yield item
+
+
+def build_snapshot(files, db_path, batch=10000, verb=True):
+    """ index json lines dumps into sqlite snapshot (appended to existing snapshot) - return number of works """
+
+    if isinstance(files, str): files = [files]
+
+    start = time.time()
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.executescript(_SCHEMA)
+
+    n = conn.execute('SELECT COALESCE(MAX(id), 0) FROM works').fetchone()[0]
+    first = n
+    rows = []
+
+    def flush():
+        conn.executemany('INSERT INTO works (id, doi, pmid, title, year) VALUES (?, ?, ?, ?, ?)', rows)
+        conn.executemany('INSERT INTO titles (rowid, title) VALUES (?, ?)', [(r[0], r[3]) for r in rows])
+        conn.commit()
+        del rows[:]
+
+    with stage('snapshot.build'):
+        for fname in files:
+            for item in _read_jsonl(fname):
+                rec = _record(item)
+                if rec is None: continue
+                n += 1
+                rows.append((n,) + rec)
+                if len(rows) >= batch:
+                    flush()
+                    log.debug('... [snapshot] {} works ({:.0f} works/s)', n - first, (n - first) / max(time.time() - start, 1e-6), show=verb)
+        flush()
+
+        conn.execute('CREATE INDEX IF NOT EXISTS works_doi ON works (doi COLLATE NOCASE)')
+        conn.execute("INSERT INTO titles (titles) VALUES ('optimize')")
+        conn.commit()
+    conn.close()
+
+    log.debug('... save {} works to {}', n - first, db_path, show=verb)
+    return n - first
+
+
+def _tokens(title):
+    """ words of title for token index (no stop words, at most MAX_TOKENS) """
+
+    words = [w for w in _RE_TOKEN.findall(title.lower()) if (len(w) > 1) and (w not in STOP_WORDS)]
+    return list(dict.fromkeys(words))[:MAX_TOKENS]
+
+
+class Snapshot(object):
+    """ read only snapshot - one sqlite connection per thread """
+
+    def __init__(self, db_path):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError('... no snapshot: {}'.format(db_path))
+
+        self.db_path = os.path.abspath(db_path)
+        self._local = threading.local()
+
+    def __repr__(self):
+        return 'Snapshot({})'.format(self.db_path)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect('file:{}?mode=ro'.format(pathname2url(self.db_path)), uri=True)
+        return conn
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM works').fetchone()[0]
+
+    def candidates(self, title, rows=ROWS):
+        """ list of (title, doi) by token index - all words first, then any of OR_TOKENS longest words """
+
+        tokens = _tokens(title)
+        if len(tokens) == 0:
+            return []
+
+        sql = 'SELECT w.title, w.doi FROM titles JOIN works w ON w.id = titles.rowid WHERE titles MATCH ? ORDER BY rank LIMIT ?'
+        words = ['"{}"'.format(t) for t in tokens]
+        res = self._conn().execute(sql, (' AND '.join(words), rows)).fetchall()
+        if (len(res) == 0) and (len(words) > 1):
+            # long words are rare - short OR query stays fast on large snapshots
+            words = ['"{}"'.format(t) for t in sorted(tokens, key=len)[-OR_TOKENS:]]
+            res = self._conn().execute(sql, (' OR '.join(words), rows)).fetchall()
+
+        return res
+
+    def query_title(self, title, rows=ROWS):
+        """ retrieve doi from paper title - same result as crossref_query_title """
+
+        from Levenshtein import ratio
+        from pdf_meta import EMPTY_RESULT
+
+        count('snapshot.query')
+        with stage('snapshot.query'):
+            most_similar = EMPTY_RESULT
+            for t, doi in self.candidates(title, rows=rows):
+                result = {
+                    "crossref_title": t,
+                    "similarity": ratio(t.lower(), title.lower()),
+                    "doi": doi
+                }
+                if most_similar["similarity"] < result["similarity"]:
+                    most_similar = result
+
+        return {"success": True, "result": most_similar}
+
+
+def set_snapshot(db_path):
+    """ use local snapshot for title queries (None: crossref api) - also for worker processes """
+
+    if db_path is None:
+        os.environ.pop(SNAPSHOT_ENV, None)
+    else:
+        os.environ[SNAPSHOT_ENV] = os.path.abspath(os.path.expanduser(db_path))
+
+
+def get_snapshot(db_path=None):
+    """ Snapshot of db_path or of set_snapshot - None when not set """
+
+    db_path = db_path or os.environ.get(SNAPSHOT_ENV)
+    if not db_path:
+        return None
+
+    if db_path not in _snapshots:
+        _snapshots[db_path] = Snapshot(db_path)
+    return _snapshots[db_path]
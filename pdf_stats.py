@@ -0,0 +1,141 @@
+"""
+pdf_stats.py
+
+timing and counters of processing stages (per process)
+
+    with stage('doi'): ...         - time of stage
+    count('http.crossref')         - counters (subprocess, http, cache hit/miss)
+    add_hook(func)                 - func(kind, name, value) on each stage and count
+    summary(), report()            - per run summary
+    profile(func, *args)           - run with cProfile
+"""
+
+import io
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+
+_lock = threading.Lock()
+_stages = {}
+_counts = {}
+_hooks = []
+
+
+def reset():
+    """ clear all timers and counters """
+
+    with _lock:
+        _stages.clear()
+        _counts.clear()
+
+
+def add_hook(func):
+    """ add callback func(kind, name, value) - kind is 'stage' (seconds) or 'count' """
+
+    _hooks.append(func)
+    return func
+
+
+def remove_hook(func):
+    """ remove callback """
+
+    if func in _hooks: _hooks.remove(func)
+
+
+def _call_hooks(kind, name, value):
+    for h in list(_hooks):
+        h(kind, name, value)
+
+
+def count(name, n=1):
+    """ increase counter """
+
+    with _lock:
+        _counts[name] = _counts.get(name, 0) + n
+    if _hooks: _call_hooks('count', name, n)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """ measure time of stage """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            item = _stages.setdefault(name, [0, 0.0, 0.0])
+            item[0] += 1
+            item[1] += elapsed
+            item[2] = max(item[2], elapsed)
+        if _hooks: _call_hooks('stage', name, elapsed)
+
+
+def summary():
+    """ snapshot of stages {name: {calls, total, max}} and counts {name: n} """
+
+    with _lock:
+        stages = {k: {'calls': v[0], 'total': v[1], 'max': v[2]} for k, v in _stages.items()}
+        counts = dict(_counts)
+
+    return {'stages': stages, 'counts': counts}
+
+
+def merge(snapshot):
+    """ add summary of other process into this process """
+
+    with _lock:
+        for k, v in snapshot.get('stages', {}).items():
+            item = _stages.setdefault(k, [0, 0.0, 0.0])
+            item[0] += v['calls']
+            item[1] += v['total']
+            item[2] = max(item[2], v['max'])
+        for k, n in snapshot.get('counts', {}).items():
+            _counts[k] = _counts.get(k, 0) + n
+
+
+def report(snapshot=None):
+    """ print summary table """
+
+    snapshot = snapshot or summary()
+
+    print('{:24s} {:>8s} {:>10s} {:>10s} {:>10s}'.format('stage', 'calls', 'total [s]', 'mean [s]', 'max [s]'))
+    for k, v in sorted(snapshot['stages'].items(), key=lambda x: -x[1]['total']):
+        print('{:24s} {:8d} {:10.3f} {:10.3f} {:10.3f}'.format(k, v['calls'], v['total'], v['total']/max(v['calls'], 1), v['max']))
+
+    if len(snapshot['counts']) > 0:
+        print('\n{:24s} {:>8s}'.format('counter', 'n'))
+        for k, n in sorted(snapshot['counts'].items()):
+            print('{:24s} {:8d}'.format(k, n))
+
+
+def profile(func, *args, **kwargs):
+    """ run func with cProfile - return (result, profile text) """
+
+    sortby = kwargs.pop('sortby', 'cumulative')
+    lines = kwargs.pop('lines', 30)
+
+    pr = cProfile.Profile()
+    pr.enable()
+    try:
+        res = func(*args, **kwargs)
+    finally:
+        pr.disable()
+
+    s = io.StringIO()
+    pstats.Stats(pr, stream=s).sort_stats(sortby).print_stats(lines)
+    return res, s.getvalue()
+
+
+def with_stats(func, *args, **kwargs):
+    """ call func in worker process - return (result or exception, summary of this call) """
+
+    reset()
+    try:
+        res = func(*args, **kwargs)
+    except Exception as e:
+        res = e
+    return res, summary()
@@ -9,106 +9,487 @@ Functions for PDF parsing tools and utils
 import io
 import re
 import os
+import mmap
+import zlib
 import urllib
+import shutil
+import functools
 import subprocess
 import string
 
-from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
-from pdfminer.converter import TextConverter
-from pdfminer.layout import LAParams
-from pdfminer.pdfpage import PDFPage
+from pdf_cache import read_text_cache
+from pdf_cache import write_text_cache
+from pdf_cache import sidecar_path
 
+from pdf_stats import stage
+from pdf_stats import count
 
-def convertPDF_pdfminer(pdf_path, codec='utf-8', maxpages=0):
+import pdf_log as log
+
+# pdfminer is imported inside PDFMinerExtractor (slow to import)
+
+# pdfminer profiles
+#   fast - lines only (no ordering of text boxes, no vertical text), first 2 pages - for doi, keywords
+#   full - full layout analysis, all pages - for reading
+PDFMINER_PROFILES = {'fast': {'maxpages': 2, 'boxes_flow': None, 'detect_vertical': False},
+                     'full': {'maxpages': 0, 'boxes_flow': 0.5, 'detect_vertical': False}}
+
+
+@functools.lru_cache(maxsize=None)
+def has_pdftotext():
+    """ check pdftotext (poppler) command """
+
+    return shutil.which('pdftotext') is not None
+
+
+@functools.lru_cache(maxsize=None)
+def has_pdfminer():
+    """ check pdfminer module (without importing it) """
+
+    import importlib.util
+    return importlib.util.find_spec('pdfminer') is not None
+
+
+class PDFMinerExtractor(object):
+    """ pdfminer text extractor with settings of profile for many documents in one (worker) process
+
+    fonts are cached by object id of each document, so every document gets its own
+    resource manager. cmap caches are class-level in pdfminer and stay warm anyway.
+    profile: 'fast' or 'full' (see PDFMINER_PROFILES), laparams overrides layout parameters
+    """
+
+    def __init__(self, profile='full', laparams=None, caching=True):
+        from pdfminer.layout import LAParams
+
+        if profile not in PDFMINER_PROFILES:
+            raise ValueError('... profile should be one of {}: {}'.format(list(PDFMINER_PROFILES), profile))
+        params = PDFMINER_PROFILES[profile]
+
+        self.profile = profile
+        self._laparams = LAParams(boxes_flow=params['boxes_flow'], detect_vertical=params['detect_vertical']) if laparams is None else laparams
+        self._maxpages = params['maxpages']
+        self._caching = caching
+        self._closed = False
+        self.documents = 0
+
+    def extract(self, pdf_path, maxpages=None):
+        """ return list of text lines of pdf (maxpages: None - pages of profile, 0 - all pages) """
+
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfinterp import PDFPageInterpreter
+        from pdfminer.converter import TextConverter
+        from pdfminer.pdfpage import PDFPage
+
+        if self._closed:
+            raise ValueError('... extractor is closed')
+        if maxpages is None:
+            maxpages = self._maxpages
+
+        rsrcmgr = PDFResourceManager(caching=self._caching)
+        retstr = io.StringIO()
+        device = TextConverter(rsrcmgr, retstr, laparams=self._laparams)
+        try:
+            interpreter = PDFPageInterpreter(rsrcmgr, device)
+            with open(pdf_path, 'rb') as fp, stage('extract.pdfminer.' + self.profile):
+                for page in PDFPage.get_pages(fp, set(), maxpages=maxpages, password='', caching=self._caching, check_extractable=True):
+                    interpreter.process_page(page)
+            text = retstr.getvalue()
+        finally:
+            device.close()
+            retstr.close()
+
+        self.documents += 1
+        return [ t+'\n' for t in text.split('\n') ]
+
+    def close(self):
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_extractors = {}
+
+
+def get_extractor(profile='full'):
+    """ pdfminer extractor of this process for profile (created on first use) """
+
+    key = (os.getpid(), profile)
+    if key not in _extractors:
+        # extractors of parent process after fork
+        for k in [k for k in _extractors if k[0] != key[0]]:
+            del _extractors[k]
+        _extractors[key] = PDFMinerExtractor(profile=profile)
+    return _extractors[key]
+
+
+def convertPDF_pdfminer(pdf_path, codec='utf-8', maxpages=None, profile='full'):
     """
     Takes path to a PDF and returns the text inside it as string
 
     pdf_path: string indicating path to a .pdf file. Can also be a URL starting
               with 'http'
     codec: can be 'ascii', 'utf-8', ...
+    maxpages: None - pages of profile (fast: 2, full: all), 0 - all pages
+    profile: 'fast' (no ordering of text boxes, for doi/keywords) or 'full'
     returns string of the pdf, as it comes out raw from PDFMiner
+    (extractor of this process is reused - see PDFMinerExtractor)
     """
 
     if pdf_path[:4] == 'http':
-        print('first downloading %s ...' % (pdf_path,))
+        log.info('first downloading {} ...', pdf_path)
         urllib.urlretrieve(pdf_path, 'temp.pdf')
         pdf_path = 'temp.pdf'
 
-    rsrcmgr = PDFResourceManager()
-    retstr = io.StringIO()
-    laparams = LAParams()
     # codec arguments disappeared - 2020/02/02
-    #device = TextConverter(rsrcmgr, retstr, codec=codec, laparams=laparams)  
-    device = TextConverter(rsrcmgr, retstr, laparams=laparams)
-
-    fp = open(pdf_path, 'rb')
-    interpreter = PDFPageInterpreter(rsrcmgr, device)
-    password = ""
-    caching = True
-    pagenos = set()
-
-    for page in PDFPage.get_pages(fp, pagenos, maxpages=maxpages, password=password, caching=caching, check_extractable=True):
-        interpreter.process_page(page)
+    return get_extractor(profile).extract(pdf_path, maxpages=maxpages)
 
-    text = retstr.getvalue()
 
-    fp.close()
-    device.close()
-    retstr.close()
+PDFTOTEXT_TIMEOUT = 120
 
-    text = text.split('\n')
-    text = [ t+'\n' for t in text ]
-    return text
 
+def convertPDF_xpdf(pdf_path, codec='utf-8', maxpages=0, update=False, cache='txt', timeout=PDFTOTEXT_TIMEOUT):
+    """ convert PDF to text using pdftotext
 
-def convertPDF_xpdf(pdf_path, codec='utf-8', maxpages=0, update=False):
-    """ convert PDF to text using pdftotext """
+    cache: 'txt' - .txt cache file, return list of lines
+           'txtc' - .txtc cache file, return TextLines (mmap, lines decoded on access)
+    cache files are hidden sidecar files or in cache store (see pdf_cache)
+    pdftotext is killed after timeout seconds (no text, no pdfminer fallback)
+    budgets of bulk extraction: see pdf_extract
+    """
 
-    base, fname = os.path.split(os.path.abspath(pdf_path))
-    txt_path = base + '/.' + fname.replace('.pdf', '.txt')
+    txt_path = sidecar_path(pdf_path, 'txt')
     #print('... save to {}'.format(txt_path))
 
+    if cache == 'txtc':
+        txtc_path = sidecar_path(pdf_path, 'txtc')
+        text = None if update else read_text_cache(txtc_path)
+        if text is not None:
+            count('cache.txt.hit')
+            return text
+
+        count('cache.txt.miss')
+        if (not update) and os.path.exists(txt_path):
+            lines = open(txt_path, 'r').readlines()
+        else:
+            try:
+                count('subprocess.pdftotext')
+                with stage('extract.pdftotext'):
+                    r = subprocess.run(['pdftotext', '-l', str(maxpages), '-enc', codec.upper(), pdf_path, '-'], stdout=subprocess.PIPE, check=True, timeout=timeout)
+                lines = r.stdout.decode(codec, errors='replace').splitlines(True)
+            except subprocess.TimeoutExpired:
+                log.warning('... pdftotext timeout: {}', pdf_path)
+                return []
+            except:
+                lines = convertPDF_pdfminer(pdf_path, codec=codec, maxpages=maxpages)
+
+        return read_text_cache(write_text_cache(lines, sidecar_path(pdf_path, 'txtc', create=True)))
+
     if (not update) and os.path.exists(txt_path):
+        count('cache.txt.hit')
         text = open(txt_path, 'r').readlines()
         return text
 
+    count('cache.txt.miss')
     try:
         # use pdftotext to extract text from pdf
         # -clip : separate clipped text
         #subprocess.call(['pdftotext', '-l', str(maxpages), '-clip', '-enc', codec.upper(), pdf_path, txt_path])
-        subprocess.call(['pdftotext', '-l', str(maxpages), '-enc', codec.upper(), pdf_path, txt_path])
+        count('subprocess.pdftotext')
+        txt_path = sidecar_path(pdf_path, 'txt', create=True)
+        with stage('extract.pdftotext'):
+            subprocess.call(['pdftotext', '-l', str(maxpages), '-enc', codec.upper(), pdf_path, txt_path], timeout=timeout)
         text = open(txt_path, 'r').readlines()
         return text
 
+    except subprocess.TimeoutExpired:
+        log.warning('... pdftotext timeout: {}', pdf_path)
+        if os.path.exists(txt_path): os.remove(txt_path)
+        return []
+
     except:
         if os.path.exists(txt_path): os.remove(txt_path)
         return convertPDF_pdfminer(pdf_path, codec=codec, maxpages=maxpages)
 
 
-def convertPDF_images(pdf_path, output_dir='markdown/'):
-    """ using poppler library """
+IMAGE_FORMATS = {'jpeg': 'jpg', 'png': 'png'}
+
+
+def image_fnames(pdf_path, output_dir='markdown/', first=1, last=2, fmt='jpeg'):
+    """ page image filenames of pdf (PDFNAME-01.jpg, ...) """
 
     base, fname = os.path.split(os.path.abspath(pdf_path))
-    jpg_path = base + '/' + output_dir + fname.replace('.pdf', '')
+    prefix = os.path.join(base, output_dir, fname.replace('.pdf', ''))
+
+    return ['{}-{:02d}.{}'.format(prefix, i, IMAGE_FORMATS[fmt]) for i in range(first, last+1)]
+
+
+def convertPDF_images(pdf_path, output_dir='markdown/', first=1, last=2, resolution=150, fmt='jpeg', quality=85, update=False):
+    """ using poppler library - render pages into output_dir (relative to pdf directory)
+
+    skip pages when image is newer than pdf file (unless update)
+    return list of image filenames
+    """
+
+    if fmt not in IMAGE_FORMATS:
+        log.warning('... not supported format: {}', fmt)
+        return []
+
+    fnames = image_fnames(pdf_path, output_dir=output_dir, first=first, last=last, fmt=fmt)
+    pdf_mtime = os.path.getmtime(pdf_path)
+    os.makedirs(os.path.dirname(fnames[0]), exist_ok=True)
+
+    res = []
+    for page, img_path in zip(range(first, last+1), fnames):
+        if (not update) and os.path.exists(img_path) and (os.path.getmtime(img_path) >= pdf_mtime):
+            res.append(img_path)
+            continue
+
+        cmd = ['pdftoppm', '-' + fmt, '-r', str(resolution), '-f', str(page), '-l', str(page), '-singlefile']
+        if fmt == 'jpeg': cmd.extend(['-jpegopt', 'quality={}'.format(quality)])
+        # pdftoppm adds extension to output prefix
+        cmd.extend([pdf_path, img_path[:-len(IMAGE_FORMATS[fmt])-1]])
+
+        try:
+            count('subprocess.pdftoppm')
+            with stage('render.pdftoppm'):
+                subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            res.append(img_path)
+        except (OSError, subprocess.CalledProcessError) as e:
+            log.warning('... error [{}]: {}', os.path.basename(img_path), e)
+
+    return res
+
+
+_RE_ROOT = re.compile(rb'/Root\s+(\d+)\s+(\d+)\s+R')
+_RE_PAGES = re.compile(rb'/Pages\s+(\d+)\s+(\d+)\s+R')
+_RE_COUNT = re.compile(rb'/Count\s+(\d+)(\s+(\d+)\s+R)?')
+_RE_OBJSTM = re.compile(rb'/Type\s*/ObjStm')
+_RE_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+_RE_XREF_SECTION = re.compile(rb'\s*(\d+)\s+(\d+)[ \t]*\r?\n')
+_RE_PREV = re.compile(rb'/Prev\s+(\d+)')
+_RE_PAGE = re.compile(rb'/Type\s*/Page([^s]|$)', re.MULTILINE|re.DOTALL)
+_RE_FONT = re.compile(rb'/Type\s*/Font\b|/BaseFont\b')
+_RE_IMAGE = re.compile(rb'/Subtype\s*/Image\b')
+
+# less text than this (per page) is not a text layer (page numbers, stamps)
+MIN_CHARS_PER_PAGE = 100
 
-    try:
-        cmd = 'pdftoppm -jpeg -f 1 -l 2 {} {}'.format(pdf_path, jpg_path)
-        #subprocess.run(['pdftoppm', '-jpeg', '-f 1', '-l 2', pdf_path, jpg_path])
-        print(cmd)
-        subprocess.call(cmd, shell=True)
-        return
-    except:
-        print('... error')
-        return
+
+def _last_match(regex, mm, tail=None):
+    """ last match of regex - search the tail of file first (if tail) """
+
+    starts = [max(len(mm) - tail, 0), 0] if tail is not None else [0]
+    for start in starts:
+        m = None
+        for m in regex.finditer(mm, start):
+            pass
+        if m is not None: return m
+
+    return None
+
+
+def _object_streams(mm):
+    """ generate {object number: bytes} of each compressed object stream
+
+    None for streams which can not be read (encrypted, other filters than Flate)
+    """
+
+    for m in _RE_OBJSTM.finditer(mm):
+        obj_pos = mm.rfind(b'obj', max(m.start() - 4096, 0), m.start())
+        stream_pos = mm.find(b'stream', m.end())
+        if (obj_pos == -1) or (stream_pos == -1):
+            yield None
+            continue
+
+        head = mm[obj_pos:stream_pos]
+        n, first = re.search(rb'/N\s+(\d+)', head), re.search(rb'/First\s+(\d+)', head)
+        if (n is None) or (first is None) or (head.find(b'/FlateDecode') == -1):
+            yield None
+            continue
+
+        data_pos = stream_pos + 6
+        if mm[data_pos:data_pos+1] == b'\r': data_pos += 1
+        if mm[data_pos:data_pos+1] == b'\n': data_pos += 1
+        end_pos = mm.find(b'endstream', data_pos)
+
+        try:
+            data = zlib.decompressobj().decompress(mm[data_pos:end_pos])
+            first = int(first.group(1))
+            nums = [int(x) for x in data[:first].split()]
+        except (zlib.error, ValueError):
+            yield None
+            continue
+
+        offsets = [(nums[i], nums[i+1]) for i in range(0, min(len(nums), 2*int(n.group(1))), 2)]
+        objs = {}
+        for i, (num, off) in enumerate(offsets):
+            end = offsets[i+1][1] if i+1 < len(offsets) else len(data) - first
+            objs[num] = data[first+off:first+end]
+        yield objs
+
+
+def _xref_offset(mm, num):
+    """ byte offset of object from classic xref tables (None when not found) """
+
+    pos = mm.rfind(b'startxref')
+    m = _RE_STARTXREF.match(mm, pos) if pos > -1 else None
+    offset = int(m.group(1)) if m is not None else -1
+
+    seen = set()
+    while (0 <= offset < len(mm)) and (offset not in seen):
+        seen.add(offset)
+        if mm[offset:offset+4] != b'xref':
+            return None
+
+        pos = offset + 4
+        m = _RE_XREF_SECTION.match(mm, pos)
+        while m is not None:
+            start, count = int(m.group(1)), int(m.group(2))
+            if start <= num < start + count:
+                entry = mm[m.end() + 20*(num - start):m.end() + 20*(num - start + 1)]
+                return int(entry[:10]) if entry[17:18] == b'n' else None
+            pos = m.end() + 20*count
+            m = _RE_XREF_SECTION.match(mm, pos)
+
+        # previous xref table of incremental update
+        end = mm.find(b'startxref', pos)
+        prev = _RE_PREV.search(mm[pos:end if end > -1 else pos + 4096])
+        offset = int(prev.group(1)) if prev is not None else -1
+
+    return None
+
+
+def _get_object(mm, num, gen=0):
+    """ bytes of indirect object (by xref table, by search or in object stream) """
+
+    head = str(num).encode() + b' ' + str(gen).encode() + b' obj'
+    start = None
+
+    offset = _xref_offset(mm, num)
+    if offset is not None:
+        m = re.compile(rb'\s*' + str(num).encode() + rb'\s+' + str(gen).encode() + rb'\s+obj').match(mm, offset)
+        if m is not None: start = m.end()
+
+    # search last object header
+    pos = len(mm)
+    while (start is None) and (pos > 0):
+        pos = mm.rfind(head, 0, pos)
+        if pos == -1: break
+        if (pos == 0) or (mm[pos-1:pos] not in b'0123456789'):
+            start = pos + len(head)
+
+    if start is not None:
+        end = mm.find(b'endobj', start)
+        return mm[start:end if end > -1 else start + 4096]
+
+    for objs in _object_streams(mm):
+        if (objs is not None) and (num in objs): return objs[num]
+
+    return None
 
 
 def countPDFPages(filename):
-    ''' Counts number of pages in PDF '''
+    """ count pages in PDF from page tree (/Root -> /Pages -> /Count)
+
+    pdf is read by mmap (no full copy in memory) and compressed object
+    streams are decompressed one by one when the catalog is in them.
+    fall back to counting /Type /Page objects
+    """
+
+    if os.path.getsize(filename) == 0:
+        return 0
+
+    with open(filename, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            root = _last_match(_RE_ROOT, mm, tail=1 << 20)
+            catalog = _get_object(mm, int(root.group(1)), int(root.group(2))) if root is not None else None
+            pages = _RE_PAGES.search(catalog) if catalog is not None else None
+            tree = _get_object(mm, int(pages.group(1)), int(pages.group(2))) if pages is not None else None
+            count = _RE_COUNT.search(tree) if tree is not None else None
+
+            if (count is not None) and (count.group(2) is None):
+                return int(count.group(1))
+            if count is not None:
+                # indirect /Count N G R
+                value = re.search(rb'\d+', _get_object(mm, int(count.group(1)), int(count.group(3))) or b'')
+                if value is not None: return int(value.group(0))
+
+            # NOTE: Currently does not work 100% of the time
+            return sum(1 for _ in _RE_PAGE.finditer(mm))
+        finally:
+            mm.close()
+
+
+def _resource_kind(mm):
+    """ kind of pdf from fonts and images in file and in compressed object streams """
+
+    fonts = _RE_FONT.search(mm) is not None
+    unread = False
+    if not fonts:
+        for objs in _object_streams(mm):
+            if objs is None:
+                unread = True
+            elif any(_RE_FONT.search(obj) is not None for obj in objs.values()):
+                fonts = True
+                break
+
+    if fonts: return 'text'
+    # fonts may be in streams which can not be read
+    if unread: return 'unknown'
+    if _RE_IMAGE.search(mm) is not None: return 'image'
+    return 'empty'
+
 
-    # NOTE: Currently does not work 100% of the time
-    rxcountpages = re.compile(r"/Type\s*/Page([^s]|$)", re.MULTILINE|re.DOTALL)
-    data = open(filename,"r", encoding = "ISO-8859-1").read()
-    return len(rxcountpages.findall(data))
+def classify_pdf(filename, lines=None, maxpages=0):
+    """ kind of pdf: 'text', 'image' (scanned paper without text), 'empty' or 'unknown'
+
+    without lines, kind is from resources (read by mmap): 'text' (fonts), 'image'
+    (images only) or 'unknown' (no fonts found, but some object streams can not
+    be read - encrypted or not Flate compressed).
+    lines: extracted text of first maxpages pages (0: all pages) - decides the kind.
+    enough text per page is 'text', too little text (stamps, page numbers) is 'image'
+    """
+
+    if os.path.getsize(filename) == 0:
+        return 'empty'
+
+    if lines is not None:
+        pages = max(countPDFPages(filename), 1)
+        limit = MIN_CHARS_PER_PAGE * (min(maxpages, pages) if maxpages > 0 else pages)
+        chars = 0
+        for t in lines:
+            chars += len(t.strip())
+            if chars >= limit: return 'text'
+
+    with open(filename, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            kind = _resource_kind(mm)
+            if (lines is not None) and (kind == 'text'):
+                # fonts, but almost no text
+                kind = 'image' if _RE_IMAGE.search(mm) is not None else 'empty'
+        finally:
+            mm.close()
+
+    return kind
+
+
+def parse_fname(fname):
+    """ find year, author1, journal from filename YEAR-AUTHOR1-JOURNAL.pdf """
+
+    fname = os.path.basename(fname)
+    if (fname.find('-') > 0) and (len(fname.split('-')) >= 3):
+        year = fname.split('-')[0]
+        author1 = fname.split('-')[1].replace('_', '-')
+        journal = ''.join(fname.replace('.pdf', '').split('-')[2:]).replace('_', ' ')
+        return year, author1, journal
+    else:
+        return None
 
 
 def cleanup_str(value):
@@ -209,9 +590,10 @@ def find_keywords(lines, keywordlist=None, debug=False):
     found_idx = -1
     found_pos = -1
 
-    for i, t in enumerate(lines):
+    # lines are read one by one - any iterable (TextLines, generator) stops at found line
+    for i, line in enumerate(lines):
         # remove non-text characters
-        t = cleanup_str(t)
+        t = cleanup_str(line)
 
         # find keyword
         for fw in find_words:
@@ -225,11 +607,11 @@ def find_keywords(lines, keywordlist=None, debug=False):
             break
 
     if found_idx == -1:
-        if debug: print('... keywords not found!')
+        log.debug('... keywords not found!', show=debug)
         return []
 
     # extract keywords
-    t = lines[found_idx]
+    t = line
 
     # find end words such as PACS, DOI
     end_pos = len(t)
@@ -238,7 +620,7 @@ def find_keywords(lines, keywordlist=None, debug=False):
         tmp = t.find(ew)
         if (tmp > -1): end_pos = tmp
 
-    if debug: print('... line [{}]: {}'.format(found_idx, t[found_pos:end_pos]))
+    log.debug('... line [{}]: {}', found_idx, t[found_pos:end_pos], show=debug)
 
     sep = ' '
     sep_pos = 100
@@ -253,6 +635,6 @@ def find_keywords(lines, keywordlist=None, debug=False):
     text_kws = [x.strip() for x in text_kws]
 
     text_kws = set(text_kws) - set(ban_words)
-    if debug: print('... sep: {} found_pos: {} end_pos: {}'.format(sep, found_pos, end_pos))
+    log.debug('... sep: {} found_pos: {} end_pos: {}', sep, found_pos, end_pos, show=debug)
 
     return text_kws
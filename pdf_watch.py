@@ -0,0 +1,219 @@
+"""
+pdf_watch.py
+
+new, changed and deleted pdf files of library directory - inotify (linux) or polling
+
+    watcher = Watcher('~/papers', settle=2.0)
+    watcher.mark('2004-Kaji-Analytical_Chemistry.pdf')   - handled (same size and mtime are ignored)
+    ready, deleted = watcher.wait(timeout=5.0)
+
+a file is ready when its size and mtime did not change for `settle` seconds and it ends with
+%%EOF (or did not change for PATIENCE x settle seconds), so partially written or downloading
+files are not read. hidden files (bib, txt, index) and other files are ignored.
+"""
+
+import os
+import time
+import select
+import struct
+
+import pdf_log as log
+
+SETTLE = 2.0            # seconds without change before file is read
+INTERVAL = 5.0          # seconds between directory scans (polling)
+PATIENCE = 10           # ready without %%EOF after PATIENCE x settle seconds
+
+# inotify events (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct('iIII')
+
+
+class _Inotify(object):
+    """ inotify of one directory by libc (ctypes) """
+
+    def __init__(self, path):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('... no inotify')
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), IN_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch', path)
+
+    def read(self, timeout):
+        """ list of (name, mask) within timeout seconds """
+
+        r, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if len(r) == 0:
+            return []
+
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+
+        res = []
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            _, mask, _, n = _EVENT.unpack_from(data, pos)
+            name = data[pos + _EVENT.size:pos + _EVENT.size + n].rstrip(b'\0')
+            res.append((os.fsdecode(name), mask))
+            pos += _EVENT.size + n
+
+        return res
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _stat(path):
+    """ (size, mtime) or None """
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+def _complete(path):
+    """ pdf file ends with %%EOF (end of last revision) """
+
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(os.path.getsize(path) - 1024, 0))
+            return b'%%EOF' in f.read()
+    except OSError:
+        return False
+
+
+def _is_pdf(name):
+    return (not name.startswith('.')) and name.lower().endswith('.pdf')
+
+
+class Watcher(object):
+    """ ready (written completely) and deleted pdf files of directory """
+
+    def __init__(self, base, settle=SETTLE, interval=INTERVAL, poll=False):
+        self.base = os.path.abspath(os.path.expanduser(base))
+        self.settle = settle
+        self.interval = interval
+
+        self._known = {}        # fname: (size, mtime) handled
+        self._pending = {}      # fname: [(size, mtime), first time of this stat, first time]
+        self._deleted = set()
+
+        self._inotify = None
+        if not poll:
+            try:
+                self._inotify = _Inotify(self.base)
+            except (OSError, AttributeError) as e:
+                log.info('... inotify not available ({}) - polling every {} s', e, interval)
+        self._last_scan = 0.0 if self._inotify is None else time.time()
+
+    @property
+    def mode(self):
+        return 'inotify' if self._inotify is not None else 'polling'
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def mark(self, fname, stat=None):
+        """ fname (basename) is handled with stat (size, mtime) - default: current stat """
+
+        stat = stat or _stat(os.path.join(self.base, fname))
+        if stat is not None:
+            self._known[fname] = tuple(stat)
+        self._pending.pop(fname, None)
+
+    def forget(self, fname):
+        self._known.pop(fname, None)
+        self._pending.pop(fname, None)
+
+    def _touch(self, fname):
+        stat = _stat(os.path.join(self.base, fname))
+        if stat is None:
+            if fname in self._known: self._deleted.add(fname)
+            self._pending.pop(fname, None)
+        elif (self._known.get(fname) != stat) and (fname not in self._pending):
+            now = time.time()
+            self._pending[fname] = [stat, now, now]
+            self._deleted.discard(fname)
+
+    def scan(self):
+        """ compare directory with handled files """
+
+        names = set(n for n in os.listdir(self.base) if _is_pdf(n))
+        for n in names:
+            self._touch(n)
+        for n in set(self._known) - names:
+            self._deleted.add(n)
+        self._last_scan = time.time()
+
+    def _ready(self):
+        """ pending files without change for settle seconds """
+
+        res = []
+        now = time.time()
+        for fname, item in list(self._pending.items()):
+            path = os.path.join(self.base, fname)
+            stat = _stat(path)
+            if stat is None:
+                self._pending.pop(fname)
+                if fname in self._known: self._deleted.add(fname)
+            elif stat != item[0]:
+                item[0], item[1] = stat, now
+            elif now - item[1] >= self.settle:
+                if _complete(path) or (now - item[1] >= PATIENCE * self.settle):
+                    res.append(fname)
+                    self._pending.pop(fname)
+                    log.debug('... ready {} ({:.1f} s)', fname, now - item[2])
+
+        return res
+
+    def wait(self, timeout=None):
+        """ wait up to timeout seconds - return (ready filenames, deleted filenames) as full paths """
+
+        timeout = self.interval if timeout is None else timeout
+        end = time.time() + timeout
+
+        while True:
+            step = min(max(end - time.time(), 0), 0.5 if len(self._pending) > 0 else timeout)
+            if self._inotify is None:
+                if time.time() - self._last_scan >= self.interval:
+                    self.scan()
+                else:
+                    time.sleep(min(step, max(self.interval - (time.time() - self._last_scan), 0)))
+            else:
+                for name, mask in self._inotify.read(step):
+                    if mask & IN_Q_OVERFLOW:
+                        self.scan()
+                    elif _is_pdf(name):
+                        if mask & (IN_DELETE | IN_MOVED_FROM):
+                            self._pending.pop(name, None)
+                            if name in self._known: self._deleted.add(name)
+                        else:
+                            self._touch(name)
+
+            ready = self._ready()
+            deleted = sorted(self._deleted)
+            if (len(ready) > 0) or (len(deleted) > 0) or (time.time() >= end):
+                for n in deleted: self.forget(n)
+                self._deleted.clear()
+                return [os.path.join(self.base, n) for n in sorted(ready)], [os.path.join(self.base, n) for n in deleted]
@@ -9,91 +9,250 @@ TODO: 2019/05/06 - make faster
 """
 
 import os
+import sys
 import glob
+import time
 import string
+import argparse
+import functools
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # pdf text reader
 from pdf_text import convertPDF_pdfminer
 from pdf_text import convertPDF_xpdf
 from pdf_text import convertPDF_images
 from pdf_text import cleanup_str
+from pdf_text import parse_fname
 from pdf_text import find_author1
 from pdf_text import find_keywords
 from pdf_text import find_doi
+from pdf_text import has_pdftotext
+from pdf_text import classify_pdf
+from pdf_text import PDFMINER_PROFILES
 
 from pdf_meta import get_bib
+from pdf_meta import get_bibs
+from pdf_meta import CROSSREF_BATCH
 from pdf_meta import get_pmid
+from pdf_meta import ncbi_to_dict
 from pdf_meta import crossref_query_title
 from pdf_meta import find_bib
 from pdf_meta import read_bib
 from pdf_meta import save_bib
 from pdf_meta import print_bib
 
-# summary or keyword generator
-import gensim.summarization as gs
-from rake_nltk import Rake
+from pdf_export import export_library
+from pdf_export import EXPORT_FORMATS
 
-from pyexif import pyexif
+from pdf_watch import Watcher
+from pdf_watch import SETTLE
+from pdf_watch import INTERVAL
+
+from pdf_snapshot import build_snapshot
+from pdf_snapshot import set_snapshot
+
+from pdf_index import scan_file
+from pdf_index import list_pdfs
+from pdf_index import read_index
+from pdf_index import save_index
+from pdf_index import INDEX_BIB_FIELDS
+
+from pdf_parse import parse_first_pages
+
+from pdf_extract import extract_text
+from pdf_extract import run_ocr
+from pdf_extract import has_ocr
+from pdf_extract import SKIP_STATUS
+from pdf_extract import TIMEOUT
+from pdf_extract import MEMORY
+
+from pdf_policy import get_policy
+from pdf_policy import check_policy
+from pdf_policy import POLICY_MODES
+from pdf_policy import RENAME_MODES
+
+from pdf_cache import TextLines
+from pdf_cache import sidecar_path
+from pdf_cache import set_cache_dir
+from pdf_cache import migrate_sidecars
+
+from pdf_rename import plan_rename
+from pdf_rename import execute_rename
+from pdf_rename import recover_rename
+from pdf_rename import rename_lock
+from pdf_rename import JOURNAL_FNAME
+from pdf_rename import print_plan
+
+from pdf_stats import stage
+from pdf_stats import count
+from pdf_stats import merge
+from pdf_stats import report
+from pdf_stats import profile
+from pdf_stats import with_stats
+
+from pdf_pipeline import Pipeline
+from pdf_pipeline import Stage
+from pdf_pipeline import to_thread
+
+import pdf_log as log
+
+# gensim, rake_nltk and pyexif are imported on first use (slow to import)
+
+# values of missing bib items (Paper.field)
+EMPTY_VALUES = ['', 'None', '0', '[]', 'nan']
+FIELD_FALLBACKS = {'author': 'author1'}
 
 
 class Paper(object):
     """ read paper pdf and extract key informations """
 
-    def __init__(self, filename, debug=False, exif=True):
-        """ initialize Paper class """
+    def __init__(self, filename, debug=False, exif=True, policy=None, textcache='txt', index=None):
+        """ initialize Paper class - bib file and exif are read on first access
+
+        policy: conflict resolution ('ask', 'remote', 'local', 'longer', 'review' or ConflictPolicy)
+        textcache: 'txt' (hidden .txt file) or 'txtc' (hidden .txtc file read by mmap)
+        index: index item of this file (dict) used by field()
+        """
 
         self._base, self._fname = os.path.split(os.path.abspath(filename))
-        self._bibfname = self._base + '/.' + self._fname.replace('.pdf', '.bib')
-        self._txtfname = self._base + '/.' + self._fname.replace('.pdf', '.txt')
         self._debug = debug
+        self._policy = get_policy(policy)
+        self._textcache = textcache
+        self._index = index
+        self._use_exif = exif
 
         self._text = None
+        self._fast_text = None
         self._exist_bib = False
 
+        # lazy values
+        self._bib_data = None
+        self._bib_loaded = False
+        self._filebib = None
+        self._exif_editor = None
+        self._tags = None
+        self._kind = None
+
         # check filename
-        if (self._fname.find('-') > 0) and (len(self._fname.split('-')) >= 3):
-            year = self._fname.split('-')[0]
-            author1 = self._fname.split('-')[1].replace('_', '-')
-            journal = ''.join(self._fname.replace('.pdf', '').split('-')[2:]).replace('_', ' ')
+        self._fname_parsed = parse_fname(self._fname) is not None
+        if self._fname_parsed:
+            year, author1, journal = parse_fname(self._fname)
         else:
-            print("... Check filename: {}".format(self._fname))
+            log.warning("... Check filename: {}", self._fname)
             year = 2000
             author1 = 'kim'
             journal = 'temp'
 
-        # check bib file
-        self._bib = read_bib(self._bibfname, cache=False, verb=debug)
-        if self._bib is not None:
-            self._bib['local-url'] = './'+self._fname
-            self._exist_bib = True
+        year = int(year) if str(year).isdigit() else 2000
+        self._fname_fields = {'year': year, 'author1': author1, 'journal': journal}
+
+    @property
+    def _bibfname(self):
+        """ bib cache file (hidden sidecar or in cache store) """
+
+        return sidecar_path(os.path.join(self._base, self._fname), 'bib')
+
+    @property
+    def _txtfname(self):
+        """ text cache file (hidden sidecar or in cache store) """
+
+        return sidecar_path(os.path.join(self._base, self._fname), 'txt')
+
+    @property
+    def _bib(self):
+        """ bib dictionary (read bib file and exif on first access) """
+
+        if not self._bib_loaded:
+            self._load_bib()
+        return self._bib_data
+
+    @_bib.setter
+    def _bib(self, value):
+        self._bib_data = value
+
+    @property
+    def _exif(self):
+        """ exiftool editor (created on first access) """
+
+        if self._exif_editor is None:
+            from pyexif import pyexif
+            self._exif_editor = pyexif.ExifEditor(os.path.join(self._base, self._fname))
+        return self._exif_editor
+
+    @property
+    def _dictTags(self):
+        """ exif tags (read by exiftool on first access) """
+
+        if self._tags is None:
+            count('subprocess.exiftool')
+            with stage('exiftool.read'):
+                self._tags = self._exif.getDictTags()
+        return self._tags
+
+    def _read_filebib(self):
+        """ read hidden bib file once """
 
-        if exif:
-            self._exif = pyexif.ExifEditor(os.path.join(self._base, self._fname))
-            self._dictTags = self._exif.getDictTags()
-            self._bib = self.exif_to_bib()
+        if self._filebib is None:
+            bib = read_bib(self._bibfname, cache=False, verb=self._debug) or {}
+            self._filebib = bib[0] if isinstance(bib, list) else bib
+        return self._filebib
 
-        if self._bib is None:
-            self._bib = {'local-url': './'+self._fname, 'year': int(year), 'author1': author1, 'journal':journal, 'author': author1}
+    def _sources(self):
+        """ cheap bib sources in precedence order: bib file, index, filename (when parsed) """
 
-        if self._bib.get('year', 0) == 0: self._bib['year'] = int(year)
-        if self._bib.get('journal', '') == '': self._bib['journal'] = journal
-        if self._bib.get('author','') == '': self._bib['author'] = author1
-        if self._bib.get('author1','') == '': self._bib['author1'] = author1
+        index = {k: v for k, v in (self._index or {}).items() if k in INDEX_BIB_FIELDS}
+        return [self._read_filebib(), index, self._fname_fields if self._fname_parsed else {}]
+
+    def _load_bib(self):
+        """ build bib from bib file, index, filename and exif (same precedence as field) """
+
+        self._bib_loaded = True
+        fields = self._fname_fields
+        self._exist_bib = len(self._read_filebib()) > 0
+
+        bib = self.exif_to_bib() if self._use_exif else {}
+        for source in reversed(self._sources()):
+            bib.update((k, v) for k, v in source.items() if str(v) not in EMPTY_VALUES)
+        bib['local-url'] = './'+self._fname
+        self._bib = bib
+
+        if self._bib.get('year', 0) in [0, '']: self._bib['year'] = fields['year']
+        if self._bib.get('journal', '') == '': self._bib['journal'] = fields['journal']
+        if self._bib.get('author1','') == '': self._bib['author1'] = fields['author1']
+        if self._bib.get('author','') == '': self._bib['author'] = self._bib['author1']
+
+    def field(self, name, default=''):
+        """ get bib item from the cheapest source that has it
+
+        precedence: bib of this object (once loaded or changed) > bib file > index > filename
+        (year, author1, journal) > exif. author falls back to author1 of index or filename.
+        exiftool runs only when no other source has the value
+        """
+
+        if self._bib_loaded:
+            return self._bib.get(name, default)
+
+        for source in self._sources():
+            for key in [name, FIELD_FALLBACKS.get(name)]:
+                if (key is not None) and (str(source.get(key, '')) not in EMPTY_VALUES):
+                    return source[key]
+
+        return self._bib.get(name, default)
 
     def __repr__(self):
         """ print out basic informations """
 
         msg = "- Filename: {}\n".format(self._fname)
-        msg = msg + "- Title: {}\n".format(self._bib.get('title'))
-        msg = msg + "- Author: {}\n".format(self._bib.get('author'))
-        msg = msg + "- Year: {}\n".format(self._bib.get('year'))
-        msg = msg + "- DOI: {}\n".format(self._bib.get('doi'))
-        msg = msg + "- Journal: {}\n".format(self._bib.get('journal'))
-        msg = msg + "- Keywords: {}\n".format(self._bib.get('keywords'))
-        msg = msg + "- Subject: {}\n".format(self._bib.get('subject'))
-        msg = msg + "- Abstract: {}\n".format(self._bib.get('abstract'))
-        msg = msg + "- Abstract(ko): {}\n".format(self._bib.get('abstract1'))
+        msg = msg + "- Title: {}\n".format(self.field('title', None))
+        msg = msg + "- Author: {}\n".format(self.field('author', None))
+        msg = msg + "- Year: {}\n".format(self.field('year', None))
+        msg = msg + "- DOI: {}\n".format(self.field('doi', None))
+        msg = msg + "- Journal: {}\n".format(self.field('journal', None))
+        msg = msg + "- Keywords: {}\n".format(self.field('keywords', None))
+        msg = msg + "- Subject: {}\n".format(self.field('subject', None))
+        msg = msg + "- Abstract: {}\n".format(self.field('abstract', None))
+        msg = msg + "- Abstract(ko): {}\n".format(self.field('abstract1', None))
         msg = msg + "- Bibfile: {}\n".format(self._exist_bib)
 
         return msg
@@ -185,6 +344,8 @@ class Paper(object):
     def title(self, text=None):
         """ set / get title """
 
+        if text is None:
+            return self.field('title')
         if isinstance(text, int):
             text = self.contents()[text]
             text = text.strip('\n\r')
@@ -194,6 +355,8 @@ class Paper(object):
     def journal(self, text=None):
         """ set / get journal """
 
+        if text is None:
+            return self.field('journal')
         if isinstance(text, int):
             text = self.contents()[text]
             text = text.strip('\n\r')
@@ -203,6 +366,8 @@ class Paper(object):
     def year(self, year=None):
         """ set / get year """
 
+        if year is None:
+            return self.field('year')
         return self._update_bibitem('year', new_value=year)
 
     def abstract(self, text=None):
@@ -240,6 +405,8 @@ class Paper(object):
     def author(self, text=None):
         """ set / get author """
 
+        if text is None:
+            return self.field('author')
         if isinstance(text, int):
             text = self.contents()[text]
 
@@ -273,20 +440,20 @@ class Paper(object):
         if checktitle:
             res = self.download_doi()
             if res != '':
-                if self._debug: print('... download by title')
+                log.debug('... download by title', show=self._debug)
                 self._update_bibitem('doi', new_value=res)
                 return res
 
         # check self value
         if self._bib.get('doi', '') != '':
-            if self._debug: print('... read from self._bib')
+            log.debug('... read from self._bib', show=self._debug)
             return self._bib.get('doi')
 
         # check text
-        text_doi = find_doi(self.contents())
+        text_doi = find_doi(self._search_text())
         if text_doi is not None:
             self._update_bibitem('doi', new_value=text_doi)
-            if self._debug: print('... read from text doi')
+            log.debug('... read from text doi', show=self._debug)
             return text_doi
 
         return self._bib.get('doi', '')
@@ -298,7 +465,7 @@ class Paper(object):
         userkws = False
         if kws is not None:
             if not isinstance(kws, list):
-                print('... keywords should be list. {}'.format(kws))
+                log.warning('... keywords should be list. {}', kws)
                 return []
             else:
                 userkws = True
@@ -309,10 +476,10 @@ class Paper(object):
         self_kws = self._bib.get('keywords', [])
 
         # check file text
-        text_kws = find_keywords(self.contents(), keywordlist=keywordlist, debug=self._debug)
+        text_kws = find_keywords(self._search_text(), keywordlist=keywordlist, debug=self._debug)
 
-        if self._debug: print('self: {}'.format(self_kws))
-        if self._debug: print('text: {}'.format(text_kws))
+        log.debug('self: {}', self_kws, show=self._debug)
+        log.debug('text: {}', text_kws, show=self._debug)
 
         if not update:
             if len(self_kws) > 0: res.extend(self_kws)
@@ -328,17 +495,17 @@ class Paper(object):
         if self._bib.get('doi', '') == '':
             doi = self.doi(doi=doi)
         if self._bib.get('doi', '') == '':
-            print('... no doi')
+            log.info('... no doi')
             return self._bib
 
         # check bib file
-        bibfname = self._base + '/.' + self._fname.replace('.pdf', '.bib')
+        bibfname = self._bibfname
         if cache and os.path.exists(bibfname):
-            bib = read_bib(bibfname)
+            bib = self._read_filebib()
             found = True
         else:
-            print('... download bib information')
-            found, bib = get_bib(self.doi(), filename=bibfname)
+            log.info('... download bib information')
+            found, bib = get_bib(self.doi())
 
         # update information
         if found and isinstance(bib, dict):
@@ -348,9 +515,9 @@ class Paper(object):
             #self.bib_to_exif(bib)
         else:
             if self._debug:
-                print('... not found bib information')
+                log.info('... not found bib information')
 
-        save_bib([self._bib], bibfname)
+        save_bib([self._bib], sidecar_path(os.path.join(self._base, self._fname), 'bib', create=True))
         self._exist_bib = True
 
         return self._bib
@@ -363,12 +530,11 @@ class Paper(object):
         if not found:
             return
 
-        if result.get('doi', '') != '': self._update_bibitem('doi', new_value=result.get('doi'))
-        if result.get('pmid', '') != '': self._update_bibitem('pmid', new_value=result.get('pmid'))
-        if result.get('pmcid', '') != '': self._update_bibitem('pmcid', new_value=result.get('pmcid'))
+        for k, v in ncbi_to_dict(result).items():
+            self._update_bibitem(k, new_value=v)
 
         doi, pmid, pmcid = self._bib.get('doi'), self._bib.get('pmid'), self._bib.get('pmcid')
-        if self._debug: print("doi: {}\npmid: {}\npmcid: {}\n".format(doi, pmid, pmcid))
+        log.debug("doi: {}\npmid: {}\npmcid: {}\n", doi, pmid, pmcid, show=self._debug)
 
         return doi, pmid, pmcid
 
@@ -382,7 +548,7 @@ class Paper(object):
         res = crossref_query_title(title)
 
         if res['success']:
-            if self._debug: print('... found doi by title')
+            log.debug('... found doi by title', show=self._debug)
 
             item = res['result']
             if item['similarity'] > 0.9:
@@ -402,7 +568,7 @@ class Paper(object):
                 biblist.append(bibdb)
 
             if len(biblist) == 0:
-                print('... no bib file')
+                log.info('... no bib file')
                 return
 
             for f in biblist:
@@ -421,28 +587,30 @@ class Paper(object):
                 res = find_bib(bibdb, self.bib(), subset=['year', 'journal'], threshold=threshold, debug=self._debug)
 
                 if len(res) == 0:
-                    print('... not found')
+                    log.info('... not found')
 
             if len(res) == 1:
-                print('... set by found')
+                log.info('... set by found')
                 self.bib(bib=res[0])
 
             if len(res) > 1:
-                print('... multiple found: {}'.format(len(res)))
+                log.info('... multiple found: {}', len(res))
                 for i, item in enumerate(res):
                     print("\n[{}] ---------".format(i))
                     print_bib(item, form='short')
 
-                number = input("Choose number (or quit): ")
-                if number in ['quit', 'q', 'Q']:
+                number = self._policy.choose_item('bib', res, filename=os.path.join(self._base, self._fname))
+                if number is None:
                     return
-                self.bib(bib=res[int(number)])
+                self.bib(bib=res[number])
 
     # text analysis
 
     def keywords_gensim(self, texts=None, words=10, **kwargs):
         """ extract keywords using gensim """
 
+        import gensim.summarization as gs
+
         if texts is None:
             texts = self.contents(split=False, **kwargs)
         if isinstance(texts, list):
@@ -455,6 +623,8 @@ class Paper(object):
     def keywords_rake_nltk(self, texts=None, words=10, **kwargs):
         """ extract keywords using rake_nltk """
 
+        from rake_nltk import Rake
+
         r = Rake()
         if texts is None:
             texts = self.contents(**kwargs)
@@ -467,29 +637,76 @@ class Paper(object):
         res = r.get_ranked_phrases()
         return res[:words]
 
-    def contents(self, sentenceLength=10, split=True, maxpages=-1, clean=False, method='xpdf', update=True):
-        """ extract only contents or filter out short sentences """
+    def _image_only(self, lines=None, maxpages=0):
+        """ scanned pdf without text - kind of extraction in index or of text sample (lines of first maxpages pages)
+
+        kind of pdf resources alone is not used (fonts of encrypted object streams are not found)
+        """
+
+        if (self._kind is None) and (lines is not None):
+            self._kind = classify_pdf(os.path.join(self._base, self._fname), lines=lines, maxpages=maxpages)
+        if self._kind is None:
+            return (self._index or {}).get('extract', {}).get('kind') == 'image'
+        return self._kind == 'image'
+
+    def _search_text(self, sentenceLength=10):
+        """ text lines for doi and keywords (lazy) - first pages by fast pdfminer profile when pdftotext is missing """
+
+        # image-only pdf (extraction in index): only ocr text
+        if (self._text is not None) or has_pdftotext() or self._image_only():
+            return self._lines(sentenceLength=sentenceLength)
+        if os.path.exists(self._txtfname) or os.path.exists(sidecar_path(os.path.join(self._base, self._fname), self._textcache)):
+            return self._lines(sentenceLength=sentenceLength, update=False)
+
+        if self._fast_text is None:
+            self._fast_text = convertPDF_pdfminer(os.path.join(self._base, self._fname), profile='fast')
+        if self._image_only(lines=self._fast_text, maxpages=PDFMINER_PROFILES['fast']['maxpages']):
+            return iter([])
+
+        return (t for t in self._fast_text if len(t) >= sentenceLength)
+
+    def _load_text(self, maxpages=-1, method='xpdf', update=True):
+        """ text lines of pdf (TextLines of cache or list) - [] for image-only pdf without ocr text """
+
+        # image-only pdf (extraction in index): no text extraction, ocr text from cache
+        if (self._text is None) and self._image_only():
+            txt = sidecar_path(os.path.join(self._base, self._fname), self._textcache)
+            self._text = convertPDF_xpdf(os.path.join(self._base, self._fname), cache=self._textcache) if os.path.exists(txt) else []
 
         if (self._text is None) or (maxpages > -1):
             if method == 'xpdf':
-                self._text = convertPDF_xpdf(os.path.join(self._base, self._fname), maxpages=maxpages, update=update)
+                self._text = convertPDF_xpdf(os.path.join(self._base, self._fname), maxpages=maxpages, update=update, cache=self._textcache)
             else:
-                self._text = convertPDF_pdfminer(os.path.join(self._base, self._fname), maxpages=maxpages)
+                self._text = convertPDF_pdfminer(os.path.join(self._base, self._fname), maxpages=max(maxpages, 0))
+
+        # text sample: stamps and page numbers of scanned pages (no ocr text)
+        if self._image_only(lines=self._text, maxpages=max(maxpages, 0)):
+            log.debug('... image only pdf (no ocr text): {}', self._fname, show=self._debug)
+            return []
 
-        if (len(self._text) < 2) or (self._text is None):
-            print('... can not read pdf: {}'.format(self._fname))
+        if (self._text is None) or (len(self._text) < 2):
+            log.warning('... can not read pdf: {}', self._fname)
             self._text = self.__repr__().split('\n')
 
+        return self._text
+
+    def _lines(self, sentenceLength=10, **kwargs):
+        """ generate lines with sentenceLength or more characters - lines of TextLines are decoded when read """
+
+        for t in self._load_text(**kwargs):
+            if len(t) >= sentenceLength:
+                yield t
+
+    def contents(self, sentenceLength=10, split=True, maxpages=-1, clean=False, method='xpdf', update=True):
+        """ extract only contents or filter out short sentences """
+
         if clean:
             cleanlist = list("()\.,?!@#$%^&[]")
         else:
             cleanlist = ['']
 
         res = []
-        for t in self._text:
-            if len(t) < sentenceLength:
-                continue
-
+        for t in self._lines(sentenceLength=sentenceLength, maxpages=maxpages, method=method, update=update):
             # clean characters
             for c in cleanlist:
                 t = t.replace(c, '')
@@ -501,6 +718,36 @@ class Paper(object):
         else:
             return ''.join(res)
 
+    def first_page(self, update=False, layout=True):
+        """ title, author, abstract, keywords and doi candidates of first pages (one extraction, cached by pdf hash)
+
+        layout: pdfminer layout with font sizes for title and author (child process with time and memory budget),
+        otherwise text lines of this paper, text cache or extraction of first pages
+        """
+
+        return parse_first_pages(os.path.join(self._base, self._fname), update=update, layout=layout, text=self._text)
+
+    def bootstrap_bib(self, force=False, names=['title', 'author', 'abstract', 'doi', 'keywords']):
+        """ fill empty bib items (names) from first pages - layout pass only when title or author is asked """
+
+        empty = []
+        for name in names:
+            value = self._bib.get(name, '')
+            if force or ((len(value) == 0) if name == 'keywords' else (str(value) in ['', 'None'])):
+                empty.append(name)
+        if len(empty) == 0:
+            return self._bib
+        info = self.first_page(layout=('title' in empty) or ('author' in empty))
+
+        for name in ['title', 'author', 'abstract', 'doi']:
+            if (name in empty) and (info.get(name, '') != ''):
+                self._update_bibitem(name, new_value=info[name])
+
+        if ('keywords' in empty) and (len(info.get('keywords', [])) > 0):
+            self._update_bibitem('keywords', new_value=list(info['keywords']))
+
+        return self._bib
+
     def head(self, n=10, linenumber=True):
         """ show head of texts from paper """
 
@@ -513,32 +760,46 @@ class Paper(object):
     def search_text(self, sstr):
         """ search text by search word """
 
+        # text cache: search mmap for bytes and decode only found lines
+        text = self._load_text()
+        if isinstance(text, TextLines):
+            lines = ((i, text[i]) for i in text.search(sstr))
+        else:
+            lines = ((i, t) for i, t in enumerate(text) if t.lower().find(sstr.lower()) > -1)
+
         found = False
-        for i, t in enumerate(self.contents()):
-            pos = t.lower().find(sstr.lower())
-            if pos > -1:
-                print('... [{}] {}'.format(i, t))
-                found = True
+        for i, t in lines:
+            print('... [{}] {}'.format(i, t.strip('\n\r')))
+            found = True
 
         return found
 
     # clean up metadata
 
     def update(self, force=False):
-        """ clean up all information on pdf file """
+        """ clean up all information on pdf file (time of each stage in pdf_stats) """
 
-        if self.doi() == '':
-            self.doi(checktitle=True)
+        with log.context(paper=self._fname), stage('update'):
+            with stage('update.doi'):
+                # doi and keywords of text lines of first pages (no layout pass), then whole text and title query
+                self.bootstrap_bib(names=['doi', 'keywords'])
+                if self.doi() == '':
+                    self.doi(checktitle=True)
 
-        if self._bib.get('pmid','') != '': self.download_pmid(self._bib.get('pmid'))
-        if self._bib.get('pmcid','') != '': self.download_pmid(self._bib.get('pmcid'))
+            with stage('update.pmid'):
+                if self._bib.get('pmid','') != '': self.download_pmid(self._bib.get('pmid'))
+                if self._bib.get('pmcid','') != '': self.download_pmid(self._bib.get('pmcid'))
 
-        if self._bib.get('doi', '') != '':
-            self.download_bib()
+            with stage('update.bib'):
+                if self._bib.get('doi', '') != '':
+                    self.download_bib()
 
-        self.bib_to_exif(self._bib, force=force)
+            with stage('update.exif'):
+                self.bib_to_exif(self._bib, force=force)
 
-        self.rename()
+            # force is only for exif values - rename is decided by policy
+            with stage('update.rename'):
+                self.rename()
 
     def interactive_update(self, dbname=None):
         """ update paper information interactively """
@@ -569,46 +830,57 @@ class Paper(object):
         if yesno in ['yes', 'y', 'Yes', 'Y', '1']:
             self.update(force=True)
 
-    def rename(self):
-        """ rename pdf file as specific format YEAR-AUTHOR1LASTNAME-JOURNAL """
-
-        ready = 0
+    def new_fname(self):
+        """ pdf filename in specific format YEAR-AUTHOR1LASTNAME-JOURNAL.pdf """
 
         try:
-            year = self._bib.get('year')
-            author = find_author1(self._bib.get('author'))
-            journal = self._bib.get('journal')
-        except:
-            print('... either year, author1, journal information is missing!')
+            year = self.field('year')
+            author = find_author1(self.field('author'))
+            journal = self.field('journal')
+            return "{}-{}-{}.pdf".format(year, author.replace('-', '_'), journal.replace(' ', '_'))
+        except (AttributeError, TypeError, IndexError):
+            log.warning('... either year, author1, journal information is missing!')
+            return None
+
+    def rename(self, force=False):
+        """ rename pdf file as specific format YEAR-AUTHOR1LASTNAME-JOURNAL
+
+        force: rename without asking - otherwise decided by rename mode of policy
+        """
+
+        target = self.new_fname()
+        if target is None:
             return
 
-        new_fname = "{}-{}-{}.pdf".format(year, author.replace('-', '_'), journal.replace(' ', '_'))
-        #count = 1
-        #while os.path.exists(os.path.join(self._base, new_fname)):
-        #    new_fname = new_fname.replace(".pdf", "-{}.pdf".format(count))
-        #    count = count + 1
-
-        if self._fname == new_fname:
-            if self._debug: print('... same name: {}'.format(self._fname))
+        # avoid collision with other files (suffix -1, -2, ...)
+        plan = plan_rename({os.path.join(self._base, self._fname): target})
+        if len(plan) == 0:
+            log.debug('... same name: {}', self._fname, show=self._debug)
             return
+        new_fname = os.path.basename(plan[0][1])
 
-        print('... [1] old name: {} \n... [2] new name: {}'.format(self._fname, new_fname))
+        log.info('... [1] old name: {} \n... [2] new name: {}', self._fname, new_fname)
 
-        yesno = input("Do you really want to change? (Yes/No)")
+        if force:
+            yesno = True
+        else:
+            yesno = self._policy.choose_rename(self._fname, new_fname, filename=os.path.join(self._base, self._fname),
+                    prompt="... [1] old name: {}\n... [2] new name: {}\nDo you really want to change? (Yes/No) ".format(self._fname, new_fname))
 
-        if yesno in ['Yes', 'y', 'Y', 'yes', '2']:
-            os.rename(os.path.join(self._base, self._fname), os.path.join(self._base, new_fname))
+        if not yesno:
+            return
 
-            old_bibfname = self._base + '/.' + self._fname.replace('.pdf', '.bib')
+        # move pdf and hidden bib, txt files together (plan again under lock - other batches may have run)
+        with rename_lock(self._base):
+            plan = plan_rename({os.path.join(self._base, self._fname): target})
+            ok = (len(plan) > 0) and execute_rename(plan, debug=self._debug)
+        if ok:
+            new_fname = os.path.basename(plan[0][1])
             self._fname = new_fname
-            new_bibfname = self._base + '/.' + self._fname.replace('.pdf', '.bib')
 
             #self._update_bibitem("local-url", new_value="./" + new_fname)
 
             self._bib['local-url'] = "./" + new_fname
-            if os.path.exists(old_bibfname):
-                print('... move bib file: {}'.format(new_bibfname))
-                os.rename(old_bibfname, new_bibfname)
 
     def _set_meta(self, tagname, value, force=False, cleanup=True):
         """ set meta data using exiftool and check previous values """
@@ -638,24 +910,28 @@ class Paper(object):
                 if force:
                     yesno = 'y'
                 else:
-                    yesno = input('[{}] 1 -> 2 \n[1] {} \n[2] {}\nChoose (1/2) '.format(tagname, tag_value, value))
+                    prompt = '[{}] 1 -> 2 \n[1] {} \n[2] {}\nChoose (1/2) '.format(tagname, tag_value, value)
+                    yesno = 'y' if self._policy.choose(tagname, tag_value, value, filename=os.path.join(self._base, self._fname), prompt=prompt) else 'n'
             elif value in ['None', 'nan']:
                 yesno = 'n'
             else:
-                if self._debug: print('... update tag [{}]: same values'.format(tagname))
+                log.debug('... update tag [{}]: same values', tagname, show=self._debug)
                 yesno = 'n'
 
         # set new tag value
         if (yesno in ['Yes', 'yes', 'y', 'Y', '2']) and value_exist:
             try:
                 value = list(value) if isinstance(value, set) else value
-                self._exif.setTag(tagname, value)
-                print('... save exif tag [{}] to {}'.format(tagname, self._fname))
+                count('subprocess.exiftool')
+                with stage('exiftool.write'):
+                    self._exif.setTag(tagname, value)
+                log.info('... save exif tag [{}] to {}', tagname, self._fname)
             except:
-                print('... exiftool error')
+                log.warning('... exiftool error')
 
-        self._exif = pyexif.ExifEditor(os.path.join(self._base, self._fname))
-        self._dictTags = self._exif.getDictTags()
+        # read again on next access
+        self._exif_editor = None
+        self._tags = None
 
     def _update_bibitem(self, colname, new_value=None):
         """ set / get bib item """
@@ -695,7 +971,7 @@ class Paper(object):
                     new_value = "doi:"+new_value
 
             if old_value == new_value:
-                if self._debug: print('... [{}]: same value {}'.format(colname, new_value))
+                log.debug('... [{}]: same value {}', colname, new_value, show=self._debug)
                 return new_value
 
             if old_value in ['None', '', 0, 'nan']:
@@ -705,8 +981,7 @@ class Paper(object):
             if new_value in ['None', '', 'nan', 0]:
                 return old_value
 
-            yesno = input("[{}] \n[1] {}\n[2] {}\nChoose (1/2): ".format(colname, old_value, new_value))
-            if yesno in ['Yes', 'yes', 'Y', 'y', '2']:
+            if self._policy.choose(colname, old_value, new_value, filename=os.path.join(self._base, self._fname)):
                 self._bib[colname] = new_value
 
         return self._bib.get(colname, '')
@@ -714,14 +989,26 @@ class Paper(object):
     def save_bib(self):
         """ save bib file """
 
-        save_bib([self._bib], self._bibfname)
+        save_bib([self._bib], sidecar_path(os.path.join(self._base, self._fname), 'bib', create=True))
         self._exist_bib = True
 
-    def save_markdown(self, output_dir='markdown/'):
-        """ save paper information as markdown file """
+    def save_markdown(self, output_dir='markdown/', resolution=150, fmt='jpeg', quality=85, update=False, verb=True):
+        """ save paper information as markdown file with page images
+
+        output_dir is relative to pdf directory. skip when markdown file is
+        newer than pdf and bib file (unless update)
+        """
 
-        convertPDF_images(self._fname, output_dir='markdown/')
+        pdf_path = os.path.join(self._base, self._fname)
+        images = convertPDF_images(pdf_path, output_dir=output_dir, resolution=resolution, fmt=fmt, quality=quality, update=update)
         fname = '[paper] ' + self.title().replace(' ', '_') + '('+ str(self.year()) + ').md'
+        mk_fname = os.path.join(self._base, output_dir, fname)
+
+        src_mtime = os.path.getmtime(pdf_path)
+        if os.path.exists(self._bibfname): src_mtime = max(src_mtime, os.path.getmtime(self._bibfname))
+        if (not update) and os.path.exists(mk_fname) and (os.path.getmtime(mk_fname) >= src_mtime):
+            log.debug('... markdown is up to date: {}', mk_fname, show=self._debug)
+            return mk_fname
 
         msg = '### Abstract (ko) \n\n' + self.abstract_ko() + '\n\n'
         msg += '---\n'
@@ -735,14 +1022,103 @@ class Paper(object):
         msg += '### Abstract \n\n' + self.abstract() + '\n\n'
         msg += '---\n'
         msg += '### Pages \n\n'
-        msg += '![image1](' + self._fname.replace('.pdf', '-01.jpg') + ')\n'
-        msg += '![image2](' + self._fname.replace('.pdf', '-02.jpg') + ')\n'
+        for i, img in enumerate(images):
+            msg += '![image{}]('.format(i+1) + os.path.basename(img) + ')\n'
 
-        mk_fname = output_dir + fname
         with open(mk_fname, "w+") as f:
             f.write(msg)
 
-        print(msg)
+        if verb: print(msg)
+        return mk_fname
+
+
+class PaperRecord(object):
+    """ lightweight paper record for large catalogs
+
+    only identifying metadata is kept. text, bib and exif are loaded on
+    demand and Paper object is created by to_paper()
+    """
+
+    __slots__ = ('path', 'year', 'author1', 'journal', 'doi', 'title')
+
+    def __init__(self, path, year=0, author1='', journal='', doi='', title=''):
+        """ initialize record - repeated strings are interned, missing values (None) are empty """
+
+        self.path = os.path.abspath(path)
+        self.year = int(str(year).split('.')[0]) if str(year).split('.')[0].isdigit() else 0
+        self.author1 = sys.intern(str(author1 or ''))
+        self.journal = sys.intern(str(journal or ''))
+        self.doi = str(doi or '')
+        self.title = str(title or '')
+
+    def __repr__(self):
+        return "PaperRecord({}, {}, {}, {})".format(os.path.basename(self.path), self.year, self.author1, self.journal)
+
+    @classmethod
+    def from_paper(cls, paper):
+        """ make record from Paper object """
+
+        bib = paper.bib()
+        author1 = bib.get('author1', '')
+        if (author1 == '') and (bib.get('author', '') != ''): author1 = find_author1(bib.get('author'))
+
+        return cls(os.path.join(paper._base, paper._fname), year=bib.get('year', 0), author1=author1,
+                journal=bib.get('journal', ''), doi=bib.get('doi', ''), title=bib.get('title', ''))
+
+    @classmethod
+    def from_index(cls, base, item):
+        """ make record from index item """
+
+        return cls(os.path.join(base, item['fname']), year=item.get('year', 0), author1=item.get('author1', ''),
+                journal=item.get('journal', ''), doi=item.get('doi', ''), title=item.get('title', ''))
+
+    def as_dict(self):
+        """ record as dictionary (index item fields) """
+
+        return {'fname': os.path.basename(self.path), 'year': self.year, 'author1': self.author1,
+                'journal': self.journal, 'doi': self.doi, 'title': self.title}
+
+    def to_paper(self, **kwargs):
+        """ create Paper object (record is used as index for Paper.field) """
+
+        return Paper(self.path, index=self.as_dict(), **kwargs)
+
+    def text(self, **kwargs):
+        """ read text of pdf (cached in hidden file) """
+
+        return convertPDF_xpdf(self.path, **kwargs)
+
+    def bib(self):
+        """ read hidden bib file """
+
+        return read_bib(sidecar_path(self.path, 'bib'), verb=False)
+
+    def exif(self):
+        """ read exif tags of pdf """
+
+        from pyexif import pyexif
+        return pyexif.ExifEditor(self.path).getDictTags()
+
+
+def load_catalog(base):
+    """ list of PaperRecord from library index (scan when no index) """
+
+    index = read_index(base)
+    if len(index) == 0:
+        index = {item['fname']: item for item in (scan_file(f) for f in list_pdfs(base))}
+
+    return [PaperRecord.from_index(os.path.abspath(base), item) for _, item in sorted(index.items())]
+
+
+def save_catalog(base, records):
+    """ save metadata of PaperRecord list into library index """
+
+    index = read_index(base)
+    for r in records:
+        item = r.as_dict()
+        index[item['fname']] = dict(index.get(item['fname'], {}), **item)
+
+    return save_index(base, index)
 
 
 def openPDF(filename):
@@ -762,3 +1138,598 @@ def openPDF(filename):
         cmd = ['Open', abs_loc]
     output = subprocess.Popen(cmd)
 
+
+def _run_one(func, filename):
+    """ run func(filename) with paper name on log messages - 'paper' event with time in trace """
+
+    start = time.perf_counter()
+    error = None
+    with log.context(paper=os.path.basename(filename)):
+        try:
+            return func(filename)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            log.event('paper', seconds=round(time.perf_counter() - start, 6), error=None if error is None else repr(error))
+
+
+def run_parallel(func, flist, workers=4, desc='', verb=True):
+    """ run func(filename) on process pool - return dict of {filename: result or exception}
+
+    stage timers and counters of workers are merged into this process (pdf_stats)
+    """
+
+    results = {}
+    start = time.time()
+    n = len(flist)
+
+    def progress(i):
+        if not verb: return
+        rate = i / max(time.time() - start, 1e-6)
+        sys.stderr.write('\r... [{}] {}/{} ({:.1f} files/s)'.format(desc, i, n, rate))
+        sys.stderr.flush()
+
+    if workers < 2:
+        for i, f in enumerate(flist):
+            try:
+                results[f] = _run_one(func, f)
+            except Exception as e:
+                results[f] = e
+            progress(i + 1)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futures = {ex.submit(with_stats, _run_one, func, f): f for f in flist}
+            for i, fut in enumerate(as_completed(futures)):
+                try:
+                    results[futures[fut]], snapshot = fut.result()
+                    merge(snapshot)
+                except Exception as e:
+                    results[futures[fut]] = e
+                progress(i + 1)
+
+    if verb:
+        elapsed = time.time() - start
+        errors = sum(1 for r in results.values() if isinstance(r, Exception))
+        sys.stderr.write('\n... [{}] {} files in {:.1f} s ({:.1f} files/s, {} errors)\n'.format(desc, n, elapsed, n / max(elapsed, 1e-6), errors))
+
+    return results
+
+
+def _extract_one(filename, cache='txt', timeout=TIMEOUT, memory=MEMORY):
+    """ worker: extract text into hidden txt (or txtc) file within budget - return cost (engine, status, seconds) """
+
+    return extract_text(filename, cache=cache, timeout=timeout, memory=memory)[1]
+
+
+def _update_one(filename, dry_run=False, policy='review', review_file=None, rename=None):
+    """ worker: update metadata and rename - conflicts are decided by policy """
+
+    p = Paper(filename, policy=get_policy(policy, review_file=review_file, rename=rename))
+    if dry_run:
+        return p.new_fname()
+
+    p.update()
+    return p._fname
+
+
+def _pipeline_extract(item):
+    """ pipeline stage (process): read bib file, exif, doi and keywords of first pages (doi in whole text) """
+
+    p = Paper(item['filename'], policy=get_policy(item['policy'], review_file=item['review_file'], rename=item.get('rename')), textcache=item['textcache'])
+    p.bootstrap_bib(names=['doi', 'keywords'])
+    p.doi()
+    return dict(item, bib=p._bib, filebib=p._read_filebib(), exist_bib=p._exist_bib, tags=p._tags)
+
+
+async def _pipeline_resolve(item):
+    """ pipeline stage (async): doi by title and pmid from crossref and ncbi """
+
+    bib = item['bib']
+    remote = []
+
+    if (bib.get('doi', '') == '') and (bib.get('title', '') != ''):
+        res = await to_thread(crossref_query_title, bib.get('title'))
+        if res['success'] and (res['result']['similarity'] > 0.9):
+            remote.append({'title': res['result']['crossref_title'], 'doi': res['result']['doi']})
+
+    for idstring in [bib.get('pmid', ''), bib.get('pmcid', '')]:
+        if idstring == '': continue
+        found, result = await to_thread(get_pmid, idstring)
+        if found:
+            remote.append(ncbi_to_dict(result))
+
+    doi = bib.get('doi', '')
+    for r in remote:
+        if doi == '': doi = r.get('doi', '')
+
+    return dict(item, remote=remote, doi=doi, save_bib=doi != '')
+
+
+def _pipeline_bib(items):
+    """ pipeline stage (thread, batch): bib of bib file (read by extract stage) or crossref (many dois per request) and arxiv """
+
+    dois = [item['doi'] for item in items if (item['doi'] != '') and (not item['filebib'])]
+    bibs = get_bibs(dois) if len(dois) > 0 else {}
+
+    res = []
+    for item in items:
+        if item['doi'] == '':
+            res.append(item)
+            continue
+
+        new = item['filebib'] or bibs.get(item['doi'].lower())
+        res.append(dict(item, remote=item['remote'] + [new]) if isinstance(new, dict) else item)
+
+    return res
+
+
+def _pipeline_write(item):
+    """ pipeline stage (thread): update bib by policy, save bib file and exif - new filename for rename batch """
+
+    p = Paper(item['filename'], policy=get_policy(item['policy'], review_file=item['review_file'], rename=item.get('rename')), textcache=item['textcache'])
+    p._bib = dict(item['bib'])
+    p._bib_loaded = True
+    p._exist_bib = item['exist_bib']
+    p._tags = item['tags']
+
+    for values in item['remote']:
+        p.bib(bib=values)
+    if item['save_bib']:
+        save_bib([p._bib], sidecar_path(item['filename'], 'bib', create=True))
+        p._exist_bib = True
+
+    with stage('update.exif'):
+        p.bib_to_exif(p._bib)
+
+    new_fname = p.new_fname()
+    if (new_fname is not None) and (new_fname != p._fname):
+        if p._policy.choose_rename(p._fname, new_fname, filename=item['filename']):
+            return dict(item, new_fname=new_fname)
+
+    return item
+
+
+def update_library(flist, workers=4, resolve_workers=16, write_workers=2, queue_size=64, policy='review', review_file=None,
+        textcache='txt', doi_batch=CROSSREF_BATCH, rename=None, verb=True):
+    """ update metadata of many papers by pipeline - return dict of {filename: new filename or exception}
+
+    extract (process pool) -> resolve (asyncio, network) -> bib (doi_batch dois per crossref request) -> write (thread pool, bib and exif)
+    stages run at the same time with bounded queues between them. renames are done as one batch at the end.
+    policy 'ask' is not possible in worker processes (use Paper.update).
+    """
+
+    if get_policy(policy, rename=rename).interactive:
+        raise ValueError("... update_library runs in worker processes - use other policy than 'ask'")
+
+    pipe = Pipeline([Stage('extract', _pipeline_extract, workers=workers, kind='process'),
+                     Stage('resolve', _pipeline_resolve, workers=resolve_workers, kind='async'),
+                     Stage('bib', _pipeline_bib, workers=2, kind='thread', batch=doi_batch),
+                     Stage('write', _pipeline_write, workers=write_workers, kind='thread')], maxsize=queue_size)
+
+    start = time.time()
+    n = len(flist)
+
+    def progress(i):
+        if not verb: return
+        sys.stderr.write('\r... [update] {}/{} ({:.1f} files/s)'.format(i, n, i / max(time.time() - start, 1e-6)))
+        sys.stderr.flush()
+
+    items = ({'filename': f, 'policy': policy, 'review_file': review_file, 'rename': rename, 'textcache': textcache} for f in flist)
+    out = pipe.run(items, progress=progress)
+    if verb:
+        sys.stderr.write('\n')
+        pipe.report()
+
+    results = {r['filename']: r['error'] if 'error' in r else os.path.basename(r['filename']) for r in out}
+
+    # one rename batch per directory
+    targets = {}
+    for r in out:
+        if ('error' not in r) and ('new_fname' in r):
+            targets.setdefault(os.path.dirname(r['filename']), {})[r['filename']] = r['new_fname']
+
+    for base, t in targets.items():
+        with stage('update.rename'), rename_lock(base):
+            plan = plan_rename(t)
+            ok = execute_rename(plan)
+        if ok:
+            for src, dst in plan: results[src] = os.path.basename(dst)
+
+    return results
+
+
+def ingest(flist, index, workers=4, policy='review', review_file=None, cache='txt', update=True, rename=None):
+    """ extract text, update metadata (and rename) of new pdf files and put them into index - return dict of {filename: new filename or exception} """
+
+    costs = run_parallel(functools.partial(_extract_one, cache=cache), flist, workers=workers, desc='extract', verb=False)
+    if update:
+        res = update_library(flist, workers=workers, policy=policy, review_file=review_file, textcache=cache, rename=rename, verb=False)
+    else:
+        res = {f: os.path.basename(f) for f in flist}
+
+    for f in flist:
+        r = res.get(f, os.path.basename(f))
+        if isinstance(r, Exception):
+            log.warning('... ingest error [{}]: {}', os.path.basename(f), r)
+            r = os.path.basename(f)
+
+        new = os.path.join(os.path.dirname(f), r)
+        if not os.path.exists(new): continue
+
+        item = scan_file(new)
+        if not isinstance(costs.get(f), Exception):
+            item['extract'], item['kind'] = costs[f], costs[f]['kind']
+        index.pop(os.path.basename(f), None)
+        index[item['fname']] = item
+        res[f] = item['fname']
+
+    return res
+
+
+def watch_library(base, workers=4, policy='review', review_file=None, cache='txt', settle=SETTLE, interval=INTERVAL, poll=False,
+        update=True, rename=None, dry_run=False, stop=None, verb=True):
+    """ watch library directory - new and changed pdf files are extracted, updated and indexed (until stop is set or ctrl-c)
+
+    files are read when they are written completely (see pdf_watch). files of index with same size and mtime are skipped.
+    """
+
+    if update and get_policy(policy, rename=rename).interactive:
+        raise ValueError("... watch runs without terminal input - use other policy than 'ask'")
+
+    base = os.path.abspath(os.path.expanduser(base))
+    index = read_index(base)
+
+    watcher = Watcher(base, settle=settle, interval=interval, poll=poll)
+    for item in index.values():
+        if ('size' in item) and ('mtime' in item):
+            watcher.mark(item['fname'], (item['size'], item['mtime']))
+    watcher.scan()
+    if verb: print('... watch {} ({}, {} papers in index)'.format(base, watcher.mode, len(index)))
+
+    try:
+        while (stop is None) or (not stop.is_set()):
+            ready, deleted = watcher.wait()
+
+            for f in deleted:
+                if (index.pop(os.path.basename(f), None) is not None) and verb:
+                    print('... removed {}'.format(os.path.basename(f)))
+
+            if dry_run:
+                for f in ready:
+                    print('... ingest: {}'.format(os.path.basename(f)))
+                    watcher.mark(os.path.basename(f))
+                continue
+
+            if len(ready) > 0:
+                start = time.time()
+                try:
+                    res = ingest(ready, index, workers=workers, policy=policy, review_file=review_file, cache=cache, update=update,
+                            rename=rename)
+                except Exception as e:
+                    # watch goes on with next files
+                    log.error('... ingest error ({} files): {}', len(ready), e)
+                    res = {f: e for f in ready}
+                for f in ready:
+                    # failed files are read again only when they change
+                    watcher.forget(os.path.basename(f))
+                    watcher.mark(res[f] if isinstance(res.get(f), str) else os.path.basename(f))
+                    if verb: print('... ingest {} -> {} ({:.1f} s)'.format(os.path.basename(f), res.get(f), time.time() - start))
+                log.event('ingest', files=len(ready), seconds=round(time.time() - start, 3))
+
+            if (len(ready) > 0) or (len(deleted) > 0):
+                save_index(base, index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+    return index
+
+
+def _ocr_one(filename, cache='txt', language='eng'):
+    """ worker: ocr text of image-only pdf into text cache - return status """
+
+    return run_ocr(filename, cache=cache, language=language)[1]
+
+
+def _rename_one(filename, dry_run=False):
+    """ worker: rename pdf file by metadata (dry_run: return new filename) """
+
+    p = Paper(filename)
+    if dry_run:
+        return p.new_fname()
+
+    p.rename(force=True)
+    return p._fname
+
+
+def _markdown_one(filename, output_dir='markdown/', resolution=150, fmt='jpeg', quality=85, update=False):
+    """ worker: save markdown file and page images """
+
+    p = Paper(filename, policy='local')
+    return p.save_markdown(output_dir=output_dir, resolution=resolution, fmt=fmt, quality=quality, update=update, verb=False)
+
+
+def export_markdown(flist, output_dir='markdown/', workers=4, resolution=150, fmt='jpeg', quality=85, update=False, verb=True):
+    """ save markdown files of many papers with process pool - skip up-to-date files """
+
+    func = functools.partial(_markdown_one, output_dir=output_dir, resolution=resolution, fmt=fmt, quality=quality, update=update)
+    return run_parallel(func, flist, workers=workers, desc='markdown', verb=verb)
+
+
+def _search_one(filename, sstr='', cache='txt'):
+    """ worker: search word in pdf text - return list of (line number, line) """
+
+    text = convertPDF_xpdf(filename, cache=cache)
+    if isinstance(text, TextLines):
+        res = [(i, text[i].strip('\n\r')) for i in text.search(sstr)]
+        text.close()
+        return res
+
+    sstr = sstr.lower()
+    return [(i, t.strip('\n\r')) for i, t in enumerate(text) if t.lower().find(sstr) > -1]
+
+
+def main(argv=None):
+    """ command line interface - bulk operations over library directory """
+
+    parser = argparse.ArgumentParser(prog='py_readpaper', description='bulk operations on paper pdf library')
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes (default: number of cpus)")
+    parser.add_argument("-n", "--dry-run", action='store_true', help="show what would be done without changing files")
+    parser.add_argument("-q", "--quiet", action='store_true', help="do not show progress")
+    parser.add_argument("-p", "--policy", default='review', choices=POLICY_MODES, help="conflict resolution between local and remote values (default: review)")
+    parser.add_argument("--rename", default=None, choices=RENAME_MODES, help="rename by metadata in update and watch (default: yes, ask for policy ask)")
+    parser.add_argument("--review-file", default=None, help="file for unresolved conflicts (default: DIR/.review.jsonl)")
+    parser.add_argument("--cache-dir", default=None, help="central cache store for txt/bib files (default: hidden files or $PY_READPAPER_CACHE)")
+    parser.add_argument("--snapshot", default=None, metavar='DB', help="offline title/doi lookup in sqlite snapshot (see snapshot command)")
+    parser.add_argument("--stats", action='store_true', help="show time of stages and counters of subprocess, http and cache")
+    parser.add_argument("--profile", action='store_true', help="run in one process with cProfile and show top functions")
+    parser.add_argument("--log-level", default='warning', choices=['debug', 'info', 'warning', 'error'], help="level of messages on console (default: warning)")
+    parser.add_argument("--trace", default=None, metavar='FILE', help="write messages, per-paper events and stage times as json lines")
+    subparsers = parser.add_subparsers(dest='command')
+
+    p = subparsers.add_parser('scan', help='build library index from filenames and hidden files')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+
+    p = subparsers.add_parser('extract', help='extract text of pdf files into hidden txt files')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+    p.add_argument("-u", "--update", action='store_true', help="extract again even if txt file exists")
+    p.add_argument("-c", "--cache", default='txt', choices=['txt', 'txtc'], help="text cache format (default: txt)")
+    p.add_argument("-t", "--timeout", type=float, default=TIMEOUT, help="seconds per file (default: {})".format(TIMEOUT))
+    p.add_argument("-m", "--memory", type=int, default=MEMORY, help="memory limit of extraction process in MB (default: {})".format(MEMORY))
+
+    p = subparsers.add_parser('ocr', help='ocr of image-only pdfs found by scan/extract into text cache (needs ocrmypdf)')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+    p.add_argument("-c", "--cache", default='txt', choices=['txt', 'txtc'], help="text cache format (default: txt)")
+    p.add_argument("-l", "--language", default='eng', help="tesseract language (default: eng)")
+    p.add_argument("-u", "--update", action='store_true', help="ocr again even if done before")
+
+    p = subparsers.add_parser('update', help='update metadata (doi, bib, exif) and rename')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+    p.add_argument("--resolve-workers", type=int, default=16, help="concurrent metadata requests (default: 16)")
+    p.add_argument("--write-workers", type=int, default=2, help="threads writing bib files and exif (default: 2)")
+    p.add_argument("--queue-size", type=int, default=64, help="papers waiting between two stages (default: 64)")
+    p.add_argument("--doi-batch", type=int, default=CROSSREF_BATCH, help="dois per crossref request (default: {})".format(CROSSREF_BATCH))
+
+    p = subparsers.add_parser('rename', help='rename pdf files as YEAR-AUTHOR1-JOURNAL.pdf (one batch with rollback)')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+
+    p = subparsers.add_parser('markdown', help='export markdown notes with page images')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+    p.add_argument("-o", "--output", default='markdown/', help="output directory relative to library (default: markdown/)")
+    p.add_argument("-r", "--resolution", type=int, default=150, help="page image resolution in dpi (default: 150)")
+    p.add_argument("-f", "--format", default='jpeg', choices=['jpeg', 'png'], help="page image format (default: jpeg)")
+    p.add_argument("--quality", type=int, default=85, help="jpeg quality (default: 85)")
+    p.add_argument("-u", "--update", action='store_true', help="export again even if files are up to date")
+
+    p = subparsers.add_parser('watch', help='watch library and ingest new pdf files (extract, update, index) until ctrl-c')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+    p.add_argument("-c", "--cache", default='txt', choices=['txt', 'txtc'], help="text cache format (default: txt)")
+    p.add_argument("--settle", type=float, default=SETTLE, help="seconds without change before a file is read (default: {})".format(SETTLE))
+    p.add_argument("--interval", type=float, default=INTERVAL, help="seconds between scans when polling (default: {})".format(INTERVAL))
+    p.add_argument("--poll", action='store_true', help="poll directory instead of inotify")
+    p.add_argument("--no-update", action='store_true', help="only extract text and index (no metadata update and rename)")
+
+    p = subparsers.add_parser('export', help='write bib of all papers into one bibtex, csv or parquet file')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+    p.add_argument("-o", "--output", default='library.bib', help="output file (default: library.bib)")
+    p.add_argument("-f", "--format", default=None, choices=sorted(set(EXPORT_FORMATS.values())), help="output format (default: by extension)")
+
+    p = subparsers.add_parser('migrate', help='move hidden .bib/.txt/.txtc files into cache store (--cache-dir)')
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+
+    p = subparsers.add_parser('snapshot', help='index crossref/pubmed json lines dumps into sqlite snapshot for offline title lookup')
+    p.add_argument("dumps", nargs='+', help="json lines files (.jsonl or .jsonl.gz)")
+    p.add_argument("-o", "--output", default='works.sqlite', help="snapshot file (default: works.sqlite)")
+
+    p = subparsers.add_parser('search', help='search word in pdf texts')
+    p.add_argument("query", help="search word")
+    p.add_argument("dir", nargs='?', default='.', help="library directory (default: .)")
+    p.add_argument("-c", "--cache", default='txt', choices=['txt', 'txtc'], help="text cache format (default: txt)")
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 1
+
+    if args.cache_dir is not None:
+        set_cache_dir(args.cache_dir)
+    if args.snapshot is not None:
+        set_snapshot(args.snapshot)
+
+    # worker processes read level and trace file from environment
+    log.set_level(args.log_level)
+    if args.trace is not None:
+        log.enable_trace(args.trace, level='debug' if args.log_level == 'debug' else 'info')
+
+    if args.profile:
+        args.workers = 1
+        ret, text = profile(_run_command, args)
+        print(text)
+    else:
+        ret = _run_command(args)
+
+    if args.stats:
+        report()
+
+    if args.trace is not None:
+        log.disable_trace()
+
+    return ret
+
+
+def _run_command(args):
+    """ run subcommand of command line - return exit code """
+
+    verb = not args.quiet
+
+    if args.command == 'snapshot':
+        if args.dry_run:
+            for f in args.dumps: print('... index: {}'.format(f))
+            return 0
+        build_snapshot(args.dumps, args.output, verb=verb)
+        return 0
+
+    flist = list_pdfs(args.dir)
+
+    if args.command == 'scan':
+        index = read_index(args.dir)
+        res = run_parallel(scan_file, flist, workers=args.workers, desc='scan', verb=verb)
+        items = {r['fname']: dict(index.get(r['fname'], {}), **r) for r in res.values() if not isinstance(r, Exception)}
+
+        print('... files: {} ({:.1f} MB)'.format(len(items), sum(i['size'] for i in items.values())/1e6))
+        print('... pages: {}'.format(sum(i.get('pages', 0) for i in items.values())))
+        print('... bib files: {}'.format(sum(1 for i in items.values() if i['bib'])))
+        print('... txt files: {}'.format(sum(1 for i in items.values() if i['txt'])))
+        print('... image only (ocr queue): {}'.format(sum(1 for i in items.values() if i.get('kind') == 'image')))
+        for i in items.values():
+            if 'year' not in i: print('... Check filename: {}'.format(i['fname']))
+
+        if not args.dry_run:
+            print('... save to {}'.format(save_index(args.dir, items)))
+
+    elif args.command == 'extract':
+        # skip files with cache or timed out / out of memory before
+        index = read_index(args.dir)
+        if not args.update:
+            flist = [f for f in flist if not os.path.exists(sidecar_path(f, args.cache))
+                    and index.get(os.path.basename(f), {}).get('extract', {}).get('status') not in SKIP_STATUS]
+        if args.dry_run:
+            for f in flist: print('... extract: {}'.format(f))
+            return 0
+        func = functools.partial(_extract_one, cache=args.cache, timeout=args.timeout, memory=args.memory)
+        res = run_parallel(func, flist, workers=args.workers, desc='extract', verb=verb)
+
+        # extraction cost and kind (image-only pdfs are ocr queue) into index
+        for f, cost in res.items():
+            if isinstance(cost, Exception): continue
+            item = index.setdefault(os.path.basename(f), {'fname': os.path.basename(f)})
+            item['extract'], item['kind'] = cost, cost['kind']
+        if len(res) > 0:
+            save_index(args.dir, index)
+
+    elif args.command == 'ocr':
+        # queue: image-only pdfs of index without ocr text
+        index = read_index(args.dir)
+        flist = [f for f in flist if index.get(os.path.basename(f), {}).get('kind') == 'image'
+                and (args.update or 'ocr' not in index[os.path.basename(f)])]
+        if args.dry_run or not has_ocr():
+            if not has_ocr(): log.warning('... ocrmypdf not found - ocr queue:')
+            for f in flist: print('... ocr: {}'.format(f))
+            return 0
+        func = functools.partial(_ocr_one, cache=args.cache, language=args.language)
+        res = run_parallel(func, flist, workers=args.workers, desc='ocr', verb=verb)
+
+        for f, status in res.items():
+            if isinstance(status, Exception): continue
+            index[os.path.basename(f)]['ocr'] = status
+        if len(res) > 0:
+            save_index(args.dir, index)
+
+    elif args.command == 'rename':
+        res = run_parallel(functools.partial(_rename_one, dry_run=True), flist, workers=args.workers, desc='plan', verb=verb)
+        if args.dry_run:
+            # no recovery and no lock - files are not touched
+            if os.path.exists(os.path.join(args.dir, JOURNAL_FNAME)):
+                log.warning('... unfinished rename journal (rolled back before next rename): {}', args.dir)
+            print_plan(plan_rename({f: r for f, r in res.items() if isinstance(r, str)}))
+            return 0
+
+        recover_rename(args.dir)
+        with rename_lock(args.dir):
+            plan = plan_rename({f: r for f, r in res.items() if isinstance(r, str)})
+            print_plan(plan)
+            if not execute_rename(plan):
+                return 1
+
+    elif args.command == 'update':
+        review_file = args.review_file or os.path.join(os.path.abspath(args.dir), '.review.jsonl')
+        try:
+            policy = check_policy(args.policy, workers=args.workers, review_file=review_file, rename=args.rename)
+        except ValueError as e:
+            log.error('{}', e)
+            return 2
+        if args.dry_run or policy.interactive:
+            # questions on terminal - one paper after the other
+            if not args.dry_run: recover_rename(args.dir)
+            func = functools.partial(_update_one, dry_run=args.dry_run, policy=args.policy, review_file=review_file, rename=args.rename)
+            res = run_parallel(func, flist, workers=1 if policy.interactive else args.workers, desc=args.command, verb=verb)
+        else:
+            recover_rename(args.dir)
+            res = update_library(flist, workers=args.workers, resolve_workers=args.resolve_workers, write_workers=args.write_workers,
+                    queue_size=args.queue_size, policy=args.policy, review_file=review_file, doi_batch=args.doi_batch,
+                    rename=args.rename, verb=verb)
+        for f, r in sorted(res.items()):
+            if isinstance(r, str) and (r != os.path.basename(f)):
+                print('... {}: {} -> {}'.format('rename' if args.dry_run else 'renamed', os.path.basename(f), r))
+
+    elif args.command == 'markdown':
+        if args.dry_run:
+            for f in flist: print('... export: {}'.format(f))
+            return 0
+        res = export_markdown(flist, output_dir=args.output, workers=args.workers, resolution=args.resolution, fmt=args.format,
+                quality=args.quality, update=args.update, verb=verb)
+
+    elif args.command == 'watch':
+        review_file = args.review_file or os.path.join(os.path.abspath(args.dir), '.review.jsonl')
+        try:
+            watch_library(args.dir, workers=args.workers, policy=args.policy, review_file=review_file, cache=args.cache,
+                    settle=args.settle, interval=args.interval, poll=args.poll, update=not args.no_update, rename=args.rename,
+                    dry_run=args.dry_run, verb=verb)
+        except ValueError as e:
+            log.error('{}', e)
+            return 2
+        return 0
+
+    elif args.command == 'export':
+        if args.dry_run:
+            print('... export {} papers to {}'.format(len(flist), args.output))
+            return 0
+        n = export_library(flist, args.output, fmt=args.format, verb=False)
+        print('... export {} papers to {}'.format(n, args.output))
+        return 0
+
+    elif args.command == 'migrate':
+        if args.cache_dir is None:
+            print('... set cache store by --cache-dir')
+            return 1
+        print('... moved {} files'.format(migrate_sidecars(flist, dry_run=args.dry_run)))
+        return 0
+
+    elif args.command == 'search':
+        res = run_parallel(functools.partial(_search_one, sstr=args.query, cache=args.cache), flist, workers=args.workers, desc='search', verb=verb)
+        for f, r in sorted(res.items()):
+            if isinstance(r, Exception): continue
+            for i, t in r:
+                print('{}:{}: {}'.format(os.path.basename(f), i, t))
+
+    errors = [(f, r) for f, r in res.items() if isinstance(r, Exception)]
+    for f, e in errors:
+        log.error('... error [{}]: {}', os.path.basename(f), e)
+
+    return 1 if len(errors) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -129,6 +129,7 @@ setup(
     #   py_modules=["my_module"],
     #
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),  # Required
+    py_modules=['py_readpaper', 'pdf_text', 'pdf_meta', 'pdf_index', 'pdf_dedup', 'pdf_policy', 'pdf_cache', 'pdf_rename', 'pdf_stats', 'pdf_log', 'pdf_pipeline', 'pdf_extract', 'pdf_parse', 'pdf_snapshot', 'pdf_export', 'pdf_watch'],
 
     # Specify which Python versions you support. In contrast to the
     # 'Programming Language' classifiers above, 'pip install' will check this
@@ -0,0 +1,12 @@
+"""
+conftest.py
+
+tests import modules of repository root (flat modules, as benchmarks/run.py)
+"""
+
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root not in sys.path:
+    sys.path.insert(0, root)
@@ -0,0 +1,81 @@
+"""
+pdfs.py
+
+crafted pdf files for tests - page tree, object streams, xref table or stream, incremental update
+"""
+
+import zlib
+
+FONT = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+IMAGE = b'<< /Type /XObject /Subtype /Image /Width 1 /Height 1 >>'
+
+
+def pages_objects(n, count=None, extra={}):
+    """ catalog (1), page tree (2), n pages (10, 11, ...) and extra objects """
+
+    kids = b' '.join(str(10 + i).encode() + b' 0 R' for i in range(n))
+    objs = {1: b'<< /Type /Catalog /Pages 2 0 R >>',
+            2: b'<< /Type /Pages /Kids [' + kids + b'] /Count ' + (count or str(n).encode()) + b' >>'}
+    for i in range(n):
+        objs[10 + i] = b'<< /Type /Page /Parent 2 0 R /Resources 3 0 R >>'
+    objs.update(extra)
+    return objs
+
+
+def object_stream(objs, flate=True):
+    """ compressed object stream of objs - flate False: other filter (ASCIIHex, not read by classify_pdf) """
+
+    head = b''
+    body = b''
+    for num in sorted(objs):
+        head += str(num).encode() + b' ' + str(len(body)).encode() + b' '
+        body += objs[num] + b'\n'
+    data = head + body
+    data = zlib.compress(data) if flate else data.hex().encode() + b'>'
+    filt = b'/FlateDecode' if flate else b'/ASCIIHexDecode'
+
+    return (b'<< /Type /ObjStm /N ' + str(len(objs)).encode() + b' /First ' + str(len(head)).encode()
+            + b' /Filter ' + filt + b' /Length ' + str(len(data)).encode() + b' >>\nstream\n' + data + b'\nendstream')
+
+
+def make_pdf(path, objs, xref='table', update=None):
+    """ write pdf with classic xref table or xref stream (xref='stream')
+
+    update: objects of incremental update (appended with /Prev of xref table)
+    """
+
+    out = bytearray(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for num in sorted(objs):
+        offsets[num] = len(out)
+        out += str(num).encode() + b' 0 obj\n' + objs[num] + b'\nendobj\n'
+
+    size = max(objs) + 2
+    start = len(out)
+    if xref == 'stream':
+        rows = b''.join(b'\x01' + offsets[i].to_bytes(4, 'big') + b'\x00\x00' if i in offsets else b'\x00' * 7 for i in range(size - 1))
+        rows += b'\x01' + start.to_bytes(4, 'big') + b'\x00\x00'
+        out += (str(size - 1).encode() + b' 0 obj\n<< /Type /XRef /Size ' + str(size).encode() + b' /W [1 4 2] /Root 1 0 R /Length '
+                + str(len(rows)).encode() + b' >>\nstream\n' + rows + b'\nendstream\nendobj\n')
+    else:
+        out += b'xref\n0 ' + str(size).encode() + b'\n'
+        for i in range(size):
+            out += b'%010d 00000 n \n' % offsets[i] if i in offsets else b'0000000000 65535 f \n'
+        out += b'trailer\n<< /Size ' + str(size).encode() + b' /Root 1 0 R >>\n'
+    out += b'startxref\n' + str(start).encode() + b'\n%%EOF\n'
+
+    if update is not None:
+        prev = start
+        for num in sorted(update):
+            offsets[num] = len(out)
+            out += str(num).encode() + b' 0 obj\n' + update[num] + b'\nendobj\n'
+        start = len(out)
+        out += b'xref\n'
+        for num in sorted(update):
+            out += str(num).encode() + b' 1\n' + b'%010d 00000 n \n' % offsets[num]
+        out += b'trailer\n<< /Size ' + str(size).encode() + b' /Root 1 0 R /Prev ' + str(prev).encode() + b' >>\n'
+        out += b'startxref\n' + str(start).encode() + b'\n%%EOF\n'
+
+    with open(path, 'wb') as f:
+        f.write(out)
+    return str(path)
@@ -0,0 +1,65 @@
+"""
+test_bibtex.py
+
+native bibtex writer and reader (pdf_meta.bibtex_entry, _read_bibtex, bib_to_dict)
+"""
+
+from pdf_meta import bibtex_entry
+from pdf_meta import bib_to_dict
+from pdf_meta import _read_bibtex
+
+
+BIB = {
+    'ENTRYTYPE': 'article',
+    'ID': 'Kaji_2004',
+    'title': 'Separation of Long DNA Molecules by Quartz Nanopillar Chips',
+    'author': 'Kaji, Noritada and Tezuka, Yojiro',
+    'journal': 'Analytical Chemistry',
+    'year': '2004',
+    'month': 'jun',
+    'doi': '10.1021/ac030303m',
+    'pages': '15-22',
+    'abstract': 'Long DNA (166 kbp, T4) is separated = fast; see [1].',
+}
+
+
+def test_round_trip():
+    assert _read_bibtex(bibtex_entry(BIB)) == [BIB]
+
+
+def test_round_trip_many():
+    other = dict(BIB, ID='Kaji_2004_2', title='Other')
+    text = '\n'.join(bibtex_entry(b) for b in [BIB, other])
+
+    assert _read_bibtex(text) == [BIB, other]
+    assert bib_to_dict(text) == [BIB, other]
+
+
+def test_keywords():
+    bib = bib_to_dict(bibtex_entry(dict(BIB, keywords=['dna', 'nanopillar'])))
+
+    assert bib['keywords'] == ['dna', 'nanopillar']
+
+
+def test_balanced_braces():
+    text = bibtex_entry(dict(BIB, title='Separation of {DNA} by {Quartz {Nanopillar}} Chips'))
+
+    assert '{Separation of {DNA} by {Quartz {Nanopillar}} Chips}' in text
+    assert _read_bibtex(text)[0]['title'] == 'Separation of DNA by Quartz Nanopillar Chips'
+
+
+def test_unbalanced_braces():
+    for title in ['Separation } of DNA', 'Separation { of DNA', '}{ Separation of {DNA', 'x}}}{{{']:
+        text = bibtex_entry(dict(BIB, title=title))
+        entries = _read_bibtex(text)
+
+        # valid bibtex - all other fields stay intact
+        assert entries is not None
+        assert entries[0] == dict(BIB, title=title.replace('{', '').replace('}', ''))
+        assert text.count('{') == text.count('}')
+
+
+def test_other_bibtex():
+    # latex and quoted values are left to bibtexparser
+    assert _read_bibtex('@article{a,\n title = {Caf\\\'e}\n}\n') is None
+    assert _read_bibtex('@article{a,\n title = "quoted"\n}\n') is None
@@ -0,0 +1,139 @@
+"""
+test_cache.py
+
+.txtc text cache, content key, sidecar paths and cache store of pdf_cache
+"""
+
+import os
+
+import pytest
+
+from pdf_cache import TextLines
+from pdf_cache import write_text_cache
+from pdf_cache import read_text_cache
+from pdf_cache import file_key
+from pdf_cache import sidecar_path
+from pdf_cache import store_path
+from pdf_cache import set_cache_dir
+from pdf_cache import migrate_sidecars
+
+from pdfs import pages_objects
+from pdfs import make_pdf
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    set_cache_dir(str(tmp_path / 'cache'))
+    yield str(tmp_path / 'cache')
+    set_cache_dir(None)
+
+
+def test_text_lines(tmp_path):
+    lines = ['Separation of long DNA\n', '\n', 'Nanopillar chips \u00e9\u00c9\n', 'doi: 10.1021/ac030303m']
+    text = read_text_cache(write_text_cache(lines, str(tmp_path / '.paper.txtc')))
+
+    assert isinstance(text, TextLines)
+    assert (len(text), list(text), text[-1], text[1:3]) == (4, lines, lines[-1], lines[1:3])
+    assert bytes(text.line_bytes(2)) == lines[2].encode('utf-8')
+    assert text.nbytes() == len(''.join(lines).encode('utf-8'))
+    with pytest.raises(IndexError):
+        text[4]
+
+    # search over bytes of mmap
+    assert text.search('dna') == [0]
+    assert text.search('DNA', ignorecase=False) == [0]
+    assert text.search('dna', ignorecase=False) == []
+    assert text.search('\u00e9\u00c9') == [2]
+    assert text.search('\n') == [0, 1, 2]
+    text.close()
+    text.close()
+
+    empty = read_text_cache(write_text_cache([], str(tmp_path / '.empty.txtc')))
+    assert (len(empty), empty.nbytes(), empty.search('a')) == (0, 0, [])
+    empty.close()
+
+
+def test_broken_text_cache(tmp_path):
+    assert read_text_cache(str(tmp_path / '.missing.txtc')) is None
+    (tmp_path / '.bad.txtc').write_bytes(b'PRTX' + b'\x00' * 12)
+    assert read_text_cache(str(tmp_path / '.bad.txtc')) is None
+    (tmp_path / '.short.txtc').write_bytes(b'PRTC')
+    assert read_text_cache(str(tmp_path / '.short.txtc')) is None
+
+
+def linearized(tail, update=False):
+    """ first page section (trailer with /Prev) and rest of file with startxref of first page xref """
+
+    out = b'%PDF-1.5\n1 0 obj\n<< /Linearized 1 >>\nendobj\n'
+    first = len(out)
+    out += b'xref\n0 2\ntrailer\n<< /Size 4 /Prev 999 >>\nstartxref\n0\n%%EOF\n'
+    out += b'2 0 obj\n' + tail + b'\nendobj\nxref\n0 4\ntrailer\n<< /Size 4 >>\nstartxref\n' + str(first).encode() + b'\n%%EOF\n'
+    if update:
+        out += b'3 0 obj\n<< >>\nendobj\n'
+        start = len(out)
+        out += b'xref\n3 1\ntrailer\n<< /Prev ' + str(first).encode() + b' >>\nstartxref\n' + str(start).encode() + b'\n%%EOF\n'
+    return out
+
+
+def test_key_of_original_revision(tmp_path):
+    objs = pages_objects(2, extra={3: b'<< >>'})
+    a = make_pdf(tmp_path / 'a.pdf', objs)
+    exif = make_pdf(tmp_path / 'exif.pdf', objs, update={20: b'<< /Title (Separation of Long DNA) >>'})
+    other = make_pdf(tmp_path / 'other.pdf', pages_objects(2, extra={3: b'<< /X 1 >>'}))
+
+    # metadata of exiftool (incremental update) does not change key
+    assert file_key(a) == file_key(exif)
+    assert file_key(a) != file_key(other)
+
+    # change at the end of large original
+    big = pages_objects(2, extra={3: b'<< >>', 4: b'(' + b'x' * (1 << 21) + b')', 5: b'1'})
+    key = file_key(make_pdf(tmp_path / 'big.pdf', big))
+    big[5] = b'2'
+    assert key != file_key(make_pdf(tmp_path / 'big2.pdf', big))
+
+
+def test_key_of_linearized_pdf(tmp_path):
+    # original has two %%EOF - second section is not an update
+    (tmp_path / 'a.pdf').write_bytes(linearized(b'(a)'))
+    (tmp_path / 'b.pdf').write_bytes(linearized(b'(b)'))
+    (tmp_path / 'c.pdf').write_bytes(linearized(b'(a)', update=True))
+
+    assert file_key(str(tmp_path / 'a.pdf')) != file_key(str(tmp_path / 'b.pdf'))
+    assert file_key(str(tmp_path / 'a.pdf')) == file_key(str(tmp_path / 'c.pdf'))
+
+    # no %%EOF and empty file: whole file
+    (tmp_path / 'd.pdf').write_bytes(b'%PDF-1.5\n')
+    (tmp_path / 'e.pdf').write_bytes(b'')
+    assert file_key(str(tmp_path / 'd.pdf')) != file_key(str(tmp_path / 'e.pdf'))
+
+
+def test_sidecar_path(tmp_path, cache_dir):
+    fname = make_pdf(tmp_path / 'paper.pdf', pages_objects(1))
+    key = file_key(fname)
+
+    assert sidecar_path(fname, 'txt') == os.path.join(cache_dir, key[:2], key[2:4], key + '.txt')
+    assert not os.path.exists(os.path.join(cache_dir, key[:2]))
+    sidecar_path(fname, 'bib', create=True)
+    assert os.path.isdir(os.path.join(cache_dir, key[:2], key[2:4]))
+
+    set_cache_dir(None)
+    assert sidecar_path(fname, 'parse.json') == str(tmp_path / '.paper.parse.json')
+
+
+def test_migrate_sidecars(tmp_path, cache_dir):
+    fname = make_pdf(tmp_path / 'paper.pdf', pages_objects(1))
+    for ext in ['bib', 'txt']:
+        with open(str(tmp_path / ('.paper.' + ext)), 'w') as f:
+            f.write(ext)
+
+    assert migrate_sidecars([fname], dry_run=True) == 2
+    assert os.path.exists(str(tmp_path / '.paper.bib'))
+
+    assert migrate_sidecars([fname]) == 2
+    assert sorted(os.listdir(str(tmp_path))) == ['cache', 'paper.pdf']
+    with open(store_path(fname, 'bib')) as f:
+        assert f.read() == 'bib'
+
+    # renamed pdf keeps its cache
+    os.rename(fname, str(tmp_path / 'renamed.pdf'))
+    assert os.path.exists(sidecar_path(str(tmp_path / 'renamed.pdf'), 'txt'))
@@ -0,0 +1,66 @@
+"""
+test_dedup.py
+
+MinHash signatures, LSH candidates and duplicate clusters of pdf_dedup
+"""
+
+import os
+import random
+
+from pdf_dedup import shingles
+from pdf_dedup import minhash_signature
+from pdf_dedup import jaccard
+from pdf_dedup import lsh_buckets
+from pdf_dedup import find_duplicates
+
+WORDS = ['nanopore', 'dna', 'translocation', 'electric', 'field', 'polymer', 'confinement', 'entropic',
+         'diffusion', 'protein', 'network', 'learning', 'deep', 'signal', 'channel', 'single', 'molecule']
+
+
+def text(seed, n=400):
+    gen = random.Random(seed)
+    return ' '.join(gen.choice(WORDS) for _ in range(n))
+
+
+def test_shingles():
+    assert shingles('The DNA, in a NANOPORE!', k=2) == set(['the dna', 'dna in', 'in a', 'a nanopore'])
+    assert shingles('two words', k=5) == set(['two words'])
+    assert shingles('', k=5) == set()
+
+
+def test_signature_similarity():
+    a = text(1)
+    b = a + ' ' + text(2, n=20)         # preprint with one more paragraph
+    c = text(3)
+
+    sa, sb, sc = [minhash_signature(t, num_perm=128) for t in [a, b, c]]
+    assert len(sa) == 128
+    assert minhash_signature(a, num_perm=128) == sa
+    assert minhash_signature('', num_perm=128) is None
+    assert jaccard(sa, sa) == 1.0
+    assert jaccard(sa, sb) > 0.8
+    assert jaccard(sa, sc) < 0.3
+
+
+def test_lsh_candidates():
+    sigs = {'a': minhash_signature(text(1)), 'b': minhash_signature(text(1) + ' deep learning'), 'c': minhash_signature(text(3))}
+    pairs = set(tuple(sorted(p)) for p in lsh_buckets(sigs, bands=16))
+
+    assert ('a', 'b') in pairs
+    assert ('a', 'c') not in pairs
+
+
+def test_find_duplicates(tmp_path):
+    # text from hidden txt cache - no pdf extraction
+    base = str(tmp_path)
+    texts = {'a.pdf': text(1), 'b.pdf': text(1) + ' ' + text(2, n=10), 'c.pdf': text(3), 'd.pdf': text(4), 'e.pdf': text(4)}
+    for name, t in texts.items():
+        with open(os.path.join(base, name), 'wb') as f:
+            f.write(('%PDF ' + name[0]).encode('ascii') if name != 'e.pdf' else b'%PDF d')
+        with open(os.path.join(base, '.' + name.replace('.pdf', '.txt')), 'w') as f:
+            f.write(t)
+
+    clusters = find_duplicates([os.path.join(base, n) for n in sorted(texts)], threshold=0.8)
+    names = sorted([os.path.basename(f) for f in c] for c in clusters)
+
+    assert names == [['a.pdf', 'b.pdf'], ['d.pdf', 'e.pdf']]
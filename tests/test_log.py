@@ -0,0 +1,60 @@
+"""
+test_log.py
+
+messages of pdf_log as library and after set_level
+"""
+
+import logging
+
+import pytest
+
+import pdf_log as log
+
+
+@pytest.fixture
+def library(monkeypatch):
+    """ library defaults of console handler """
+
+    monkeypatch.setattr(log._console, 'default', True)
+    monkeypatch.setattr(log.logger, 'propagate', True)
+    level = log._console.level
+    log._console.setLevel(logging.INFO)
+    log._update_level()
+    yield
+    log._console.setLevel(level)
+    log._update_level()
+
+
+def test_library_messages(library, capsys, monkeypatch):
+    # application without logging handlers (pytest adds its own)
+    monkeypatch.setattr(logging.getLogger(), 'handlers', [])
+
+    log.info('... save to {}', 'a.bib')
+    log.debug('... same value {}', 1, show=True)
+    log.debug('... hidden {}', 2)
+    log.warning('... can not read pdf: {}', 'a.pdf')
+
+    captured = capsys.readouterr()
+    assert captured.out == ''
+    assert captured.err == '... save to a.bib\n... same value 1\n... can not read pdf: a.pdf\n'
+
+
+def test_application_handlers(library, capsys, monkeypatch):
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    monkeypatch.setattr(logging.getLogger(), 'handlers', [handler])
+
+    log.info('... save to {}', 'a.bib')
+    assert capsys.readouterr().err == ''
+    assert [r.getMessage() for r in records] == ['... save to a.bib']
+
+
+def test_set_level(library, capsys, monkeypatch):
+    monkeypatch.setattr(logging.getLogger(), 'handlers', [])
+    monkeypatch.delenv(log.LOG_ENV, raising=False)
+    log.set_level('warning', export=False)
+
+    log.info('... save to {}', 'a.bib')
+    log.warning('... check filename: {}', 'a.pdf')
+    assert capsys.readouterr().err == '... check filename: a.pdf\n'
@@ -0,0 +1,53 @@
+"""
+test_meta.py
+
+crossref json conversion (pdf_meta.csl_to_dict)
+"""
+
+from pdf_meta import csl_to_dict
+
+
+ITEM = {
+    'DOI': '10.1021/ac030303m',
+    'URL': 'http://dx.doi.org/10.1021/ac030303m',
+    'type': 'journal-article',
+    'title': ['Separation of Long DNA Molecules by <i>Quartz</i> Nanopillar Chips'],
+    'container-title': ['Analytical Chemistry'],
+    'author': [{'given': 'Noritada', 'family': 'Kaji'}, {'given': 'Yojiro', 'family': 'Tezuka'}, {'name': 'Nano Group'}],
+    'issued': {'date-parts': [[2004, 6, 1]]},
+    'publisher': 'American Chemical Society (ACS)',
+    'volume': '76',
+    'issue': '1',
+    'page': '15-22',
+    'ISSN': ['0003-2700', '1520-6882'],
+}
+
+
+def test_csl_to_dict():
+    bib = csl_to_dict(ITEM)
+
+    assert bib['ENTRYTYPE'] == 'article'
+    assert bib['ID'] == 'Kaji_2004'
+    assert bib['title'] == 'Separation of Long DNA Molecules by Quartz Nanopillar Chips'
+    assert bib['author'] == 'Kaji, Noritada and Tezuka, Yojiro and Nano Group'
+    assert bib['journal'] == 'Analytical Chemistry'
+    assert bib['year'] == '2004'
+    assert bib['number'] == '1'
+    assert bib['pages'] == '15-22'
+    assert bib['issn'] == '0003-2700, 1520-6882'
+
+
+def test_month_as_bibtex_macro():
+    # same as month of crossref bibtex (jun, not June)
+    assert csl_to_dict(ITEM)['month'] == 'jun'
+    assert csl_to_dict(dict(ITEM, issued={'date-parts': [[2004, 12]]}))['month'] == 'dec'
+    assert 'month' not in csl_to_dict(dict(ITEM, issued={'date-parts': [[2004]]}))
+
+
+def test_missing_values():
+    bib = csl_to_dict({'type': 'proceedings-article', 'title': 'Talk', 'container-title': 'Conference'})
+
+    assert bib['ENTRYTYPE'] == 'inproceedings'
+    assert bib['booktitle'] == 'Conference'
+    assert bib['ID'] == 'Unknown_'
+    assert 'year' not in bib
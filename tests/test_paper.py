@@ -0,0 +1,159 @@
+"""
+test_paper.py
+
+text of Paper for image-only pdfs, lazy text lines, rename decision of update and bib stage of update_library
+"""
+
+import os
+
+import pytest
+
+import py_readpaper
+from py_readpaper import Paper
+from pdf_policy import get_policy
+from pdf_cache import TextLines
+from pdf_cache import write_text_cache
+from pdf_text import find_doi
+from pdf_text import find_keywords
+
+from pdfs import FONT
+from pdfs import IMAGE
+from pdfs import pages_objects
+from pdfs import object_stream
+from pdfs import make_pdf
+
+
+def test_scanned_pdf_without_text(tmp_path):
+    scan = make_pdf(tmp_path / '2004-Kaji-Scan.pdf', pages_objects(2, extra={3: b'<< /XObject << /Im1 4 0 R >> >>', 4: IMAGE}))
+
+    # text sample: no junk lines
+    paper = Paper(scan, exif=False)
+    assert paper.contents() == []
+    assert paper.contents(split=False) == ''
+
+    # kind of extraction in index: no text extraction
+    paper = Paper(scan, exif=False, index={'kind': 'image', 'extract': {'kind': 'image'}})
+    assert paper.contents() == []
+    assert sorted(os.listdir(str(tmp_path))) == ['2004-Kaji-Scan.pdf']
+
+
+def test_ocr_text_of_scanned_pdf(tmp_path):
+    scan = make_pdf(tmp_path / '2004-Kaji-Scan.pdf', pages_objects(1, extra={3: b'<< /XObject << /Im1 4 0 R >> >>', 4: IMAGE}))
+    lines = ['Separation of long DNA molecules by quartz nanopillar chips\n'] * 3
+    with open(str(tmp_path / '.2004-Kaji-Scan.txt'), 'w') as f:
+        f.writelines(lines)
+
+    paper = Paper(scan, exif=False, index={'kind': 'image', 'extract': {'kind': 'image'}})
+    assert paper.contents() == lines
+
+
+def test_unknown_resources_are_read(tmp_path):
+    # fonts in object stream which can not be read - text is extracted
+    enc = make_pdf(tmp_path / '2004-Kaji-Enc.pdf', pages_objects(1, extra={3: b'<< >>', 4: IMAGE, 5: object_stream({6: FONT}, flate=False)}))
+    lines = ['Separation of long DNA molecules by quartz nanopillar chips\n'] * 3
+    with open(str(tmp_path / '.2004-Kaji-Enc.txt'), 'w') as f:
+        f.writelines(lines)
+
+    paper = Paper(enc, exif=False, index={'kind': 'unknown'})
+    assert paper.contents(update=False) == lines
+    assert paper._kind == 'text'
+
+
+def test_text_cache_read_lazily(tmp_path, monkeypatch, capsys):
+    fname = make_pdf(tmp_path / '2004-Kaji-Nano.pdf', pages_objects(1, extra={3: b'<< /Font << /F1 4 0 R >> >>', 4: FONT}))
+    lines = ['Separation of long DNA molecules\n', 'doi: 10.1021/ac030303m\n', 'Keywords: nanopillar, DNA\n']
+    write_text_cache(lines + ['Introduction of nanostructures {}\n'.format(i) for i in range(1000)], str(tmp_path / '.2004-Kaji-Nano.txtc'))
+
+    decoded = []
+    getitem = TextLines.__getitem__
+    monkeypatch.setattr(TextLines, '__getitem__', lambda self, i: decoded.append(i) or getitem(self, i))
+    monkeypatch.setattr(py_readpaper, 'has_pdftotext', lambda: False)
+
+    # doi and keywords stop at found line
+    paper = Paper(fname, exif=False, textcache='txtc')
+    assert find_doi(paper._search_text()) == '10.1021/ac030303m'
+    assert find_keywords(paper._search_text()) == set(['nanopillar', 'DNA'])
+    assert isinstance(paper._text, TextLines)
+    assert len(decoded) < 10
+
+    # search over mmap: only found lines are decoded
+    del decoded[:]
+    assert paper.search_text('NANOSTRUCTURES 500')
+    assert decoded == [503]
+    assert '... [503] Introduction of nanostructures 500\n' in capsys.readouterr().out
+
+
+BIB = '@article{Kaji_2004,\n author = {Kaji, Noritada},\n journal = {Analytical Chemistry},\n title = {Separation of Long DNA},\n year = {2004}\n}\n'
+
+
+def test_update_force_asks_before_rename(tmp_path, monkeypatch):
+    fname = str(tmp_path / 'paper.pdf')
+    make_pdf(fname, pages_objects(1))
+    with open(str(tmp_path / '.paper.bib'), 'w') as f:
+        f.write(BIB)
+
+    prompts = []
+    answers = ['no', 'yes']
+    monkeypatch.setattr('builtins.input', lambda prompt='': prompts.append(prompt) or answers.pop(0))
+
+    paper = Paper(fname, exif=False, policy=get_policy('remote', rename='ask'))
+    for name in ['bootstrap_bib', 'doi', 'download_bib', 'bib_to_exif']:
+        monkeypatch.setattr(paper, name, lambda *args, **kwargs: '10.1021/ac030303m')
+
+    # force overwrites exif values, but does not approve the rename
+    paper.update(force=True)
+    assert os.path.exists(fname)
+    assert ('paper.pdf' in prompts[0]) and ('2004-Kaji-Analytical_Chemistry.pdf' in prompts[0])
+
+    paper.update(force=True)
+    assert not os.path.exists(fname)
+    assert os.path.exists(str(tmp_path / '2004-Kaji-Analytical_Chemistry.pdf'))
+    assert os.path.exists(str(tmp_path / '.2004-Kaji-Analytical_Chemistry.bib'))
+
+
+def test_new_fname_without_exiftool(tmp_path):
+    fname = make_pdf(tmp_path / '2004-Kaji-Analytical_Chemistry.pdf', pages_objects(1))
+
+    # author from first author of filename (or index) - exif is not read
+    paper = Paper(fname, exif=True)
+    assert paper.new_fname() == '2004-Kaji-Analytical_Chemistry.pdf'
+    assert paper._tags is None
+
+    paper = Paper(make_pdf(tmp_path / 'paper.pdf', pages_objects(1)), exif=True, index={'year': '2017', 'author1': 'Golmohammadi', 'journal': 'arXiv', 'size': 10})
+    assert paper.new_fname() == '2017-Golmohammadi-arXiv.pdf'
+    assert paper._tags is None
+
+
+def test_field_same_before_and_after_loading(tmp_path):
+    fname = make_pdf(tmp_path / '2000-Kim-Temp.pdf', pages_objects(1))
+    with open(str(tmp_path / '.2000-Kim-Temp.bib'), 'w') as f:
+        f.write(BIB)
+    tags = {'Title': 'Title of Exif', 'Author': 'Lee, Sun', 'Subject': 'Journal of Exif, (1999), doi:10.1/x', 'DOI': '10.1/x'}
+
+    paper = Paper(fname, exif=True, index={'size': 10})
+    paper._tags = tags
+    before = {name: paper.field(name) for name in ['title', 'author', 'year', 'journal', 'doi']}
+    target = paper.new_fname()
+
+    paper._load_bib()
+    after = {name: paper.field(name) for name in ['title', 'author', 'year', 'journal', 'doi']}
+
+    assert before == after == {'title': 'Separation of Long DNA', 'author': 'Kaji, Noritada', 'year': '2004',
+                               'journal': 'Analytical Chemistry', 'doi': '10.1/x'}
+    assert paper.new_fname() == target == '2004-Kaji-Analytical_Chemistry.pdf'
+    assert 'size' not in paper._bib
+
+
+def test_pipeline_bib_of_bib_file(monkeypatch):
+    # bib file read by extract stage is not parsed again, crossref only for papers without bib file
+    requested = []
+    monkeypatch.setattr(py_readpaper, 'read_bib', lambda *args, **kwargs: pytest.fail('bib file parsed again'))
+    monkeypatch.setattr(py_readpaper, 'get_bibs', lambda dois: requested.extend(dois) or {'10.1/b': {'title': 'B'}})
+
+    filebib = {'doi': '10.1/a', 'title': 'A'}
+    items = [{'doi': '10.1/a', 'filebib': filebib, 'remote': []}, {'doi': '10.1/B', 'filebib': {}, 'remote': []},
+             {'doi': '', 'filebib': {}, 'remote': []}]
+
+    res = py_readpaper._pipeline_bib(items)
+    assert requested == ['10.1/B']
+    assert [r['remote'] for r in res] == [[filebib], [{'title': 'B'}], []]
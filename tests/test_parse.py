@@ -0,0 +1,123 @@
+"""
+test_parse.py
+
+single pass parser of first pages (pdf_parse.parse_lines) and its cached text and layout sources
+"""
+
+import pytest
+
+import pdf_parse
+from pdf_parse import parse_lines
+from pdf_parse import parse_first_pages
+from py_readpaper import Paper
+
+
+LINES = [
+    (0, 'Journal of Testing, vol. 12, doi: 10.1000/jt.2020.001.', 8.0),
+    (0, 'Separation of Long DNA Molecules by Quartz', 18.0),
+    (0, 'Nanopillar Chips under a Direct Current', 18.0),
+    (0, 'John Smith1*, Jane Doe2', 11.0),
+    (0, 'Department of Physics, University of Somewhere', 9.0),
+    (0, 'Abstract', 10.0),
+    (0, 'We separate long DNA molecules in nanopillar chips', 10.0),
+    (0, 'without any pulsed field.', 10.0),
+    (0, 'Index Terms—nanopillar, DNA, electrophoresis', 10.0),
+    (0, '1. Introduction', 12.0),
+    (1, 'see also arXiv:1801.00001v2', 10.0),
+]
+
+
+def test_parse_lines():
+    info = parse_lines(LINES)
+
+    assert info['title'] == 'Separation of Long DNA Molecules by Quartz Nanopillar Chips under a Direct Current'
+    assert info['author'] == 'John Smith, Jane Doe'
+    assert info['abstract'] == 'We separate long DNA molecules in nanopillar chips without any pulsed field.'
+    assert info['keywords'] == ['DNA', 'electrophoresis', 'nanopillar']
+    assert info['doi'] == '10.1000/jt.2020.001'
+    assert info['dois'] == ['10.1000/jt.2020.001', 'arXiv:1801.00001v2']
+    assert info['index']['title'] == [1, 3]
+
+
+def test_title_without_font_size():
+    info = parse_lines([(0, 'A Great Title About Many Things', None), (0, 'John Smith, Jane Doe', 12.0)])
+
+    assert info['title'] == 'A Great Title About Many Things'
+
+
+def test_keyword_markers():
+    for line in ['Keywords: nanopore; DNA; quartz', 'KEY WORDS: nanopore, DNA, quartz', 'Index terms - nanopore, DNA, quartz']:
+        assert parse_lines([(0, line, None)])['keywords'] == ['DNA', 'nanopore', 'quartz']
+
+
+def test_empty():
+    info = parse_lines([])
+
+    assert info['title'] == ''
+    assert info['keywords'] == []
+    assert info['doi'] == ''
+
+
+TEXT = ('Separation of Long DNA Molecules by Quartz\n'
+        'Keywords: nanopore; DNA; quartz\n'
+        'doi: 10.1000/jt.2020.001\n'
+        '\x0cSecond page cites 10.1000/other.2\n'
+        '\x0cThird page cites 10.1000/late.3\n')
+
+
+@pytest.fixture
+def paper_files(tmp_path, monkeypatch):
+    """ pdf with text cache - layout pass recorded, no text extraction """
+
+    pdf = tmp_path / 'a.pdf'
+    pdf.write_bytes(b'%PDF-1.4\n%%EOF\n')
+    (tmp_path / '.a.txt').write_text(TEXT)
+
+    calls = []
+
+    def run_layout(pdf_path, maxpages=2, timeout=60, memory=1024):
+        calls.append(pdf_path)
+        return [(0, 'A Layout Title of This Paper', 20.0), (0, 'John Smith', 12.0)], 'ok'
+
+    def run_engine(*args, **kwargs):
+        raise AssertionError('text cache exists')
+
+    monkeypatch.setattr(pdf_parse, 'run_layout', run_layout)
+    monkeypatch.setattr(pdf_parse, 'run_engine', run_engine)
+    monkeypatch.setattr(pdf_parse, 'has_pdfminer', lambda: True)
+    return str(pdf), calls
+
+
+def test_doi_and_keywords_without_layout(paper_files):
+    pdf, calls = paper_files
+
+    info = parse_first_pages(pdf, layout=False)
+    assert (info['source'], info['doi'], info['keywords']) == ('text', '10.1000/jt.2020.001', ['DNA', 'nanopore', 'quartz'])
+    assert info['dois'] == ['10.1000/jt.2020.001', '10.1000/other.2']
+    assert calls == []
+
+    # layout is run once when asked - then cached for both
+    assert parse_first_pages(pdf)['title'] == 'A Layout Title of This Paper'
+    assert parse_first_pages(pdf, layout=False)['source'] == 'layout'
+    assert parse_first_pages(pdf)['source'] == 'layout'
+    assert len(calls) == 1
+
+
+def test_text_lines_of_caller(paper_files):
+    pdf, calls = paper_files
+
+    info = parse_first_pages(pdf, layout=False, text=['Keywords: polymer, gel\n', 'arXiv:1801.00001\n'])
+    assert (info['keywords'], info['doi']) == (['gel', 'polymer'], 'arXiv:1801.00001')
+
+
+def test_bootstrap_layout_only_for_title_and_author(paper_files):
+    pdf, calls = paper_files
+
+    paper = Paper(pdf, exif=False)
+    paper.bootstrap_bib(names=['doi', 'keywords'])
+    assert (paper._bib['doi'], paper._bib['keywords']) == ('10.1000/jt.2020.001', ['DNA', 'nanopore', 'quartz'])
+    assert calls == []
+
+    paper.bootstrap_bib()
+    assert paper._bib['title'] == 'A Layout Title of This Paper'
+    assert len(calls) == 1
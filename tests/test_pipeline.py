@@ -0,0 +1,88 @@
+"""
+test_pipeline.py
+
+stages, batches and failure paths of pdf_pipeline
+"""
+
+import os
+import threading
+
+from pdf_pipeline import Pipeline
+from pdf_pipeline import Stage
+
+TIMEOUT = 60
+
+
+def double(item):
+    return dict(item, value=item['value'] * 2)
+
+
+def fail_odd(item):
+    if item['value'] % 2 == 1:
+        raise ValueError('odd')
+    return item
+
+
+def add_batch(items):
+    return [dict(item, batch=len(items)) for item in items]
+
+
+def die_on_three(item):
+    if item['value'] == 3:
+        os._exit(1)
+    return item
+
+
+async def plus_one(item):
+    return dict(item, value=item['value'] + 1)
+
+
+def run(pipe, items):
+    """ run pipeline in thread - fail instead of hanging the test session """
+
+    out = []
+    t = threading.Thread(target=lambda: out.append(pipe.run(items)), daemon=True)
+    t.start()
+    t.join(TIMEOUT)
+    assert not t.is_alive(), 'pipeline did not finish'
+    return out[0]
+
+
+def test_stages():
+    pipe = Pipeline([Stage('double', double, workers=2, kind='thread'),
+                     Stage('plus', plus_one, workers=4, kind='async')], maxsize=4)
+    res = run(pipe, [{'value': i} for i in range(20)])
+
+    assert sorted(r['value'] for r in res) == [2 * i + 1 for i in range(20)]
+    assert [m.items for m in pipe.metrics] == [20, 20]
+
+
+def test_errors_skip_later_stages():
+    pipe = Pipeline([Stage('odd', fail_odd, workers=2), Stage('double', double, workers=2)])
+    res = run(pipe, [{'value': i} for i in range(10)])
+
+    errors = [r for r in res if 'error' in r]
+    assert len(res) == 10
+    assert sorted(r['value'] for r in errors) == [1, 3, 5, 7, 9]
+    assert all(r['stage'] == 'odd' for r in errors)
+    assert pipe.metrics[1].items == 5
+
+
+def test_batch():
+    pipe = Pipeline([Stage('batch', add_batch, workers=1, batch=4, linger=0.1)])
+    res = run(pipe, [{'value': i} for i in range(10)])
+
+    assert len(res) == 10
+    assert all(1 <= r['batch'] <= 4 for r in res)
+
+
+def test_killed_worker_process():
+    # worker dies (os._exit) - no hang, every item comes out (failed or done)
+    pipe = Pipeline([Stage('die', die_on_three, workers=2, kind='process'),
+                     Stage('double', double, workers=1)], maxsize=2)
+    res = run(pipe, [{'value': i} for i in range(30)])
+
+    assert len(res) == 30
+    assert sorted(r['value'] // (1 if 'error' in r else 2) for r in res) == list(range(30))
+    assert any(r['value'] == 3 and 'error' in r for r in res)
+    assert pipe.metrics[0].errors > 0
@@ -0,0 +1,54 @@
+"""
+test_policy.py
+
+field conflicts, rename decision and batch checks of pdf_policy
+"""
+
+import sys
+
+import pytest
+
+from pdf_policy import get_policy
+from pdf_policy import check_policy
+from pdf_policy import read_review
+
+
+def test_modes():
+    assert get_policy('remote').choose('title', 'a', 'b')
+    assert not get_policy('local').choose('title', 'a', 'b')
+    assert get_policy('longer').choose('title', 'a', 'bb')
+    assert get_policy(lambda name, local, remote: name == 'doi').choose('doi', 'a', 'b')
+
+
+def test_review_keeps_local(tmp_path):
+    review_file = str(tmp_path / '.review.jsonl')
+    policy = get_policy('review', review_file=review_file)
+
+    assert not policy.choose('title', 'a', 'b', filename='/x/2004-Kaji-Analytical_Chemistry.pdf')
+    item = read_review(review_file)[0]
+    assert (item['fname'], item['name'], item['local'], item['remote']) == ('2004-Kaji-Analytical_Chemistry.pdf', 'title', 'a', 'b')
+
+
+def test_rename_is_not_a_field_conflict(tmp_path):
+    # review mode still renames by remote metadata
+    assert get_policy('review', review_file=str(tmp_path / 'r.jsonl')).choose_rename('a.pdf', 'b.pdf')
+    assert get_policy('local').choose_rename('a.pdf', 'b.pdf')
+    assert not get_policy('review', rename='no').choose_rename('a.pdf', 'b.pdf')
+    assert get_policy('ask').rename == 'ask'
+
+    with pytest.raises(ValueError):
+        get_policy('review', rename='maybe')
+
+
+def test_ask_only_interactive(monkeypatch):
+    monkeypatch.setattr(sys.stdin, 'isatty', lambda: True, raising=False)
+    assert check_policy('ask', workers=1).interactive
+    assert not check_policy('review', workers=8).interactive
+    with pytest.raises(ValueError):
+        check_policy('ask', workers=4)
+    with pytest.raises(ValueError):
+        check_policy('review', workers=4, rename='ask')
+
+    monkeypatch.setattr(sys.stdin, 'isatty', lambda: False, raising=False)
+    with pytest.raises(ValueError):
+        check_policy('ask', workers=1)
@@ -0,0 +1,170 @@
+"""
+test_rename.py
+
+rename plan, journaled batch and recovery of pdf_rename
+"""
+
+import os
+import json
+import time
+import threading
+import multiprocessing
+
+import pytest
+
+import py_readpaper
+from pdf_rename import plan_rename
+from pdf_rename import execute_rename
+from pdf_rename import recover_rename
+from pdf_rename import rename_lock
+from pdf_rename import JOURNAL_FNAME
+
+
+class Crash(BaseException):
+    """ process dies (not handled as OSError by execute_rename) """
+
+
+def make(base, names):
+    for n in names:
+        with open(os.path.join(base, n), 'w') as f:
+            f.write(n)
+
+
+def files(base):
+    """ {name: content} of directory """
+
+    res = {}
+    for n in sorted(os.listdir(base)):
+        with open(os.path.join(base, n)) as f:
+            res[n] = f.read()
+    return res
+
+
+def test_plan_collisions(tmp_path):
+    base = str(tmp_path)
+    make(base, ['a.pdf', 'b.pdf', 'c.pdf', '.x-1.bib'])
+
+    # swap, existing file, two papers with same name and sidecar of other pdf
+    assert plan_rename({base + '/a.pdf': 'b.pdf', base + '/b.pdf': 'a.pdf'}) == [(base + '/a.pdf', base + '/b.pdf'), (base + '/b.pdf', base + '/a.pdf')]
+    assert plan_rename({base + '/a.pdf': 'c.pdf'}) == [(base + '/a.pdf', base + '/c-1.pdf')]
+    assert plan_rename({base + '/a.pdf': 'x.pdf', base + '/b.pdf': 'x.pdf'}) == [(base + '/a.pdf', base + '/x.pdf'), (base + '/b.pdf', base + '/x-2.pdf')]
+    assert plan_rename({base + '/a.pdf': 'a.pdf', base + '/b.pdf': None}) == []
+
+
+def test_execute_with_sidecars(tmp_path):
+    base = str(tmp_path)
+    make(base, ['a.pdf', '.a.bib', '.a.txt', 'b.pdf'])
+
+    assert execute_rename(plan_rename({base + '/a.pdf': 'b.pdf', base + '/b.pdf': 'a.pdf'}))
+    assert files(base) == {'.b.bib': '.a.bib', '.b.txt': '.a.txt', 'a.pdf': 'b.pdf', 'b.pdf': 'a.pdf'}
+
+
+def test_rollback_on_error(tmp_path):
+    base = str(tmp_path)
+    make(base, ['a.pdf', '.a.bib', 'b.pdf'])
+    before = files(base)
+
+    # target appears after planning
+    plan = plan_rename({base + '/a.pdf': 'x.pdf', base + '/b.pdf': 'y.pdf'})
+    make(base, ['y.pdf'])
+    assert not execute_rename(plan)
+    assert files(base) == dict(before, **{'y.pdf': 'y.pdf'})
+
+
+@pytest.mark.parametrize('crash_after', range(1, 9))
+def test_recover_after_crash(tmp_path, monkeypatch, crash_after):
+    base = str(tmp_path)
+    make(base, ['a.pdf', '.a.bib', 'b.pdf', '.b.txt'])
+    before = files(base)
+    plan = plan_rename({base + '/a.pdf': 'b.pdf', base + '/b.pdf': 'a.pdf'})
+
+    # process dies after n-th move - before its 'done' record is written
+    rename = os.rename
+    calls = []
+
+    def crashing_rename(src, dst):
+        rename(src, dst)
+        calls.append((src, dst))
+        if len(calls) == crash_after:
+            raise Crash()
+
+    monkeypatch.setattr(os, 'rename', crashing_rename)
+    with pytest.raises(Crash):
+        execute_rename(plan)
+    monkeypatch.setattr(os, 'rename', rename)
+
+    assert os.path.exists(os.path.join(base, JOURNAL_FNAME))
+    assert recover_rename(base) > 0
+    assert files(base) == before
+    assert recover_rename(base) == 0
+
+
+def test_journal_of_other_batch(tmp_path):
+    base = str(tmp_path)
+    make(base, ['a.pdf'])
+    with open(os.path.join(base, JOURNAL_FNAME), 'w') as f:
+        f.write(json.dumps({'plan': []}) + '\n')
+
+    # unfinished journal blocks new batches until recovered
+    assert not execute_rename(plan_rename({base + '/a.pdf': 'b.pdf'}))
+    recover_rename(base)
+    assert execute_rename(plan_rename({base + '/a.pdf': 'b.pdf'}))
+    assert files(base) == {'b.pdf': 'a.pdf'}
+
+
+def test_lock_serializes_batches(tmp_path):
+    base = str(tmp_path)
+    order = []
+
+    def other():
+        with rename_lock(base):
+            order.append('other')
+
+    with rename_lock(base):
+        with rename_lock(base):         # reentrant
+            t = threading.Thread(target=other)
+            t.start()
+            t.join(0.3)
+            assert t.is_alive()
+            order.append('first')
+    t.join(10)
+
+    assert order == ['first', 'other']
+    assert os.listdir(base) == []
+
+
+def test_dry_run_does_not_touch_files(tmp_path, monkeypatch, capsys):
+    base = str(tmp_path)
+    make(base, ['a.pdf', 'b.pdf'])
+    with open(os.path.join(base, JOURNAL_FNAME), 'w') as f:
+        f.write(json.dumps({'plan': [], 'steps': [[base + '/b.pdf', base + '/x.pdf']]}) + '\n')
+    before = files(base)
+
+    monkeypatch.setattr(py_readpaper, '_rename_one', lambda f, dry_run=False: 'c.pdf' if f.endswith('a.pdf') else None)
+    assert py_readpaper.main(['-n', '-w', '1', 'rename', base]) == 0
+
+    assert files(base) == before
+    assert 'a.pdf -> c.pdf' in capsys.readouterr().out
+
+
+def _hold_lock(base, n):
+    """ process: n times lock, check no other holder, unlock """
+
+    for i in range(n):
+        with rename_lock(base):
+            with open(os.path.join(base, 'owner'), 'x') as f:
+                f.write(str(os.getpid()))
+            time.sleep(0.001)
+            os.remove(os.path.join(base, 'owner'))
+
+
+def test_lock_removed_file_between_processes(tmp_path):
+    # lock file is removed on release - waiting processes must not lock a removed file
+    base = str(tmp_path)
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=_hold_lock, args=(base, 50)) for _ in range(4)]
+    for p in procs: p.start()
+    for p in procs: p.join(60)
+
+    assert [p.exitcode for p in procs] == [0, 0, 0, 0]
+    assert os.listdir(base) == []
@@ -0,0 +1,81 @@
+"""
+test_text.py
+
+page count (countPDFPages) and kind (classify_pdf) of crafted pdf files
+"""
+
+import pytest
+
+from pdf_text import countPDFPages
+from pdf_text import classify_pdf
+
+from pdfs import FONT
+from pdfs import IMAGE
+from pdfs import pages_objects
+from pdfs import object_stream
+from pdfs import make_pdf
+
+
+def test_pages_xref_table(tmp_path):
+    assert countPDFPages(make_pdf(tmp_path / 'a.pdf', pages_objects(3))) == 3
+
+
+def test_pages_incremental_update(tmp_path):
+    # page tree replaced by update - catalog only in first xref table (/Prev)
+    objs = pages_objects(3)
+    update = {2: objs[2].replace(b'/Count 3', b'/Count 5')}
+
+    assert countPDFPages(make_pdf(tmp_path / 'a.pdf', objs, update=update)) == 5
+
+
+def test_pages_indirect_count(tmp_path):
+    objs = pages_objects(2, count=b'7 0 R', extra={7: b'2'})
+
+    assert countPDFPages(make_pdf(tmp_path / 'a.pdf', objs)) == 2
+
+
+def test_pages_xref_stream_object_stream(tmp_path):
+    # catalog and page tree compressed in object stream
+    objs = pages_objects(4)
+    objs[5] = object_stream({1: objs.pop(1), 2: objs.pop(2)})
+
+    assert countPDFPages(make_pdf(tmp_path / 'a.pdf', objs, xref='stream')) == 4
+
+
+def test_pages_without_page_tree(tmp_path):
+    objs = pages_objects(3)
+    objs[1] = b'<< /Type /Catalog >>'
+
+    assert countPDFPages(make_pdf(tmp_path / 'a.pdf', objs)) == 3
+    (tmp_path / 'empty.pdf').write_bytes(b'')
+    assert countPDFPages(str(tmp_path / 'empty.pdf')) == 0
+
+
+@pytest.mark.parametrize('resources, kind', [
+    ({3: b'<< /Font << /F1 4 0 R >> >>', 4: FONT}, 'text'),
+    ({3: b'<< /XObject << /Im1 4 0 R >> >>', 4: IMAGE}, 'image'),
+    ({3: b'<< >>'}, 'empty'),
+    ({3: b'<< /XObject << /Im1 4 0 R >> >>', 4: IMAGE, 5: object_stream({6: FONT})}, 'text'),
+    # fonts in object stream which can not be read (encrypted or other filter)
+    ({3: b'<< /XObject << /Im1 4 0 R >> >>', 4: IMAGE, 5: object_stream({6: FONT}).replace(b'x\x9c', b'\x8f\x13')}, 'unknown'),
+    ({3: b'<< /XObject << /Im1 4 0 R >> >>', 4: IMAGE, 5: object_stream({6: FONT}, flate=False)}, 'unknown'),
+])
+def test_classify_resources(tmp_path, resources, kind):
+    assert classify_pdf(make_pdf(tmp_path / 'a.pdf', pages_objects(2, extra=resources))) == kind
+
+
+def test_classify_text_sample(tmp_path):
+    scan = make_pdf(tmp_path / 'scan.pdf', pages_objects(2, extra={3: b'<< /Font << /F1 4 0 R >> /XObject << /Im1 5 0 R >> >>', 4: FONT, 5: IMAGE}))
+    encrypted = make_pdf(tmp_path / 'enc.pdf', pages_objects(2, extra={3: b'<< >>', 4: IMAGE, 5: object_stream({6: FONT}, flate=False)}))
+    page = ['x' * 60 + '\n'] * 4
+
+    # stamp on scanned pages (fonts, but almost no text)
+    assert classify_pdf(scan, lines=['Downloaded from library\n']) == 'image'
+    assert classify_pdf(scan, lines=page) == 'text'
+    assert classify_pdf(scan, lines=page[:2], maxpages=1) == 'text'
+    assert classify_pdf(scan, lines=page[:2]) == 'image'
+
+    # text sample decides when resources can not be read
+    assert classify_pdf(encrypted) == 'unknown'
+    assert classify_pdf(encrypted, lines=page) == 'text'
+    assert classify_pdf(encrypted, lines=[]) == 'unknown'
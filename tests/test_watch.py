@@ -0,0 +1,98 @@
+"""
+test_watch.py
+
+ready and deleted files of pdf_watch.Watcher and error guard of py_readpaper.watch_library
+"""
+
+import os
+import time
+import threading
+
+import pytest
+
+import py_readpaper
+from pdf_watch import Watcher
+
+PDF = b'%PDF-1.4\n1 0 obj\n<<>>\nendobj\ntrailer\n<<>>\n%%EOF\n'
+
+
+def write(path, data=PDF):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize('poll', [True, False])
+def test_ready_and_deleted(tmp_path, poll):
+    watcher = Watcher(str(tmp_path), settle=0.2, interval=0.1, poll=poll)
+    try:
+        write(str(tmp_path / '2004-Kaji-Analytical_Chemistry.pdf'))
+        write(str(tmp_path / '.2004-Kaji-Analytical_Chemistry.bib'), b'@article{a,\n}\n')
+        write(str(tmp_path / 'notes.txt'), b'x')
+
+        ready, deleted = [], []
+        end = time.time() + 10
+        while (len(ready) == 0) and (time.time() < end):
+            ready, deleted = watcher.wait(timeout=0.5)
+        assert [os.path.basename(f) for f in ready] == ['2004-Kaji-Analytical_Chemistry.pdf']
+        assert deleted == []
+
+        watcher.mark('2004-Kaji-Analytical_Chemistry.pdf')
+        ready, deleted = watcher.wait(timeout=0.5)
+        assert ready == []
+
+        os.remove(str(tmp_path / '2004-Kaji-Analytical_Chemistry.pdf'))
+        end = time.time() + 10
+        while (len(deleted) == 0) and (time.time() < end):
+            ready, deleted = watcher.wait(timeout=0.5)
+        assert [os.path.basename(f) for f in deleted] == ['2004-Kaji-Analytical_Chemistry.pdf']
+    finally:
+        watcher.close()
+
+
+def test_partial_file_waits_for_eof(tmp_path):
+    watcher = Watcher(str(tmp_path), settle=0.1, interval=0.05, poll=True)
+    write(str(tmp_path / 'a.pdf'), PDF[:20])
+
+    ready, _ = watcher.wait(timeout=0.5)
+    assert ready == []
+
+    write(str(tmp_path / 'a.pdf'))
+    ready = []
+    end = time.time() + 10
+    while (len(ready) == 0) and (time.time() < end):
+        ready, _ = watcher.wait(timeout=0.5)
+    assert [os.path.basename(f) for f in ready] == ['a.pdf']
+
+
+def test_watch_survives_ingest_error(tmp_path, monkeypatch):
+    calls = []
+
+    def broken_ingest(flist, index, **kwargs):
+        calls.append(list(flist))
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(py_readpaper, 'ingest', broken_ingest)
+    stop = threading.Event()
+    t = threading.Thread(target=py_readpaper.watch_library, args=(str(tmp_path),),
+            kwargs={'settle': 0.1, 'interval': 0.05, 'poll': True, 'update': False, 'stop': stop, 'verb': False}, daemon=True)
+    t.start()
+    try:
+        write(str(tmp_path / 'a.pdf'))
+        end = time.time() + 10
+        while (len(calls) == 0) and (time.time() < end):
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+        # batch failed once - watch still runs, file is not read again until it changes
+        assert t.is_alive()
+        assert len(calls) == 1
+
+        write(str(tmp_path / 'b.pdf'))
+        end = time.time() + 10
+        while (len(calls) == 1) and (time.time() < end):
+            time.sleep(0.05)
+        assert [os.path.basename(f) for f in calls[1]] == ['b.pdf']
+    finally:
+        stop.set()
+        t.join(10)
+    assert not t.is_alive()